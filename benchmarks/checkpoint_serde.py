@@ -0,0 +1,184 @@
+"""Сравнение сериализаторов чекпоинтов: JsonPlusSerializer LangGraph и CompactSerializer
+
+Моделируется исследование, в котором на каждом шаге супервизора в историю добавляются
+результаты исследователей, а в сырые заметки - отформатированные результаты веб-поиска.
+На каждом шаге сериализуются изменившиеся каналы, как это делает чекпоинтер, и замеряются
+записанные байты и время сериализации и десериализации. Для CompactSerializer в записанные
+байты входят только строки, вынесенные впервые, а чекпоинт каждого шага читает новый экземпляр
+сериализатора с пустым кэшем, как другой процесс после перезапуска: все вынесенные строки
+распаковываются из записанных байтов.
+
+Тексты составляются из словаря псевдослов с частотами по закону Ципфа, числами и ссылками,
+поэтому не повторяются и сжимаются примерно как естественный язык.
+
+Запуск из корня репозитория:
+
+    python benchmarks/checkpoint_serde.py --steps 8
+"""
+
+import argparse
+import itertools
+import random
+import time
+from typing import Any
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from deep_research.backend.serde import CompactSerializer
+
+SYLLABLES = (
+    "ба ве ги до ку ла ме ни по ра си ту фе ха це чи ша ор ан ис ет ум ол ка ст пр тр ов ен ль ск ни ма ре "
+    "ко на то ли да вы за мо сл гр бл кр дн ц ж щ"
+).split()
+VOCABULARY_SIZE = 20000
+DOMAINS = ("ru", "com", "org", "io")
+
+
+class TextGenerator:
+    """Неповторяющийся текст, похожий на результаты поиска
+
+    Args:
+        rng (random.Random): Генератор случайных чисел
+    """
+
+    def __init__(self, rng: random.Random) -> None:
+        self.rng = rng
+        words: set[str] = set()
+        while len(words) < VOCABULARY_SIZE:
+            words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 5))))
+        self.words = sorted(words)
+        rng.shuffle(self.words)
+        # Закон Ципфа: частота слова обратно пропорциональна его рангу
+        self.cum_weights = list(itertools.accumulate(1 / rank for rank in range(1, len(self.words) + 1)))
+
+    def _get_token(self) -> str:
+        roll = self.rng.random()
+        if roll < 0.03:
+            return f"{self.rng.uniform(0, 1000):.1f}%"
+        if roll < 0.04:
+            return str(self.rng.randint(1990, 2025))
+        if roll < 0.045:
+            domain = self.rng.choice(self.words)
+            return f"https://{domain}.{self.rng.choice(DOMAINS)}/{self.rng.getrandbits(48):x}"
+        return self.rng.choices(self.words, cum_weights=self.cum_weights)[0]
+
+    def build(self, words: int) -> str:
+        """Абзацы из предложений общей длиной около words слов"""
+        paragraphs, sentences, count = [], [], 0
+        while count < words:
+            length = self.rng.randint(6, 25)
+            sentence = " ".join(self._get_token() for _ in range(length))
+            sentences.append(sentence[0].upper() + sentence[1:] + self.rng.choice(".....?!"))
+            count += length
+            if len(sentences) >= self.rng.randint(3, 7):
+                paragraphs.append(" ".join(sentences))
+                sentences = []
+        if sentences:
+            paragraphs.append(" ".join(sentences))
+        return "\n\n".join(paragraphs)
+
+
+def build_steps(steps: int, researchers: int, seed: int) -> list[dict[str, Any]]:
+    """Значения каналов состояния после каждого шага супервизора"""
+    text = TextGenerator(random.Random(seed))  # noqa: S311
+    messages: list[Any] = [HumanMessage(content=text.build(80))]
+    raw_notes: list[str] = []
+    states = []
+    for step in range(steps):
+        calls = [
+            {"name": "conduct_research_tool", "args": {"research_topic": text.build(40)}, "id": f"call-{step}-{i}"}
+            for i in range(researchers)
+        ]
+        messages.append(AIMessage(content="", tool_calls=calls))
+        for call in calls:
+            compressed = text.build(1200)
+            messages.append(ToolMessage(content=compressed, name="conduct_research_tool", tool_call_id=call["id"]))
+            search_results = [text.build(2500) for _ in range(3)]
+            raw_notes.extend([*search_results, compressed])
+        states.append({"messages": list(messages), "raw_notes": list(raw_notes)})
+    return states
+
+
+def measure_default(states: list[dict[str, Any]]) -> list[tuple[int, float, float]]:
+    serde = JsonPlusSerializer()
+    results = []
+    for state in states:
+        start = time.perf_counter()
+        blobs = [serde.dumps_typed(value) for value in state.values()]
+        dumped = time.perf_counter() - start
+        start = time.perf_counter()
+        for blob in blobs:
+            serde.loads_typed(blob)
+        loaded = time.perf_counter() - start
+        results.append((sum(len(blob) for _, blob in blobs), dumped, loaded))
+    return results
+
+
+def measure_compact(states: list[dict[str, Any]]) -> list[tuple[int, float, float]]:
+    serde = CompactSerializer()
+    stored: dict[str, bytes] = {}
+    results = []
+    for state in states:
+        start = time.perf_counter()
+        blobs = []
+        written = 0
+        for value in state.values():
+            value, strings = serde.intern(value)
+            blobs.append(serde.dumps_typed(value))
+            for key, string in strings.items():
+                if key not in stored:
+                    stored[key] = serde.dumps_interned(string)[1]
+                    written += len(stored[key])
+        dumped = time.perf_counter() - start
+
+        # Кэш записавшего сериализатора содержит все строки, поэтому читает новый экземпляр
+        reader = CompactSerializer()
+        start = time.perf_counter()
+        values = [reader.loads_typed(blob) for blob in blobs]
+        keys = set().union(*(reader.find_interned(value) for value in values))
+        strings = reader.get_cached(keys)
+        strings.update({key: reader.loads_interned(key, stored[key]) for key in keys - strings.keys()})
+        for value in values:
+            reader.restore(value, strings)
+        loaded = time.perf_counter() - start
+        results.append((written + sum(len(blob) for _, blob in blobs), dumped, loaded))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--steps", type=int, default=8, help="Количество шагов супервизора")
+    parser.add_argument("--researchers", type=int, default=3, help="Количество исследователей на шаге")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    states = build_steps(args.steps, args.researchers, args.seed)
+    default = measure_default(states)
+    compact = measure_compact(states)
+
+    print(f"{'шаг':>4} {'json+msgpack, КБ':>17} {'compact, КБ':>12} {'ser, мс':>16} {'de, мс':>16}")
+    for step, ((default_bytes, default_dump, default_load), (compact_bytes, compact_dump, compact_load)) in enumerate(
+        zip(default, compact, strict=True), start=1
+    ):
+        print(
+            f"{step:>4} {default_bytes / 1024:>17.1f} {compact_bytes / 1024:>12.1f} "
+            f"{default_dump * 1000:>7.2f} / {compact_dump * 1000:<6.2f} {default_load * 1000:>7.2f} / {compact_load * 1000:<6.2f}"
+        )
+
+    default_total = sum(item[0] for item in default)
+    compact_total = sum(item[0] for item in compact)
+    print(
+        f"Итого записано: {default_total / 1024:.1f} КБ против {compact_total / 1024:.1f} КБ "
+        f"({default_total / compact_total:.1f}x меньше)"
+    )
+    print(
+        f"Сериализация: {sum(item[1] for item in default) * 1000:.1f} мс против "
+        f"{sum(item[1] for item in compact) * 1000:.1f} мс, "
+        f"десериализация: {sum(item[2] for item in default) * 1000:.1f} мс против "
+        f"{sum(item[2] for item in compact) * 1000:.1f} мс"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Проверка времени импорта модулей сервиса
+
+Каждый модуль импортируется в отдельном процессе, чтобы уже загруженные модули не влияли на замер.
+Скрипт завершается с ошибкой, если время импорта хотя бы одного модуля превышает бюджет.
+
+Запуск из корня репозитория (нужен .env с настройками):
+
+    python benchmarks/import_time.py
+"""
+
+import subprocess  # noqa: S404
+import sys
+
+# Бюджет времени импорта в секундах
+IMPORT_BUDGETS = {
+    "deep_research.config": 0.5,
+    "deep_research.backend.models": 0.75,
+    "deep_research.ml": 0.5,
+    "deep_research.backend.app": 2.0,
+}
+
+# Модули, которые не должны загружаться при старте API: они импортируются при первом использовании
+LAZY_MODULES = ["langchain_google_genai", "langchain_tavily"]
+
+MEASURE_CODE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+loaded = [name for name in {lazy_modules!r} if name in sys.modules]
+print(elapsed, ",".join(loaded))
+"""
+
+
+def measure(module: str, repeats: int = 3) -> tuple[float, list[str]]:
+    """Измеряет время импорта модуля в отдельном процессе
+
+    Args:
+        module (str): Имя модуля
+        repeats (int): Количество замеров, берется минимальное время
+
+    Returns:
+        tuple[float, list[str]]: Время импорта в секундах и загруженные при импорте ленивые модули
+    """
+    timings = []
+    loaded: list[str] = []
+    for _ in range(repeats):
+        result = subprocess.run(  # noqa: S603
+            [sys.executable, "-W", "ignore", "-c", MEASURE_CODE.format(module=module, lazy_modules=LAZY_MODULES)],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        elapsed, _, loaded_modules = result.stdout.strip().partition(" ")
+        timings.append(float(elapsed))
+        loaded = [name for name in loaded_modules.split(",") if name]
+    return min(timings), loaded
+
+
+def main() -> int:
+    failed = False
+    for module, budget in IMPORT_BUDGETS.items():
+        elapsed, loaded = measure(module)
+        status = "OK" if elapsed <= budget and not loaded else "FAIL"
+        failed = failed or status == "FAIL"
+        print(f"{status:4} {module:40} {elapsed:.3f}s (бюджет {budget:.2f}s)")
+        for name in loaded:
+            print(f"     {name} загружен при импорте, хотя должен загружаться лениво")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
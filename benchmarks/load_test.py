@@ -0,0 +1,549 @@
+"""Нагрузочное тестирование API
+
+Приложение FastAPI запускается в этом же процессе вместе с lifespan (создание таблиц, прогрев, обработчик
+очереди) поверх локального PostgreSQL или SQLite, а LLM и веб-поиск заменяются фейками с настраиваемой
+задержкой. Виртуальные пользователи по кругу выполняют сценарии:
+
+- research: создание исследования и ожидание отчета;
+- clarify: создание исследования с уточняющими вопросами, ответ на них и ожидание отчета;
+- browse: список исследований и получение одного из них.
+
+Нагрузка подается ступенями по числу пользователей. Для каждой ступени выводятся пропускная способность,
+перцентили задержки по операциям, насыщение пула соединений с БД, задержка цикла событий и состояние
+контроллера допуска, а в конце - медленные обратные вызовы цикла событий по узлам графа и запросам.
+Клиент работает в том же цикле событий, что и приложение, поэтому задержка цикла включает и нагрузку от клиента.
+
+Запуск из корня репозитория (для SQLite по умолчанию нужен пакет aiosqlite из группы зависимостей dev):
+
+    python benchmarks/load_test.py --users 5 20 50 --duration 30
+    python benchmarks/load_test.py --database-url postgresql+asyncpg://postgres@localhost/loadtest --reset
+
+Переменные окружения и .env применяются как обычно, кроме параметров, заданных флагами.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import tempfile
+import time
+import uuid
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Any
+
+import httpx
+from langchain_core.messages import AIMessage, AnyMessage
+
+# Без .env приложению нужны обязательные настройки; ключи API фейковым бэкендам не нужны
+REQUIRED_ENV = {
+    "AGENT_LLM_NAME": "fake",
+    "AGENT_RATE_LIMIT_PER_MINUTE": "600",
+    "AGENT_GOOGLE_API_KEY": "fake",
+    "AGENT_TAVILY_API_KEY": "fake",
+    "DATABASE_NAME": "postgres",
+    "DATABASE_USER": "postgres",
+    "DATABASE_PASSWORD": "postgres",
+    "DATABASE_HOST": "localhost",
+    "API_TITLE": "Deep Research API",
+    "API_DESCRIPTION": "Load test",
+    "API_VERSION": "load-test",
+    "API_HOST": "127.0.0.1",
+    "API_PORT": "8000",
+    "API_RELOAD": "false",
+}
+DEFAULT_MIX = {"research": 5, "clarify": 3, "browse": 2}
+# Запрос с этой пометкой фейковая модель уточняет у пользователя
+CLARIFY_MARKER = "[уточни]"
+# Слова тем исследователей: темы должны различаться, иначе планировщик объединит их в одно исследование
+TOPIC_WORDS = [
+    "рынок инвестиции стоимость",
+    "регулирование закон стандарты",
+    "технологии архитектура алгоритмы",
+    "пациенты клиники диагностика",
+    "образование кадры навыки",
+]
+WEBPAGE_ID_PATTERN = re.compile(r'<webpage id="(\d+)">')
+ACTIVE_STATUSES = {"pending", "in_progress"}
+# Как долго GET /research/{id} ждет изменений сессии при опросе
+POLL_WAIT = 5
+MONITOR_INTERVAL = 0.05
+
+
+class FakeLatency:
+    """Задержка ответа фейкового бэкенда с логнормальным распределением и заданным средним"""
+
+    def __init__(self, mean: float, rng: random.Random) -> None:
+        self.mean = mean
+        self.rng = rng
+
+    async def wait(self) -> None:
+        if self.mean > 0:
+            # Для логнормального распределения со sigma=0.5 среднее равно exp(mu + sigma^2 / 2)
+            await asyncio.sleep(self.rng.lognormvariate(math.log(self.mean) - 0.125, 0.5))
+
+
+class FakeChatModel:
+    """Модель, которая отвечает на запросы узлов графа без обращения к API
+
+    Args:
+        latency (FakeLatency): Задержка ответа
+        researchers (int): Сколько исследователей запускает супервизор
+        search_rounds (int): Сколько поисков делает исследователь
+        use_rate_limiter (bool): Ждать ли общий ограничитель частоты, как настоящая модель
+        blocking (float): Сколько секунд синхронной работы в цикле событий добавлять к каждому ответу
+    """
+
+    def __init__(
+        self,
+        latency: FakeLatency,
+        researchers: int,
+        search_rounds: int,
+        use_rate_limiter: bool,
+        blocking: float = 0,
+    ) -> None:
+        self.latency = latency
+        self.researchers = researchers
+        self.search_rounds = search_rounds
+        self.use_rate_limiter = use_rate_limiter
+        self.blocking = blocking
+
+    async def call(self) -> None:
+        if self.use_rate_limiter:
+            from deep_research.ml.utils import get_rate_limiter
+
+            await get_rate_limiter().aacquire()
+        await self.latency.wait()
+        if self.blocking:
+            # Имитация синхронной обработки ответа, которую должен заметить мониторинг цикла событий
+            time.sleep(self.blocking)
+
+    def bind_tools(self, tools: list[Any], **kwargs: Any) -> "FakeToolModel":
+        return FakeToolModel(self, [tool.name for tool in tools])
+
+    def with_structured_output(self, schema: type, **kwargs: Any) -> "FakeStructuredModel":
+        return FakeStructuredModel(self, schema)
+
+    async def ainvoke(self, messages: list[AnyMessage], *args: Any, **kwargs: Any) -> AIMessage:
+        await self.call()
+        text = str(messages[-1].content)
+        return AIMessage(content=f"# Отчет\n\n{text[:200]}\n\n" + "Вывод по теме исследования. " * 40)
+
+
+class FakeToolModel:
+    """Ответы супервизора и исследователя с вызовами инструментов"""
+
+    def __init__(self, model: FakeChatModel, tool_names: list[str]) -> None:
+        self.model = model
+        self.tool_names = tool_names
+
+    async def ainvoke(self, messages: list[AnyMessage], *args: Any, **kwargs: Any) -> AIMessage:
+        await self.model.call()
+        topic = next(str(message.content) for message in messages if message.type == "human")
+        if "conduct_research_tool" in self.tool_names:
+            if any(message.type == "tool" for message in messages):
+                return AIMessage(content="Исследование завершено")
+            calls = [
+                {
+                    "name": "conduct_research_tool",
+                    "args": {"research_topic": f"{TOPIC_WORDS[i % len(TOPIC_WORDS)]} {i}: {topic[:80]}"},
+                    "id": f"call-{uuid.uuid4().hex[:12]}",
+                }
+                for i in range(self.model.researchers)
+            ]
+            return AIMessage(content="", tool_calls=calls)
+
+        searches = sum(1 for message in messages if message.type == "ai" and message.tool_calls)
+        if searches >= self.model.search_rounds:
+            return AIMessage(content="Информации достаточно")
+        call = {
+            "name": "web_search_tool",
+            "args": {"queries": [f"{topic[:60]} {searches}"]},
+            "id": f"call-{uuid.uuid4().hex[:12]}",
+        }
+        return AIMessage(content="", tool_calls=[call])
+
+
+class FakeStructuredModel:
+    """Структурированные ответы: уточнение, резюме страниц и сводка находок"""
+
+    def __init__(self, model: FakeChatModel, schema: type) -> None:
+        self.model = model
+        self.schema = schema
+
+    async def ainvoke(self, messages: list[AnyMessage], *args: Any, **kwargs: Any) -> Any:
+        await self.model.call()
+        prompt = str(messages[-1].content)
+        name = self.schema.__name__
+        if name == "ClarifyWithUser":
+            # Вопросы задаются, только пока в диалоге нет ответа ассистента
+            need_clarification = CLARIFY_MARKER in prompt and "AI:" not in prompt
+            return self.schema(need_clarification=need_clarification, questions="Уточните период?", verification="ok")
+        if name == "WebSummary":
+            return self.schema(summary="Краткое содержание страницы", key_excerpts="Цитата")
+        if name == "WebSummaryBatch":
+            summaries = [
+                {"page_id": int(page_id), "summary": "Краткое содержание страницы", "key_excerpts": "Цитата"}
+                for page_id in WEBPAGE_ID_PATTERN.findall(prompt)
+            ]
+            return self.schema(summaries=summaries)
+        if name == "ResearchDigest":
+            return self.schema(digest="Сводка находок [1]\n\nИсточники:\n[1] https://example.com", topic_covered=False)
+        raise ValueError(f"Фейковая модель не поддерживает схему {name}")
+
+
+class FakeSearchClient:
+    """Веб-поиск со страницами-заглушками"""
+
+    def __init__(self, latency: FakeLatency, max_results: int) -> None:
+        self.latency = latency
+        self.max_results = max_results
+
+    async def abatch(self, queries: list[str]) -> list[dict[str, Any]]:
+        await self.latency.wait()
+        return [
+            {
+                "query": query,
+                "results": [
+                    {
+                        "url": f"https://example.com/{uuid.uuid5(uuid.NAMESPACE_URL, query).hex}/{i}",
+                        "title": f"Страница {i} по запросу {query}",
+                        "content": "Фрагмент страницы",
+                        "raw_content": f"Содержимое страницы {i} по запросу {query}. " * 60,
+                    }
+                    for i in range(self.max_results)
+                ],
+            }
+            for query in queries
+        ]
+
+
+@dataclass
+class StageStats:
+    """Замеры одной ступени нагрузки"""
+
+    users: int
+    latencies: dict[str, list[float]] = field(default_factory=lambda: defaultdict(list))
+    statuses: Counter[str] = field(default_factory=Counter)
+    scenarios: Counter[str] = field(default_factory=Counter)
+    failed_scenarios: Counter[str] = field(default_factory=Counter)
+    loop_lags: list[float] = field(default_factory=list)
+    pool_checked_out: list[int] = field(default_factory=list)
+    admission_in_flight: list[int] = field(default_factory=list)
+    admission_queued: list[int] = field(default_factory=list)
+    elapsed: float = 0.0
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Перцентиль по ближайшему рангу"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))]
+
+
+class LoadTest:
+    """Виртуальные пользователи и мониторинг приложения на одной ступени нагрузки"""
+
+    def __init__(
+        self, client: httpx.AsyncClient, mix: dict[str, int], think_time: float, tenants: int, seed: int
+    ) -> None:
+        self.client = client
+        self.mix = mix
+        self.think_time = think_time
+        self.tenants = tenants
+        self.rng = random.Random(seed)  # noqa: S311
+        self.session_ids: list[int] = []
+
+    async def request(self, stats: StageStats, operation: str, method: str, url: str, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except Exception as e:
+            stats.statuses[f"{operation}:{type(e).__name__}"] += 1
+            return None
+        stats.latencies[operation].append(time.perf_counter() - start)
+        stats.statuses[f"{operation}:{response.status_code}"] += 1
+        return response
+
+    async def poll(self, stats: StageStats, response: httpx.Response) -> dict[str, Any] | None:
+        """Ждет, пока сессия не выйдет из статусов pending и in_progress"""
+        session = response.json()
+        etag = response.headers.get("ETag")
+        while session["status"] in ACTIVE_STATUSES:
+            headers = {"If-None-Match": etag} if etag else {}
+            response = await self.request(
+                stats, "poll", "GET", f"/research/{session['id']}", params={"wait": POLL_WAIT}, headers=headers
+            )
+            if response is None or response.status_code not in (200, 304):
+                return None
+            if response.status_code == 200:
+                session = response.json()
+                etag = response.headers.get("ETag")
+        return session
+
+    async def research(self, stats: StageStats, user: int, clarify: bool) -> bool:
+        query = f"{CLARIFY_MARKER if clarify else ''} Исследование {user}-{uuid.uuid4().hex[:8]}".strip()
+        # Квоты тенантов ограничивают число одновременных исследований, поэтому по умолчанию у каждого
+        # пользователя свой тенант
+        headers = {"X-Tenant-ID": f"load-{user % self.tenants if self.tenants else user}"}
+        response = await self.request(stats, "create", "POST", "/research", json={"query": query}, headers=headers)
+        if response is None or response.status_code != 201:
+            return False
+        session = await self.poll(stats, response)
+        if session is None:
+            return False
+        self.session_ids.append(session["id"])
+
+        if clarify:
+            if session["status"] != "awaiting_clarification":
+                return False
+            response = await self.request(
+                stats, "continue", "POST", f"/research/{session['id']}/continue", json={"response": "За 2024 год"}
+            )
+            if response is None or response.status_code != 200:
+                return False
+            session = await self.poll(stats, response)
+        return session is not None and session["status"] == "completed"
+
+    async def browse(self, stats: StageStats) -> bool:
+        response = await self.request(stats, "list", "GET", "/research")
+        if response is None or response.status_code != 200:
+            return False
+        if self.session_ids:
+            session_id = self.rng.choice(self.session_ids)
+            response = await self.request(stats, "get", "GET", f"/research/{session_id}")
+            return response is not None and response.status_code == 200
+        return True
+
+    async def user(self, stats: StageStats, user: int, deadline: float) -> None:
+        names, weights = list(self.mix), list(self.mix.values())
+        while time.monotonic() < deadline:
+            scenario = self.rng.choices(names, weights)[0]
+            if scenario == "browse":
+                ok = await self.browse(stats)
+            else:
+                ok = await self.research(stats, user, clarify=scenario == "clarify")
+            stats.scenarios[scenario] += 1
+            if not ok:
+                stats.failed_scenarios[scenario] += 1
+            await asyncio.sleep(self.think_time)
+
+    async def monitor(self, stats: StageStats) -> None:
+        from deep_research.backend.admission import admission_controller
+        from deep_research.backend.database import get_pool_stats
+
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(MONITOR_INTERVAL)
+            stats.loop_lags.append(max(0.0, loop.time() - start - MONITOR_INTERVAL))
+            stats.pool_checked_out.append(get_pool_stats().checked_out)
+            stats.admission_in_flight.append(admission_controller.in_flight + admission_controller.worker_in_flight)
+            stats.admission_queued.append(admission_controller.queued)
+
+    async def run_stage(self, users: int, duration: float) -> StageStats:
+        """Запускает ступень нагрузки: новые сценарии начинаются до конца ступени, начатые дожидаются"""
+        stats = StageStats(users=users)
+        monitor = asyncio.create_task(self.monitor(stats))
+        start = time.monotonic()
+        await asyncio.gather(*(self.user(stats, user, start + duration) for user in range(users)))
+        stats.elapsed = time.monotonic() - start
+        monitor.cancel()
+        return stats
+
+
+def summarize(stats: StageStats, pool_capacity: int) -> dict[str, Any]:
+    """Сводка замеров ступени"""
+    requests = sum(len(latencies) for latencies in stats.latencies.values())
+    completed = sum(stats.scenarios.values()) - sum(stats.failed_scenarios.values())
+    return {
+        "users": stats.users,
+        "elapsed": round(stats.elapsed, 2),
+        "requests_per_second": round(requests / stats.elapsed, 2),
+        "scenarios_per_second": round(completed / stats.elapsed, 2),
+        "scenarios": dict(stats.scenarios),
+        "failed_scenarios": dict(stats.failed_scenarios),
+        "statuses": dict(sorted(stats.statuses.items())),
+        "latency": {
+            operation: {
+                "count": len(latencies),
+                "p50": round(percentile(latencies, 50), 4),
+                "p90": round(percentile(latencies, 90), 4),
+                "p99": round(percentile(latencies, 99), 4),
+                "max": round(max(latencies), 4),
+            }
+            for operation, latencies in sorted(stats.latencies.items())
+        },
+        "db_pool": {
+            "capacity": pool_capacity,
+            "max_checked_out": max(stats.pool_checked_out, default=0),
+            "mean_checked_out": round(sum(stats.pool_checked_out) / max(len(stats.pool_checked_out), 1), 2),
+            "saturated_share": round(
+                sum(checked_out >= pool_capacity for checked_out in stats.pool_checked_out)
+                / max(len(stats.pool_checked_out), 1),
+                4,
+            ),
+        },
+        "loop_lag": {
+            "p50": round(percentile(stats.loop_lags, 50), 4),
+            "p99": round(percentile(stats.loop_lags, 99), 4),
+            "max": round(max(stats.loop_lags, default=0), 4),
+        },
+        "admission": {
+            "max_in_flight": max(stats.admission_in_flight, default=0),
+            "max_queued": max(stats.admission_queued, default=0),
+        },
+    }
+
+
+def print_summary(summary: dict[str, Any]) -> None:
+    pool, lag, admission = summary["db_pool"], summary["loop_lag"], summary["admission"]
+    print(
+        f"\n=== {summary['users']} пользователей, {summary['elapsed']} с: "
+        f"{summary['requests_per_second']} запросов/с, {summary['scenarios_per_second']} сценариев/с"
+    )
+    print(f"Сценарии: {summary['scenarios']}, неуспешные: {summary['failed_scenarios']}")
+    print(f"Ответы: {summary['statuses']}")
+    print(f"{'операция':<10} {'кол-во':>7} {'p50, мс':>9} {'p90, мс':>9} {'p99, мс':>9} {'max, мс':>9}")
+    for operation, latency in summary["latency"].items():
+        print(
+            f"{operation:<10} {latency['count']:>7} {latency['p50'] * 1000:>9.1f} {latency['p90'] * 1000:>9.1f} "
+            f"{latency['p99'] * 1000:>9.1f} {latency['max'] * 1000:>9.1f}"
+        )
+    print(
+        f"Пул БД: занято до {pool['max_checked_out']} из {pool['capacity']} "
+        f"(в среднем {pool['mean_checked_out']}, полностью занят {pool['saturated_share']:.1%} времени)"
+    )
+    print(
+        f"Задержка цикла событий: p50 {lag['p50'] * 1000:.1f} мс, p99 {lag['p99'] * 1000:.1f} мс, max {lag['max'] * 1000:.1f} мс"
+    )
+    print(f"Допуск: выполнялось до {admission['max_in_flight']}, в очереди до {admission['max_queued']}")
+
+
+def print_slow_callbacks(stats: dict[str, Any]) -> None:
+    """Печатает медленные обратные вызовы цикла событий по узлам графа и запросам за все ступени"""
+    print(f"\nМедленные обратные вызовы (от {stats['slow_callback_threshold'] * 1000:.0f} мс) по месту выполнения:")
+    if not stats["slow_callbacks"]:
+        print("нет")
+        return
+    print(f"{'место':<45} {'кол-во':>7} {'всего, мс':>10} {'max, мс':>9}")
+    for item in stats["slow_callbacks"]:
+        print(
+            f"{item['activity']:<45} {item['count']:>7} {item['total_time'] * 1000:>10.1f} {item['max_time'] * 1000:>9.1f}"
+        )
+
+
+def patch_backends(args: argparse.Namespace) -> None:
+    """Подменяет LLM и веб-поиск во всех модулях, которые их импортировали"""
+    from deep_research.backend import service
+    from deep_research.ml import graph, researcher_subgraph, search_providers, supervisor_subgraph, tools
+
+    rng = random.Random(args.seed)  # noqa: S311
+    model = FakeChatModel(
+        FakeLatency(args.llm_latency, rng),
+        args.researchers,
+        args.search_rounds,
+        use_rate_limiter=args.rate_limit > 0,
+        blocking=args.llm_blocking / 1000,
+    )
+    search_latency = FakeLatency(args.search_latency, rng)
+
+    def get_search_client(max_results: int = 5, topic: str = "general") -> FakeSearchClient:
+        return FakeSearchClient(search_latency, max_results)
+
+    for module in (graph, researcher_subgraph, supervisor_subgraph, tools, service):
+        module.get_llm = lambda: model
+    search_providers.get_search_client = get_search_client
+
+
+def parse_mix(value: str) -> dict[str, int]:
+    mix = {}
+    for item in value.split(","):
+        name, weight = item.split("=")
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Неизвестный сценарий {name}")
+        mix[name] = int(weight)
+    return mix
+
+
+async def run(args: argparse.Namespace) -> list[dict[str, Any]]:
+    from deep_research.backend.app import app
+    from deep_research.backend.database import engine
+    from deep_research.backend.models import Base
+    from deep_research.config import settings
+
+    patch_backends(args)
+    if args.reset:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+
+    summaries = []
+    pool_capacity = settings.DATABASE.POOL_SIZE + settings.DATABASE.MAX_OVERFLOW
+    transport = httpx.ASGITransport(app=app)
+    async with (
+        app.router.lifespan_context(app),
+        httpx.AsyncClient(transport=transport, base_url="http://load-test", timeout=args.timeout) as client,
+    ):
+        load_test = LoadTest(client, args.mix, args.think_time, args.tenants, args.seed)
+        for users in args.users:
+            summary = summarize(await load_test.run_stage(users, args.duration), pool_capacity)
+            print_summary(summary)
+            summaries.append(summary)
+        print_slow_callbacks((await client.get("/metrics/loop")).json())
+    await engine.dispose()
+    return summaries
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--users", type=int, nargs="+", default=[5, 20, 50], help="Ступени нагрузки: число пользователей"
+    )
+    parser.add_argument("--duration", type=float, default=30, help="Длительность ступени в секундах")
+    parser.add_argument(
+        "--mix", type=parse_mix, default=DEFAULT_MIX, help="Веса сценариев: research=5,clarify=3,browse=2"
+    )
+    parser.add_argument("--think-time", type=float, default=0.5, help="Пауза пользователя между сценариями, с")
+    parser.add_argument(
+        "--tenants", type=int, default=0, help="Число тенантов (0 - свой тенант у каждого пользователя)"
+    )
+    parser.add_argument("--database-url", help="Строка подключения SQLAlchemy; по умолчанию временная база SQLite")
+    parser.add_argument("--reset", action="store_true", help="Удалить таблицы перед запуском (только для тестовой БД)")
+    parser.add_argument("--queue", action="store_true", help="Выполнять исследования через очередь обработчиков")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Средняя задержка ответа LLM, с")
+    parser.add_argument(
+        "--llm-blocking", type=float, default=0, help="Синхронная работа в цикле событий на ответ LLM, мс"
+    )
+    parser.add_argument("--search-latency", type=float, default=0.3, help="Средняя задержка веб-поиска, с")
+    parser.add_argument("--rate-limit", type=int, default=0, help="Лимит запросов к LLM в минуту (0 - без лимита)")
+    parser.add_argument("--researchers", type=int, default=3, help="Исследователей на сессию")
+    parser.add_argument("--search-rounds", type=int, default=2, help="Поисков на исследователя")
+    parser.add_argument("--timeout", type=float, default=120, help="Таймаут запроса клиента, с")
+    parser.add_argument("--output", help="Файл для сводки в JSON")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # Настройки читаются при импорте приложения, поэтому окружение задается до него
+    for key, value in REQUIRED_ENV.items():
+        os.environ.setdefault(key, value)
+    database_url = args.database_url or f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/load_test.db"
+    os.environ["DATABASE_DSN"] = database_url
+    os.environ["WORKER_QUEUE_ENABLED"] = str(args.queue).lower()
+    os.environ["WORKER_IN_API"] = "true"
+    os.environ["CASSETTE_MODE"] = "off"
+    if args.rate_limit > 0:
+        os.environ["AGENT_RATE_LIMIT_PER_MINUTE"] = str(args.rate_limit)
+    print(f"База данных: {database_url}")
+
+    summaries = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(summaries, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
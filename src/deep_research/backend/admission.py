@@ -0,0 +1,270 @@
+"""Допуск запросов, которые запускают агента
+
+Каждое исследование делает десятки вызовов LLM через общий ограничитель частоты, поэтому при всплеске
+запросов все исследования замедляются одновременно, пока клиенты не отвалятся по таймауту. Контроллер
+допуска ограничивает число исследований, выполняемых процессом, держит короткую очередь ожидания
+и отклоняет новые запросы с ответом 503 и оценкой Retry-After, когда очередь заполнена, ограничитель
+перегружен или в режиме очереди накопилось слишком много ожидающих сессий.
+"""
+
+import asyncio
+import math
+import re
+import time
+from collections import Counter, deque
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager, suppress
+
+from sqlalchemy import func, select
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from deep_research.backend.database import async_session_maker
+from deep_research.backend.models import ResearchSession, ResearchStatus
+from deep_research.backend.schemas import AdmissionStats
+from deep_research.config import settings
+from deep_research.ml.utils import get_rate_limiter
+
+# Запросы, которые запускают агента: создание, продолжение и возобновление исследования
+RESEARCH_PATH_PATTERN = re.compile(r"^/research(?:/\d+/(continue|resume))?/?$")
+# Вес нового замера в скользящем среднем длительности исследования
+DURATION_SMOOTHING = 0.2
+# Как часто обновлять число ожидающих сессий из базы данных
+PENDING_REFRESH_SECONDS = 1.0
+
+
+class AdmissionRejectedError(Exception):
+    """Запрос отклонен контроллером допуска
+
+    Args:
+        message (str): Описание причины
+        reason (str): Короткое название причины для метрик
+        retry_after (int): Через сколько секунд стоит повторить запрос
+    """
+
+    def __init__(self, message: str, reason: str, retry_after: int) -> None:
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def runs_in_request(path: str) -> bool | None:
+    """Выполняется ли агент в рамках запроса
+
+    Args:
+        path (str): Путь запроса
+
+    Returns:
+        bool | None: None, если запрос не запускает агента. В режиме очереди создание и продолжение
+            исследования только ставят сессию в очередь, а возобновление всегда выполняется в запросе.
+    """
+    match = RESEARCH_PATH_PATTERN.match(path)
+    if match is None:
+        return None
+    return not settings.WORKER.QUEUE_ENABLED or match.group(1) == "resume"
+
+
+class AdmissionController:
+    """Счетчики выполняемых исследований процесса и решения о допуске новых
+
+    Исследования, запущенные обработчиком очереди, учитываются отдельно и не занимают слотов:
+    их число ограничено WORKER_CONCURRENCY, а завершение не передает слот ждущим запросам.
+    """
+
+    def __init__(self) -> None:
+        self.in_flight = 0
+        self.worker_in_flight = 0
+        self.pending = 0
+        self.average_duration = 0.0
+        self.admitted = 0
+        self.rejected: Counter[str] = Counter()
+        self._waiters: deque[asyncio.Future] = deque()
+        self._pending_checked_at = -math.inf
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def _reject(self, message: str, reason: str, retry_after: float) -> AdmissionRejectedError:
+        self.rejected[reason] += 1
+        return AdmissionRejectedError(message, reason, max(1, math.ceil(retry_after)))
+
+    def _estimate_drain(self, backlog: int, capacity: int) -> float:
+        """Оценка времени, за которое освободится место для backlog исследований"""
+        duration = self.average_duration or settings.ADMISSION.RETRY_AFTER_SECONDS
+        return duration * backlog / max(capacity, 1)
+
+    def _release_slot(self) -> None:
+        # Слот передается первому ждущему напрямую, чтобы новый запрос не обогнал очередь
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    async def _count_pending(self) -> int:
+        now = time.monotonic()
+        if now - self._pending_checked_at >= PENDING_REFRESH_SECONDS:
+            self._pending_checked_at = now
+            async with async_session_maker() as db:
+                self.pending = await db.scalar(
+                    select(func.count()).where(ResearchSession.status == ResearchStatus.PENDING)
+                )
+        return self.pending
+
+    async def _check_backlog(self) -> None:
+        """Отклоняет запрос, если ограничитель частоты LLM или очередь сессий перегружены"""
+        limiter_wait = get_rate_limiter().estimated_wait
+        if limiter_wait > settings.ADMISSION.MAX_LIMITER_WAIT_SECONDS:
+            raise self._reject(
+                f"Очередь запросов к LLM слишком длинная: ожидание {limiter_wait:.0f} с",
+                "limiter",
+                limiter_wait - settings.ADMISSION.MAX_LIMITER_WAIT_SECONDS,
+            )
+
+        if settings.WORKER.QUEUE_ENABLED:
+            pending = await self._count_pending()
+            if pending >= settings.ADMISSION.MAX_PENDING:
+                raise self._reject(
+                    f"В очереди уже {pending} исследований",
+                    "pending",
+                    self._estimate_drain(pending - settings.ADMISSION.MAX_PENDING + 1, settings.WORKER.CONCURRENCY),
+                )
+
+    async def _acquire_slot(self) -> None:
+        """Занимает слот выполняемого исследования, при необходимости ожидая его в очереди"""
+        if self.in_flight < settings.ADMISSION.MAX_IN_FLIGHT and not self._waiters:
+            self.in_flight += 1
+            return
+
+        if len(self._waiters) >= settings.ADMISSION.MAX_QUEUED:
+            raise self._reject(
+                "Сервис перегружен: все слоты исследований заняты",
+                "queue_full",
+                self._estimate_drain(len(self._waiters) + 1, settings.ADMISSION.MAX_IN_FLIGHT),
+            )
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            async with asyncio.timeout(settings.ADMISSION.QUEUE_TIMEOUT_SECONDS):
+                await waiter
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # Слот успели передать, но запрос его уже не использует
+                self._release_slot()
+            else:
+                waiter.cancel()
+                with suppress(ValueError):
+                    self._waiters.remove(waiter)
+            if isinstance(e, TimeoutError):
+                raise self._reject(
+                    "Сервис перегружен: слот исследования не освободился вовремя",
+                    "queue_timeout",
+                    self._estimate_drain(len(self._waiters) + 1, settings.ADMISSION.MAX_IN_FLIGHT),
+                ) from None
+            raise
+
+    async def acquire(self, in_request: bool) -> bool:
+        """Допускает запрос, который запускает агента
+
+        Args:
+            in_request (bool): Выполняется ли агент в рамках запроса. Только такие запросы занимают слот.
+
+        Raises:
+            AdmissionRejectedError: Если запрос отклонен
+
+        Returns:
+            bool: True, если занят слот, который нужно освободить через release
+        """
+        await self._check_backlog()
+        if in_request:
+            await self._acquire_slot()
+        self.admitted += 1
+        return in_request
+
+    def _record_duration(self, started_at: float) -> None:
+        duration = time.monotonic() - started_at
+        if self.average_duration:
+            self.average_duration += DURATION_SMOOTHING * (duration - self.average_duration)
+        else:
+            self.average_duration = duration
+
+    def release(self, started_at: float) -> None:
+        """Освобождает слот исследования и учитывает его длительность
+
+        Args:
+            started_at (float): Время начала исследования по time.monotonic
+        """
+        self._record_duration(started_at)
+        self._release_slot()
+
+    @asynccontextmanager
+    async def track(self) -> AsyncIterator[None]:
+        """Учитывает исследование, запущенное обработчиком очереди, не занимая слота"""
+        self.worker_in_flight += 1
+        started_at = time.monotonic()
+        try:
+            yield
+        finally:
+            self.worker_in_flight -= 1
+            self._record_duration(started_at)
+
+    def get_stats(self) -> AdmissionStats:
+        """Текущее состояние контроллера допуска
+
+        Returns:
+            AdmissionStats: Метрики допуска
+        """
+        limiter = get_rate_limiter()
+        return AdmissionStats(
+            in_flight=self.in_flight,
+            worker_in_flight=self.worker_in_flight,
+            max_in_flight=settings.ADMISSION.MAX_IN_FLIGHT,
+            queued=self.queued,
+            max_queued=settings.ADMISSION.MAX_QUEUED,
+            pending=self.pending,
+            limiter_waiting=limiter.waiting,
+            limiter_estimated_wait=round(limiter.estimated_wait, 3),
+            limiter_average_wait=round(limiter.average_wait, 3),
+            average_duration=round(self.average_duration, 3),
+            admitted=self.admitted,
+            rejected=dict(self.rejected),
+        )
+
+
+class AdmissionMiddleware:
+    """ASGI middleware, пропускающее запросы, которые запускают агента, через контроллер допуска
+
+    Отклоненные запросы получают 503 Service Unavailable с заголовком Retry-After.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "POST" or not settings.ADMISSION.ENABLED:
+            await self.app(scope, receive, send)
+            return
+        in_request = runs_in_request(scope["path"])
+        if in_request is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            holds_slot = await admission_controller.acquire(in_request)
+        except AdmissionRejectedError as e:
+            response = JSONResponse({"detail": str(e)}, status_code=503, headers={"Retry-After": str(e.retry_after)})
+            await response(scope, receive, send)
+            return
+
+        started_at = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if holds_slot:
+                admission_controller.release(started_at)
+
+
+admission_controller = AdmissionController()
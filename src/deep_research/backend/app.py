@@ -1,17 +1,29 @@
+import asyncio
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from deep_research.backend.admission import AdmissionMiddleware
 from deep_research.backend.database import init_db
+from deep_research.backend.loop_monitor import LoopActivityMiddleware, loop_monitor
 from deep_research.backend.router import router
+from deep_research.backend.service import deep_research_service
 from deep_research.config import settings
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    loop_monitor.start()
     await init_db()
+    deep_research_service.warmup()
+    # Обработчик очереди работает в фоне, не блокируя старт API, и подхватывает в том числе
+    # исследования, прерванные прошлым запуском или падением другого процесса
+    worker_task = asyncio.create_task(deep_research_service.run_worker()) if settings.WORKER.IN_API else None
     yield
+    if worker_task:
+        worker_task.cancel()
+    await loop_monitor.stop()
 
 
 app = FastAPI(
@@ -21,6 +33,10 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+# Добавляется до CORS, чтобы отклоненные запросы тоже получали CORS-заголовки
+app.add_middleware(AdmissionMiddleware)
+# Снаружи допуска, чтобы блокировки при проверке допуска тоже относились к запросу
+app.add_middleware(LoopActivityMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -0,0 +1,95 @@
+"""Кэширование и повторное использование готовых исследований"""
+
+import hashlib
+from collections import OrderedDict
+from datetime import UTC, datetime, timedelta
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from deep_research.backend.models import ResearchSession, ResearchStatus
+from deep_research.config import settings
+from deep_research.ml import ReportStore
+
+
+def hash_text(text: str) -> str:
+    """Хэш нормализованного текста: без учета регистра и лишних пробелов
+
+    Args:
+        text (str): Текст запроса или исследовательского задания
+
+    Returns:
+        str: SHA-256 хэш нормализованного текста
+    """
+    normalized = " ".join(text.casefold().split())
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def get_reuse_threshold() -> datetime:
+    """Самое раннее время завершения исследования, которое еще можно переиспользовать"""
+    return datetime.now(UTC) - timedelta(seconds=settings.CACHE.REUSE_WINDOW_SECONDS)
+
+
+class ResponseCache:
+    """LRU-кэш сериализованных ответов по завершенным исследованиям
+
+    Завершенные сессии больше не изменяются, поэтому их ответ можно сериализовать один раз
+    и отдавать без обращения к базе данных.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._items: OrderedDict[int, tuple[int, bytes]] = OrderedDict()
+
+    def get(self, research_id: int) -> tuple[int, bytes] | None:
+        """Получить ответ из кэша
+
+        Args:
+            research_id (int): ID сессии
+
+        Returns:
+            tuple[int, bytes] | None: Версия сессии и сериализованный ответ или None, если ответа нет в кэше
+        """
+        item = self._items.get(research_id)
+        if item is not None:
+            self._items.move_to_end(research_id)
+        return item
+
+    def put(self, research_id: int, version: int, content: bytes) -> None:
+        """Сохранить ответ в кэш
+
+        Args:
+            research_id (int): ID сессии
+            version (int): Версия сессии
+            content (bytes): Сериализованный ответ
+        """
+        if self.max_size <= 0:
+            return
+        self._items[research_id] = (version, content)
+        self._items.move_to_end(research_id)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+
+class SQLAlchemyReportStore(ReportStore):
+    """Поиск недавних отчетов по исследовательскому заданию в базе данных"""
+
+    def __init__(self, session_maker: async_sessionmaker[AsyncSession]) -> None:
+        self.session_maker = session_maker
+
+    async def afind(self, research_brief: str) -> str | None:
+        async with self.session_maker() as db:
+            result = await db.execute(
+                select(ResearchSession.final_report)
+                .where(
+                    ResearchSession.brief_hash == hash_text(research_brief),
+                    ResearchSession.status == ResearchStatus.COMPLETED,
+                    ResearchSession.completed_at >= get_reuse_threshold(),
+                )
+                .order_by(ResearchSession.completed_at.desc())
+                .limit(1)
+            )
+            return result.scalar_one_or_none()
+
+
+response_cache = ResponseCache(settings.CACHE.RESPONSE_SIZE)
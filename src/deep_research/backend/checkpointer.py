@@ -0,0 +1,455 @@
+"""Хранение состояния графа агента в базе данных"""
+
+import json
+import random
+from collections.abc import AsyncIterator, Sequence
+from typing import Any
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    CheckpointMetadata,
+    CheckpointTuple,
+    SerializerProtocol,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.base import Checkpoint as GraphCheckpoint
+from sqlalchemy import delete, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from deep_research.backend.models import Checkpoint, CheckpointBlob, CheckpointWrite, ResearcherResult
+from deep_research.backend.serde import CompactSerializer
+from deep_research.ml import ResearchResult, ResearchResultStore
+from deep_research.ml.offload import offload
+
+# Служебный канал, под которым хранятся вынесенные строки потока; версия строки - хэш ее содержимого
+INTERNED_CHANNEL = "__interned__"
+# Вставка, пропускающая уже существующие строки, для диалектов, которые ее поддерживают
+INSERT_IGNORING_CONFLICTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+class SQLAlchemyCheckpointSaver(BaseCheckpointSaver[str]):
+    """Чекпоинтер LangGraph, сохраняющий состояние графа в базе данных
+
+    Структура хранения повторяет MemorySaver: чекпоинты, значения каналов по версиям
+    и промежуточные записи задач хранятся в отдельных таблицах. Значения каналов пишутся
+    только для изменившихся версий, поэтому неизменные каналы не сериализуются повторно.
+
+    По умолчанию используется CompactSerializer: большие строки из значений каналов и записей
+    хранятся один раз на поток в таблице значений каналов под служебным каналом INTERNED_CHANNEL.
+    """
+
+    def __init__(
+        self,
+        session_maker: async_sessionmaker[AsyncSession],
+        *,
+        serde: SerializerProtocol | None = None,
+    ) -> None:
+        super().__init__(serde=serde or CompactSerializer())
+        self.session_maker = session_maker
+
+    def _dumps_values(self, values: list[Any]) -> tuple[list[tuple[str, bytes]], dict[str, str]]:
+        """Сериализует значения каналов или записей, вынося большие строки
+
+        Returns:
+            tuple[list[tuple[str, bytes]], dict[str, str]]: Тип и данные каждого значения и вынесенные строки по хэшу
+        """
+        interned: dict[str, str] = {}
+        dumped = []
+        for value in values:
+            if isinstance(self.serde, CompactSerializer):
+                value, strings = self.serde.intern(value)
+                interned.update(strings)
+            dumped.append(self.serde.dumps_typed(value))
+        return dumped, interned
+
+    def _loads_values(self, blobs: list[tuple[str, bytes]]) -> list[Any]:
+        """Десериализует значения каналов или записей"""
+        return [self.serde.loads_typed(blob) for blob in blobs]
+
+    async def _save_interned(self, db: AsyncSession, thread_id: str, interned: dict[str, str]) -> None:
+        """Сохраняет вынесенные строки, которых еще нет у потока"""
+        if not interned or not isinstance(self.serde, CompactSerializer):
+            return
+
+        result = await db.execute(
+            select(CheckpointBlob.version).where(
+                CheckpointBlob.thread_id == thread_id,
+                CheckpointBlob.checkpoint_ns == "",
+                CheckpointBlob.channel == INTERNED_CHANNEL,
+                CheckpointBlob.version.in_(list(interned)),
+            )
+        )
+        existing = set(result.scalars())
+        keys = [key for key in interned if key not in existing]
+        if not keys:
+            return
+
+        serde = self.serde
+        blobs = await offload(lambda: [serde.dumps_interned(interned[key]) for key in keys])
+        rows = [
+            {
+                "thread_id": thread_id,
+                "checkpoint_ns": "",
+                "channel": INTERNED_CHANNEL,
+                "version": key,
+                "type": blob_type,
+                "blob": blob,
+            }
+            for key, (blob_type, blob) in zip(keys, blobs, strict=True)
+        ]
+
+        # Параллельные задачи потока могут одновременно сохранять одну и ту же строку
+        dialect = db.get_bind().dialect.name
+        if dialect in INSERT_IGNORING_CONFLICTS:
+            await db.execute(INSERT_IGNORING_CONFLICTS[dialect](CheckpointBlob).values(rows).on_conflict_do_nothing())
+        else:
+            db.add_all(CheckpointBlob(**row) for row in rows)
+
+    async def _restore_interned(self, db: AsyncSession, thread_id: str, value: Any) -> Any:
+        """Подставляет в значение вынесенные строки потока"""
+        if not isinstance(self.serde, CompactSerializer):
+            return value
+
+        keys = self.serde.find_interned(value)
+        if not keys:
+            return value
+
+        serde = self.serde
+        strings = serde.get_cached(keys)
+        rows: list[tuple[str, bytes]] = []
+        if missing := keys - strings.keys():
+            result = await db.execute(
+                select(CheckpointBlob.version, CheckpointBlob.blob).where(
+                    CheckpointBlob.thread_id == thread_id,
+                    CheckpointBlob.checkpoint_ns == "",
+                    CheckpointBlob.channel == INTERNED_CHANNEL,
+                    CheckpointBlob.version.in_(list(missing)),
+                )
+            )
+            rows = list(result.tuples())
+
+        def restore() -> Any:
+            strings.update({key: serde.loads_interned(key, blob) for key, blob in rows})
+            return serde.restore(value, strings)
+
+        return await offload(restore)
+
+    async def _load_blobs(
+        self,
+        db: AsyncSession,
+        thread_id: str,
+        checkpoint_ns: str,
+        versions: ChannelVersions,
+    ) -> dict[str, Any]:
+        """Загружает значения каналов для указанных версий"""
+        if not versions:
+            return {}
+
+        result = await db.execute(
+            select(CheckpointBlob).where(
+                CheckpointBlob.thread_id == thread_id,
+                CheckpointBlob.checkpoint_ns == checkpoint_ns,
+                tuple_(CheckpointBlob.channel, CheckpointBlob.version).in_(
+                    [(channel, str(version)) for channel, version in versions.items()]
+                ),
+            )
+        )
+
+        blobs = [blob for blob in result.scalars() if blob.type != "empty"]
+        values = await offload(self._loads_values, [(blob.type, blob.blob) for blob in blobs])
+        return {blob.channel: value for blob, value in zip(blobs, values, strict=True)}
+
+    async def _build_tuple(self, db: AsyncSession, row: Checkpoint) -> CheckpointTuple:
+        """Собирает CheckpointTuple из строки таблицы чекпоинтов"""
+        checkpoint: GraphCheckpoint = self.serde.loads_typed((row.type, row.checkpoint))
+        channel_values = await self._load_blobs(db, row.thread_id, row.checkpoint_ns, checkpoint["channel_versions"])
+
+        writes = await db.execute(
+            select(CheckpointWrite)
+            .where(
+                CheckpointWrite.thread_id == row.thread_id,
+                CheckpointWrite.checkpoint_ns == row.checkpoint_ns,
+                CheckpointWrite.checkpoint_id == row.checkpoint_id,
+            )
+            .order_by(CheckpointWrite.task_id, CheckpointWrite.idx)
+        )
+
+        rows = list(writes.scalars())
+        values = await offload(self._loads_values, [(write.type, write.blob) for write in rows])
+        pending_writes = [(write.task_id, write.channel, value) for write, value in zip(rows, values, strict=True)]
+        channel_values, pending_writes = await self._restore_interned(
+            db, row.thread_id, (channel_values, pending_writes)
+        )
+
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": row.thread_id,
+                    "checkpoint_ns": row.checkpoint_ns,
+                    "checkpoint_id": row.checkpoint_id,
+                }
+            },
+            checkpoint={**checkpoint, "channel_values": channel_values},
+            metadata=self.serde.loads_typed((row.metadata_type, row.metadata_)),
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": row.thread_id,
+                        "checkpoint_ns": row.checkpoint_ns,
+                        "checkpoint_id": row.parent_checkpoint_id,
+                    }
+                }
+                if row.parent_checkpoint_id
+                else None
+            ),
+            pending_writes=pending_writes,
+        )
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        """Получить чекпоинт по конфигурации
+
+        Если в конфигурации указан checkpoint_id, то возвращается этот чекпоинт, иначе - последний для потока
+
+        Args:
+            config (RunnableConfig): Конфигурация графа
+
+        Returns:
+            CheckpointTuple | None: Чекпоинт или None, если он не найден
+        """
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+
+        query = select(Checkpoint).where(
+            Checkpoint.thread_id == thread_id,
+            Checkpoint.checkpoint_ns == checkpoint_ns,
+        )
+        if checkpoint_id := get_checkpoint_id(config):
+            query = query.where(Checkpoint.checkpoint_id == checkpoint_id)
+        else:
+            query = query.order_by(Checkpoint.checkpoint_id.desc()).limit(1)
+
+        async with self.session_maker() as db:
+            row = (await db.execute(query)).scalar_one_or_none()
+            if row is None:
+                return None
+            return await self._build_tuple(db, row)
+
+    async def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        """Получить список чекпоинтов, начиная с самого нового
+
+        Args:
+            config (RunnableConfig | None): Конфигурация для фильтрации по потоку, пространству имен и ID
+            filter (dict[str, Any] | None): Фильтр по метаданным чекпоинта
+            before (RunnableConfig | None): Вернуть только чекпоинты, созданные до указанного
+            limit (int | None): Максимальное количество чекпоинтов
+
+        Yields:
+            CheckpointTuple: Чекпоинт
+        """
+        query = select(Checkpoint).order_by(Checkpoint.checkpoint_id.desc())
+        if config:
+            query = query.where(Checkpoint.thread_id == config["configurable"]["thread_id"])
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                query = query.where(Checkpoint.checkpoint_ns == checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                query = query.where(Checkpoint.checkpoint_id == checkpoint_id)
+        if before and (before_checkpoint_id := get_checkpoint_id(before)):
+            query = query.where(Checkpoint.checkpoint_id < before_checkpoint_id)
+
+        async with self.session_maker() as db:
+            rows = (await db.execute(query)).scalars().all()
+            for row in rows:
+                if limit is not None and limit <= 0:
+                    break
+
+                if filter:
+                    metadata = self.serde.loads_typed((row.metadata_type, row.metadata_))
+                    if not all(metadata.get(key) == value for key, value in filter.items()):
+                        continue
+
+                if limit is not None:
+                    limit -= 1
+
+                yield await self._build_tuple(db, row)
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: GraphCheckpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Сохранить чекпоинт и изменившиеся значения каналов
+
+        Args:
+            config (RunnableConfig): Конфигурация графа
+            checkpoint (GraphCheckpoint): Чекпоинт
+            metadata (CheckpointMetadata): Метаданные чекпоинта
+            new_versions (ChannelVersions): Новые версии каналов
+
+        Returns:
+            RunnableConfig: Конфигурация с ID сохраненного чекпоинта
+        """
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+
+        checkpoint_copy = checkpoint.copy()
+        values: dict[str, Any] = checkpoint_copy.pop("channel_values")  # type: ignore[misc]
+        checkpoint_type, checkpoint_blob = self.serde.dumps_typed(checkpoint_copy)
+        metadata_type, metadata_blob = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+
+        channels = [channel for channel in new_versions if channel in values]
+        dumped, interned = await offload(self._dumps_values, [values[channel] for channel in channels])
+        blobs = dict(zip(channels, dumped, strict=True))
+        async with self.session_maker() as db, db.begin():
+            for channel, version in new_versions.items():
+                blob_type, blob = blobs.get(channel, ("empty", b""))
+                await db.merge(
+                    CheckpointBlob(
+                        thread_id=thread_id,
+                        checkpoint_ns=checkpoint_ns,
+                        channel=channel,
+                        version=str(version),
+                        type=blob_type,
+                        blob=blob,
+                    )
+                )
+
+            await self._save_interned(db, thread_id, interned)
+            await db.merge(
+                Checkpoint(
+                    thread_id=thread_id,
+                    checkpoint_ns=checkpoint_ns,
+                    checkpoint_id=checkpoint["id"],
+                    parent_checkpoint_id=config["configurable"].get("checkpoint_id"),
+                    type=checkpoint_type,
+                    checkpoint=checkpoint_blob,
+                    metadata_type=metadata_type,
+                    metadata_=metadata_blob,
+                )
+            )
+
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """Сохранить промежуточные записи задачи
+
+        Обычные записи не перезаписываются, если уже были сохранены, а служебные (ошибки, прерывания) - заменяются
+
+        Args:
+            config (RunnableConfig): Конфигурация графа
+            writes (Sequence[tuple[str, Any]]): Записи в формате (канал, значение)
+            task_id (str): ID задачи
+            task_path (str): Путь задачи
+        """
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+
+        async with self.session_maker() as db, db.begin():
+            result = await db.execute(
+                select(CheckpointWrite.idx).where(
+                    CheckpointWrite.thread_id == thread_id,
+                    CheckpointWrite.checkpoint_ns == checkpoint_ns,
+                    CheckpointWrite.checkpoint_id == checkpoint_id,
+                    CheckpointWrite.task_id == task_id,
+                )
+            )
+            existing_idx = set(result.scalars())
+
+            new_writes = []
+            for idx, (channel, value) in enumerate(writes):
+                write_idx = WRITES_IDX_MAP.get(channel, idx)
+                if write_idx < 0 or write_idx not in existing_idx:
+                    new_writes.append((write_idx, channel, value))
+
+            dumped, interned = await offload(self._dumps_values, [value for _, _, value in new_writes])
+            for (write_idx, channel, _), (write_type, blob) in zip(new_writes, dumped, strict=True):
+                await db.merge(
+                    CheckpointWrite(
+                        thread_id=thread_id,
+                        checkpoint_ns=checkpoint_ns,
+                        checkpoint_id=checkpoint_id,
+                        task_id=task_id,
+                        idx=write_idx,
+                        channel=channel,
+                        type=write_type,
+                        blob=blob,
+                        task_path=task_path,
+                    )
+                )
+            await self._save_interned(db, thread_id, interned)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        """Удалить все чекпоинты и записи потока
+
+        Args:
+            thread_id (str): ID потока графа
+        """
+        async with self.session_maker() as db, db.begin():
+            for model in (Checkpoint, CheckpointBlob, CheckpointWrite):
+                await db.execute(delete(model).where(model.thread_id == thread_id))
+
+    def get_next_version(self, current: str | None, channel: None) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        next_v = current_v + 1
+        next_h = random.random()  # noqa: S311
+        return f"{next_v:032}.{next_h:016}"
+
+
+class SQLAlchemyResearchResultStore(ResearchResultStore):
+    """Хранилище результатов исследователей в базе данных"""
+
+    def __init__(self, session_maker: async_sessionmaker[AsyncSession]) -> None:
+        self.session_maker = session_maker
+
+    async def aget(self, thread_id: str, tool_call_id: str) -> ResearchResult | None:
+        async with self.session_maker() as db:
+            row = await db.get(ResearcherResult, (thread_id, tool_call_id))
+            if row is None:
+                return None
+            return ResearchResult(compressed_research=row.compressed_research, raw_notes=json.loads(row.raw_notes))
+
+    async def aput(self, thread_id: str, tool_call_id: str, result: ResearchResult) -> None:
+        async with self.session_maker() as db, db.begin():
+            await db.merge(
+                ResearcherResult(
+                    thread_id=thread_id,
+                    tool_call_id=tool_call_id,
+                    compressed_research=result["compressed_research"],
+                    raw_notes=json.dumps(result["raw_notes"]),
+                )
+            )
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        async with self.session_maker() as db, db.begin():
+            await db.execute(delete(ResearcherResult).where(ResearcherResult.thread_id == thread_id))
@@ -1,18 +1,105 @@
+import logging
 from collections.abc import AsyncGenerator
+from typing import Any
 
+from sqlalchemy import Column, Connection, Enum, Table, inspect, make_url
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.sql.functions import FunctionElement
 
 from deep_research.backend.models import Base
+from deep_research.backend.schemas import DatabasePoolStats
+from deep_research.backend.search import index_missing_sessions
 from deep_research.config import settings
 
-engine = create_async_engine(settings.DATABASE.URL)
+logger = logging.getLogger(__name__)
+
+
+def get_connect_args(url: str) -> dict[str, Any]:
+    """Параметры подключения драйвера: таймаут запросов задается только для PostgreSQL"""
+    if make_url(url).get_backend_name() != "postgresql":
+        return {}
+    return {"server_settings": {"statement_timeout": str(settings.DATABASE.STATEMENT_TIMEOUT_MS)}}
+
+
+engine = create_async_engine(
+    settings.DATABASE.URL,
+    pool_size=settings.DATABASE.POOL_SIZE,
+    max_overflow=settings.DATABASE.MAX_OVERFLOW,
+    pool_timeout=settings.DATABASE.POOL_TIMEOUT,
+    pool_recycle=settings.DATABASE.POOL_RECYCLE,
+    pool_pre_ping=settings.DATABASE.POOL_PRE_PING,
+    connect_args=get_connect_args(settings.DATABASE.URL),
+)
 async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
 
 
+def add_column(conn: Connection, table: Table, column: Column) -> None:
+    """Добавляет колонку в существующую таблицу
+
+    SQLite не добавляет колонку, значение по умолчанию которой вычисляется функцией, в непустую таблицу,
+    поэтому там такая колонка добавляется без ограничений и заполняется отдельным запросом.
+
+    Args:
+        conn (Connection): Соединение с базой данных
+        table (Table): Таблица
+        column (Column): Колонка модели
+    """
+    server_default = getattr(column.server_default, "arg", None)
+    fill_separately = conn.dialect.name == "sqlite" and isinstance(server_default, FunctionElement)
+    definition = Column(column.name, column.type) if fill_separately else column
+
+    column_ddl = CreateColumn(definition).compile(dialect=conn.dialect)
+    conn.exec_driver_sql(f"ALTER TABLE {conn.dialect.identifier_preparer.format_table(table)} ADD COLUMN {column_ddl}")
+    if fill_separately:
+        conn.execute(table.update().values({column.name: server_default}))
+
+
+def upgrade_schema(conn: Connection) -> None:
+    """Добавляет в существующие таблицы колонки, индексы и значения перечислений, которых в них нет
+
+    create_all создает только отсутствующие таблицы, поэтому таблицы, созданные предыдущими версиями,
+    дополняются здесь. Новые колонки получают значения из server_default. Колонки и значения не удаляются
+    и не изменяются.
+
+    Args:
+        conn (Connection): Соединение с базой данных
+    """
+    inspector = inspect(conn)
+    preparer = conn.dialect.identifier_preparer
+    # Перечисления хранятся отдельными типами только в PostgreSQL
+    existing_enums = (
+        {enum["name"]: enum["labels"] for enum in inspector.get_enums()} if conn.dialect.name == "postgresql" else {}
+    )
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if isinstance(column.type, Enum) and column.type.name in existing_enums:
+                for value in column.type.enums:
+                    if value not in existing_enums[column.type.name]:
+                        conn.exec_driver_sql(f"ALTER TYPE {preparer.format_type(column.type)} ADD VALUE '{value}'")
+                        logger.info("В перечисление %s добавлено значение %s", column.type.name, value)
+            if column.name in existing_columns:
+                continue
+            add_column(conn, table, column)
+            logger.info("В таблицу %s добавлена колонка %s", table.name, column.name)
+
+        existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(conn)
+                logger.info("В таблицу %s добавлен индекс %s", table.name, index.name)
+
+
 async def init_db() -> None:
-    """Инициализация базы данных - создание всех таблиц"""
+    """Инициализация базы данных - создание и обновление таблиц и индексация завершенных исследований"""
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(upgrade_schema)
+        await index_missing_sessions(conn)
 
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
@@ -26,3 +113,19 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
     """
     async with async_session_maker() as session:
         yield session
+
+
+def get_pool_stats() -> DatabasePoolStats:
+    """Текущее состояние пула соединений
+
+    Returns:
+        DatabasePoolStats: Метрики пула соединений
+    """
+    pool = engine.pool
+    return DatabasePoolStats(
+        size=pool.size(),
+        checked_in=pool.checkedin(),
+        checked_out=pool.checkedout(),
+        overflow=pool.overflow(),
+        max_overflow=settings.DATABASE.MAX_OVERFLOW,
+    )
@@ -0,0 +1,215 @@
+"""Потоковая выгрузка сессий исследований в NDJSON, CSV и Parquet
+
+Сессии читаются курсором на стороне сервера пачками по API_EXPORT_BATCH_SIZE строк и сразу отдаются клиенту,
+поэтому память процесса не зависит от числа выгружаемых исследований. Пачки форматируются в пуле потоков.
+В Parquet каждая пачка становится группой строк; этот формат доступен, только если установлен pyarrow.
+"""
+
+import csv
+import io
+import json
+from collections.abc import AsyncIterator, Callable, Iterable
+from datetime import datetime
+from typing import Any, Literal
+
+from sqlalchemy import Row, Select, select
+
+from deep_research.backend.database import async_session_maker
+from deep_research.backend.models import ResearchSession, ResearchStatus
+from deep_research.config import settings
+from deep_research.ml.offload import offload
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow не установлен
+    pa = pq = None
+
+ExportFormat = Literal["ndjson", "csv", "parquet"]
+
+EXPORT_MEDIA_TYPES: dict[ExportFormat, str] = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+EXPORT_COLUMNS = (
+    "id",
+    "status",
+    "tenant_id",
+    "created_at",
+    "completed_at",
+    "research_brief",
+    "final_report",
+    "messages",
+    "input_tokens",
+    "output_tokens",
+    "llm_calls",
+    "search_calls",
+    "cache_hits",
+    "wall_time",
+    "node_wall_time",
+)
+# Колонки, в которых хранится JSON: в NDJSON они выгружаются объектами, в CSV - строкой JSON
+JSON_COLUMNS = {"messages", "node_wall_time"}
+INTEGER_COLUMNS = {"id", "input_tokens", "output_tokens", "llm_calls", "search_calls", "cache_hits"}
+DATETIME_COLUMNS = {"created_at", "completed_at"}
+
+
+def check_export_format(format: ExportFormat) -> None:
+    """Проверяет, что выгрузка в формате format доступна
+
+    Args:
+        format (ExportFormat): Формат выгрузки
+
+    Raises:
+        ValueError: Выгрузка в Parquet, когда pyarrow не установлен
+    """
+    if format == "parquet" and pq is None:
+        raise ValueError("Для выгрузки в Parquet установите пакет pyarrow")
+
+
+def build_export_statement(
+    statuses: list[ResearchStatus] | None,
+    min_id: int | None,
+    max_id: int | None,
+) -> Select:
+    """Запрос выгружаемых сессий в порядке ID
+
+    Выбираются отдельные колонки, а не объекты ORM, чтобы прочитанные строки не накапливались в сессии.
+
+    Args:
+        statuses (list[ResearchStatus] | None): Статусы сессий; None - все статусы
+        min_id (int | None): Минимальный ID включительно
+        max_id (int | None): Максимальный ID включительно
+
+    Returns:
+        Select: Запрос выгрузки
+    """
+    statement = select(*(getattr(ResearchSession, column) for column in EXPORT_COLUMNS)).order_by(ResearchSession.id)
+    if statuses:
+        statement = statement.where(ResearchSession.status.in_(statuses))
+    if min_id is not None:
+        statement = statement.where(ResearchSession.id >= min_id)
+    if max_id is not None:
+        statement = statement.where(ResearchSession.id <= max_id)
+    return statement
+
+
+def format_value(value: Any) -> Any:
+    """Значение колонки для NDJSON и CSV: дата и время в ISO 8601, остальные значения без изменений"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def format_ndjson(rows: Iterable[Row]) -> bytes:
+    """Пачка строк в NDJSON"""
+    lines = []
+    for row in rows:
+        item = {column: format_value(value) for column, value in zip(EXPORT_COLUMNS, row, strict=True)}
+        for column in JSON_COLUMNS:
+            item[column] = json.loads(item[column]) if item[column] else None
+        lines.append(json.dumps(item, ensure_ascii=False) + "\n")
+    return "".join(lines).encode()
+
+
+def format_csv(rows: Iterable[Row]) -> bytes:
+    """Пачка строк в CSV без заголовка"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([format_value(value) for value in row] for row in rows)
+    return buffer.getvalue().encode()
+
+
+class ParquetBuffer(io.RawIOBase):
+    """Файл для ParquetWriter, записанные в который байты отдаются клиенту по частям
+
+    ParquetWriter запоминает смещения групп строк по tell(), поэтому позиция отсчитывается от начала
+    выгрузки, хотя отданные байты в памяти не хранятся.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def take(self) -> bytes:
+        """Байты, записанные после предыдущего вызова"""
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class ParquetFormatter:
+    """Форматирует пачки строк в группы строк одного файла Parquet"""
+
+    def __init__(self) -> None:
+        types = {column: pa.string() for column in EXPORT_COLUMNS}
+        types.update({column: pa.int64() for column in INTEGER_COLUMNS})
+        types.update({column: pa.timestamp("us", tz="UTC") for column in DATETIME_COLUMNS})
+        types["wall_time"] = pa.float64()
+        self.schema = pa.schema([(column, types[column]) for column in EXPORT_COLUMNS])
+        self._buffer = ParquetBuffer()
+        self._writer = pq.ParquetWriter(self._buffer, self.schema)
+
+    def format(self, rows: Iterable[Row]) -> bytes:
+        """Пачка строк в группу строк Parquet"""
+        table = pa.Table.from_pylist([dict(zip(EXPORT_COLUMNS, row, strict=True)) for row in rows], self.schema)
+        self._writer.write_table(table)
+        return self._buffer.take()
+
+    def close(self) -> bytes:
+        """Метаданные в конце файла"""
+        self._writer.close()
+        return self._buffer.take()
+
+
+async def stream_research_sessions(
+    format: ExportFormat,
+    statuses: list[ResearchStatus] | None = None,
+    min_id: int | None = None,
+    max_id: int | None = None,
+) -> AsyncIterator[bytes]:
+    """Выгружает сессии исследований по частям
+
+    Сессия базы данных открывается внутри генератора: зависимость get_db закрывается раньше,
+    чем ответ начинает отправляться клиенту.
+
+    Args:
+        format (ExportFormat): Формат выгрузки
+        statuses (list[ResearchStatus] | None): Статусы сессий; None - все статусы
+        min_id (int | None): Минимальный ID включительно
+        max_id (int | None): Максимальный ID включительно
+
+    Yields:
+        bytes: Очередная часть выгрузки, по одной на пачку строк
+    """
+    parquet = ParquetFormatter() if format == "parquet" else None
+    format_rows: Callable[[Iterable[Row]], bytes] = format_ndjson
+    if format == "csv":
+        yield format_csv([EXPORT_COLUMNS])
+        format_rows = format_csv
+    elif parquet is not None:
+        format_rows = parquet.format
+
+    statement = build_export_statement(statuses, min_id, max_id).execution_options(
+        yield_per=settings.API.EXPORT_BATCH_SIZE
+    )
+    async with async_session_maker() as db:
+        result = await db.stream(statement)
+        async for rows in result.partitions():
+            yield await offload(format_rows, rows)
+
+    if parquet is not None:
+        yield parquet.close()
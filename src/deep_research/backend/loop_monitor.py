@@ -0,0 +1,244 @@
+"""Мониторинг цикла событий
+
+Сервис полностью асинхронный, поэтому любая синхронная работа в цикле событий (большой JSON, форматирование
+длинной истории, сериализация чекпоинтов) задерживает все запросы и исследования процесса. Монитор
+периодически замеряет, насколько позже положенного просыпается фоновая задача, а сторожевой поток
+отправляет в цикл событий контрольные вызовы. Если вызов не выполнился за LOOP_SLOW_CALLBACK_MS, то поток
+снимает стек потока цикла событий, и блокировка пишется в лог и суммируется по узлу графа или запросу API,
+в котором она произошла.
+
+Монитор использует только публичный API цикла событий, поэтому работает и с asyncio, и с uvloop.
+"""
+
+import asyncio
+import contextvars
+import logging
+import re
+import sys
+import threading
+import time
+import weakref
+from collections import Counter, defaultdict, deque
+from collections.abc import Coroutine
+from contextlib import suppress
+from types import FrameType
+from typing import Any
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from deep_research.backend.schemas import LoopStats, SlowCallbackStats
+from deep_research.config import settings
+from deep_research.ml.usage import current_activity
+
+logger = logging.getLogger(__name__)
+
+# Блокировки вне узлов графа и запросов API
+UNATTRIBUTED = "other"
+# ID в путях запросов заменяются шаблоном, чтобы запросы к разным сессиям суммировались вместе
+PATH_ID_PATTERN = re.compile(r"/\d+(?=/|$)")
+# Код сервиса, который ищется в стеке для описания места блокировки
+PACKAGE_NAME = "deep_research"
+
+
+def format_frame(frame: FrameType) -> str:
+    """Модуль, функция и строка кадра стека"""
+    return f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_qualname}:{frame.f_lineno}"
+
+
+def describe_frame(frame: FrameType | None) -> str:
+    """Место блокировки: текущая функция и самая глубокая функция сервиса в стеке, если это не она"""
+    if frame is None:
+        return "unknown"
+    location = format_frame(frame)
+    while frame is not None and not frame.f_globals.get("__name__", "").startswith(PACKAGE_NAME):
+        frame = frame.f_back
+    if frame is None or format_frame(frame) == location:
+        return location
+    return f"{location} из {format_frame(frame)}"
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Перцентиль по ближайшему рангу"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+class LoopMonitor:
+    """Задержка цикла событий и блокировки процесса
+
+    Чтобы узнать, в каком узле графа или запросе случилась блокировка, монитор запоминает контекст каждой
+    задачи через фабрику задач цикла событий: из другого потока контекст выполняемой задачи иначе не прочитать.
+    """
+
+    def __init__(self) -> None:
+        self.lags: deque[float] = deque(maxlen=settings.LOOP.LAG_WINDOW)
+        self.max_lag = 0.0
+        self.slow_callbacks: Counter[str] = Counter()
+        self.blocked_time: defaultdict[str, float] = defaultdict(float)
+        self.max_blocked_time: defaultdict[str, float] = defaultdict(float)
+        self._task: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stopping = threading.Event()
+        self._contexts: weakref.WeakKeyDictionary[asyncio.Task, contextvars.Context] = weakref.WeakKeyDictionary()
+        self._original_task_factory: Any = None
+
+    def start(self) -> None:
+        """Запускает замеры в текущем цикле событий"""
+        if self._task is not None or not settings.LOOP.MONITOR_ENABLED:
+            return
+        loop = asyncio.get_running_loop()
+        self._install_task_factory(loop)
+        self._task = asyncio.create_task(self._sample_lag())
+        self._stopping.clear()
+        self._watchdog = threading.Thread(
+            target=self._watch,
+            args=(loop, threading.get_ident()),
+            name="loop-monitor",
+            daemon=True,
+        )
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        """Останавливает замеры"""
+        if self._watchdog is not None:
+            self._stopping.set()
+            await asyncio.to_thread(self._watchdog.join)
+            self._watchdog = None
+        if self._task is not None:
+            asyncio.get_running_loop().set_task_factory(self._original_task_factory)
+            self._original_task_factory = None
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    def _install_task_factory(self, loop: asyncio.AbstractEventLoop) -> None:
+        original_task_factory = loop.get_task_factory()
+        contexts = self._contexts
+
+        def task_factory(
+            loop: asyncio.AbstractEventLoop,
+            coro: Coroutine[Any, Any, Any],
+            *,
+            context: contextvars.Context | None = None,
+            **kwargs: Any,
+        ) -> asyncio.Task:
+            # Задача выполняется в копии текущего контекста, если контекст не передан явно
+            context = context if context is not None else contextvars.copy_context()
+            if original_task_factory is None:
+                task = asyncio.Task(coro, loop=loop, context=context, **kwargs)
+            else:
+                task = original_task_factory(loop, coro, context=context, **kwargs)
+            contexts[task] = context
+            return task
+
+        self._original_task_factory = original_task_factory
+        loop.set_task_factory(task_factory)
+
+    async def _sample_lag(self) -> None:
+        loop = asyncio.get_running_loop()
+        interval = settings.LOOP.LAG_INTERVAL_SECONDS
+        while True:
+            started_at = loop.time()
+            await asyncio.sleep(interval)
+            lag = max(0.0, loop.time() - started_at - interval)
+            self.lags.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    def _watch(self, loop: asyncio.AbstractEventLoop, loop_thread_id: int) -> None:
+        """Сторожевой поток: отправляет контрольные вызовы и снимает стек, если вызов опаздывает
+
+        Вызовы отправляются каждые пол-порога, поэтому блокировка от полутора порогов замечается всегда,
+        а ее длительность отсчитывается от отправки вызова и может быть занижена на это время.
+        """
+        threshold = settings.LOOP.SLOW_CALLBACK_MS / 1000
+        while not self._stopping.wait(threshold / 2):
+            answered = threading.Event()
+            sent_at = time.perf_counter()
+            try:
+                loop.call_soon_threadsafe(answered.set)
+            except RuntimeError:
+                # Цикл событий закрыт
+                return
+            if answered.wait(threshold):
+                continue
+
+            activity, location = self._sample(loop, loop_thread_id)
+            while not answered.wait(threshold):
+                if self._stopping.is_set():
+                    return
+            duration = time.perf_counter() - sent_at
+            with suppress(RuntimeError):
+                loop.call_soon_threadsafe(self.record_stall, activity, location, duration)
+
+    def _sample(self, loop: asyncio.AbstractEventLoop, loop_thread_id: int) -> tuple[str, str]:
+        """Место выполнения и стек потока цикла событий в момент блокировки"""
+        task = asyncio.current_task(loop)
+        context = self._contexts.get(task) if task is not None else None
+        activity = (context.get(current_activity) if context is not None else None) or UNATTRIBUTED
+        return activity, describe_frame(sys._current_frames().get(loop_thread_id))
+
+    def record_stall(self, activity: str, location: str, duration: float) -> None:
+        """Учитывает блокировку цикла событий
+
+        Args:
+            activity (str): Узел графа или запрос API, в котором произошла блокировка
+            location (str): Функция, которая выполнялась во время блокировки
+            duration (float): Длительность блокировки в секундах
+        """
+        self.slow_callbacks[activity] += 1
+        self.blocked_time[activity] += duration
+        self.max_blocked_time[activity] = max(self.max_blocked_time[activity], duration)
+        logger.warning("Цикл событий заблокирован на %.0f мс: %s в %s", duration * 1000, location, activity)
+
+    def get_stats(self) -> LoopStats:
+        """Текущее состояние цикла событий
+
+        Returns:
+            LoopStats: Задержка цикла событий и блокировки по месту выполнения
+        """
+        lags = list(self.lags)
+        return LoopStats(
+            lag=round(lags[-1] if lags else 0.0, 4),
+            lag_p50=round(percentile(lags, 50), 4),
+            lag_p99=round(percentile(lags, 99), 4),
+            lag_max=round(self.max_lag, 4),
+            slow_callback_threshold=settings.LOOP.SLOW_CALLBACK_MS / 1000,
+            slow_callbacks=[
+                SlowCallbackStats(
+                    activity=activity,
+                    count=count,
+                    total_time=round(self.blocked_time[activity], 4),
+                    max_time=round(self.max_blocked_time[activity], 4),
+                )
+                for activity, count in sorted(
+                    self.slow_callbacks.items(), key=lambda item: self.blocked_time[item[0]], reverse=True
+                )
+            ],
+        )
+
+
+class LoopActivityMiddleware:
+    """ASGI middleware, записывающее метод и путь запроса в current_activity
+
+    Задачи, созданные во время запроса, например исследование вне очереди, наследуют это значение,
+    пока узел графа не запишет свой путь.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = current_activity.set(f"{scope['method']} {PATH_ID_PATTERN.sub('/{id}', scope['path'])}")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_activity.reset(token)
+
+
+loop_monitor = LoopMonitor()
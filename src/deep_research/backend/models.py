@@ -1,6 +1,8 @@
+from datetime import UTC, datetime
 from enum import StrEnum
 
-from sqlalchemy import Enum, Integer, Text
+from sqlalchemy import Boolean, DateTime, Enum, Float, Index, Integer, LargeBinary, String, Text, false, func
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 
@@ -11,6 +13,7 @@ class ResearchStatus(StrEnum):
     AWAITING_CLARIFICATION = "awaiting_clarification"
     IN_PROGRESS = "in_progress"
     COMPLETED = "completed"
+    FAILED = "failed"
 
 
 class Base(DeclarativeBase):
@@ -20,7 +23,11 @@ class Base(DeclarativeBase):
 
 
 class ResearchSession(Base):
-    """Модель сессии исследования"""
+    """Модель сессии исследования
+
+    Колонки, добавленные после создания таблицы, должны быть nullable или иметь server_default:
+    init_db добавляет их в существующую таблицу через ALTER TABLE.
+    """
 
     __tablename__ = "research_sessions"
 
@@ -29,3 +36,90 @@ class ResearchSession(Base):
     messages: Mapped[str] = mapped_column(Text, nullable=False)
     research_brief: Mapped[str | None] = mapped_column(Text, nullable=True)
     final_report: Mapped[str | None] = mapped_column(Text, nullable=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, server_default="1")
+    query_hash: Mapped[str | None] = mapped_column(String(64), nullable=True, index=True)
+    brief_hash: Mapped[str | None] = mapped_column(String(64), nullable=True, index=True)
+    reuse_recent: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False, server_default=false())
+    tenant_id: Mapped[str] = mapped_column(
+        String(64), default="default", nullable=False, index=True, server_default="default"
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(UTC), nullable=False, server_default=func.now()
+    )
+    completed_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    # Аренда обработчика, который выполняет сессию; истекшая аренда означает, что обработчик упал
+    lease_owner: Mapped[str | None] = mapped_column(String, nullable=True)
+    lease_expires_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False, server_default="0")
+    # Ресурсы, затраченные на все запуски агента по сессии
+    input_tokens: Mapped[int] = mapped_column(Integer, default=0, nullable=False, server_default="0")
+    output_tokens: Mapped[int] = mapped_column(Integer, default=0, nullable=False, server_default="0")
+    llm_calls: Mapped[int] = mapped_column(Integer, default=0, nullable=False, server_default="0")
+    search_calls: Mapped[int] = mapped_column(Integer, default=0, nullable=False, server_default="0")
+    cache_hits: Mapped[int] = mapped_column(Integer, default=0, nullable=False, server_default="0")
+    wall_time: Mapped[float] = mapped_column(Float, default=0, nullable=False, server_default="0")
+    node_wall_time: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # Поисковый вектор по заданию и отчету, заполняется при завершении исследования.
+    # Вне PostgreSQL полнотекстовый поиск недоступен, и колонка хранится как текст
+    search_vector: Mapped[str | None] = mapped_column(
+        TSVECTOR().with_variant(Text(), "sqlite"), nullable=True, deferred=True
+    )
+
+    # Версия увеличивается при каждом изменении строки и используется как ETag
+    __mapper_args__ = {"version_id_col": version}
+    __table_args__ = (Index("ix_research_sessions_search_vector", search_vector, postgresql_using="gin"),)
+
+
+class ResearcherResult(Base):
+    """Результат завершенного исследователя (вызова conduct_research_tool)"""
+
+    __tablename__ = "researcher_results"
+
+    thread_id: Mapped[str] = mapped_column(String, primary_key=True)
+    tool_call_id: Mapped[str] = mapped_column(String, primary_key=True)
+    compressed_research: Mapped[str] = mapped_column(Text, nullable=False)
+    raw_notes: Mapped[str] = mapped_column(Text, nullable=False)
+
+
+class Checkpoint(Base):
+    """Чекпоинт графа LangGraph"""
+
+    __tablename__ = "checkpoints"
+
+    thread_id: Mapped[str] = mapped_column(String, primary_key=True)
+    checkpoint_ns: Mapped[str] = mapped_column(String, primary_key=True)
+    checkpoint_id: Mapped[str] = mapped_column(String, primary_key=True)
+    parent_checkpoint_id: Mapped[str | None] = mapped_column(String, nullable=True)
+    type: Mapped[str] = mapped_column(String, nullable=False)
+    checkpoint: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    metadata_type: Mapped[str] = mapped_column(String, nullable=False)
+    metadata_: Mapped[bytes] = mapped_column("metadata", LargeBinary, nullable=False)
+
+
+class CheckpointBlob(Base):
+    """Значение канала графа для конкретной версии"""
+
+    __tablename__ = "checkpoint_blobs"
+
+    thread_id: Mapped[str] = mapped_column(String, primary_key=True)
+    checkpoint_ns: Mapped[str] = mapped_column(String, primary_key=True)
+    channel: Mapped[str] = mapped_column(String, primary_key=True)
+    version: Mapped[str] = mapped_column(String, primary_key=True)
+    type: Mapped[str] = mapped_column(String, nullable=False)
+    blob: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+
+
+class CheckpointWrite(Base):
+    """Промежуточная запись задачи графа, сделанная до завершения шага"""
+
+    __tablename__ = "checkpoint_writes"
+
+    thread_id: Mapped[str] = mapped_column(String, primary_key=True)
+    checkpoint_ns: Mapped[str] = mapped_column(String, primary_key=True)
+    checkpoint_id: Mapped[str] = mapped_column(String, primary_key=True)
+    task_id: Mapped[str] = mapped_column(String, primary_key=True)
+    idx: Mapped[int] = mapped_column(Integer, primary_key=True)
+    channel: Mapped[str] = mapped_column(String, nullable=False)
+    type: Mapped[str] = mapped_column(String, nullable=False)
+    blob: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    task_path: Mapped[str] = mapped_column(String, nullable=False, default="")
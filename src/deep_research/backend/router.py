@@ -1,21 +1,116 @@
 import json
 from typing import Any
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from deep_research.backend.database import get_db
+from deep_research.backend.admission import admission_controller
+from deep_research.backend.cache import response_cache
+from deep_research.backend.database import get_db, get_pool_stats
+from deep_research.backend.export import (
+    EXPORT_MEDIA_TYPES,
+    ExportFormat,
+    check_export_format,
+    stream_research_sessions,
+)
+from deep_research.backend.loop_monitor import loop_monitor
+from deep_research.backend.models import ResearchSession, ResearchStatus
 from deep_research.backend.schemas import (
+    AdmissionStats,
+    DatabasePoolStats,
+    LoopStats,
+    ResearchSearchResponse,
+    ResearchSearchResult,
     ResearchSessionContinue,
     ResearchSessionCreate,
     ResearchSessionResponse,
+    ResearchSessionUsage,
+    ResearchStats,
 )
+from deep_research.backend.search import search_research_sessions
 from deep_research.backend.service import deep_research_service
+from deep_research.backend.tenants import QuotaExceededError
 from deep_research.config import settings
+from deep_research.ml.offload import aloads_json
 
 router = APIRouter()
 
 
+async def build_research_response(session: ResearchSession) -> ResearchSessionResponse:
+    """Собирает ответ API из сессии исследования
+
+    Длинная история сообщений разбирается в пуле потоков.
+
+    Args:
+        session (ResearchSession): Сессия исследования
+
+    Returns:
+        ResearchSessionResponse: Данные сессии исследования
+    """
+    return ResearchSessionResponse(
+        id=session.id,
+        status=session.status,
+        messages=await aloads_json(session.messages),
+        research_brief=session.research_brief,
+        final_report=session.final_report,
+        version=session.version,
+        tenant_id=session.tenant_id,
+        usage=ResearchSessionUsage(
+            input_tokens=session.input_tokens,
+            output_tokens=session.output_tokens,
+            llm_calls=session.llm_calls,
+            search_calls=session.search_calls,
+            cache_hits=session.cache_hits,
+            wall_time=round(session.wall_time, 3),
+            node_wall_time=json.loads(session.node_wall_time or "{}"),
+        ),
+    )
+
+
+def build_quota_exception(error: QuotaExceededError) -> HTTPException:
+    """Ответ 429 с заголовком Retry-After для тенанта, исчерпавшего квоту"""
+    return HTTPException(status_code=429, detail=str(error), headers={"Retry-After": str(error.retry_after)})
+
+
+def build_etag(research_id: int, version: int) -> str:
+    """ETag сессии исследования, меняющийся при каждом изменении сессии"""
+    return f'"{research_id}-{version}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Проверяет, совпадает ли ETag с заголовком If-None-Match
+
+    Args:
+        if_none_match (str | None): Значение заголовка If-None-Match
+        etag (str): Текущий ETag
+
+    Returns:
+        bool: True, если клиент уже имеет актуальную версию
+    """
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def build_cached_response(content: bytes, etag: str, if_none_match: str | None) -> Response:
+    """Ответ с уже сериализованными данными завершенной сессии
+
+    Args:
+        content (bytes): Сериализованный ответ
+        etag (str): ETag сессии
+        if_none_match (str | None): Значение заголовка If-None-Match
+
+    Returns:
+        Response: Ответ 200 с данными или 304, если у клиента актуальная версия
+    """
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=content, media_type="application/json", headers=headers)
+
+
 @router.get("/")
 async def root() -> dict[str, Any]:
     """Root endpoint
@@ -30,93 +125,239 @@ async def root() -> dict[str, Any]:
     }
 
 
+@router.get("/metrics/db", response_model=DatabasePoolStats)
+async def database_metrics() -> DatabasePoolStats:
+    """Получить метрики пула соединений с базой данных
+
+    Returns:
+        DatabasePoolStats: Состояние пула соединений
+    """
+    return get_pool_stats()
+
+
+@router.get("/metrics/admission", response_model=AdmissionStats)
+async def admission_metrics() -> AdmissionStats:
+    """Получить метрики допуска исследований: выполняемые и ожидающие исследования,
+    очередь ограничителя частоты LLM и отклоненные запросы
+
+    Returns:
+        AdmissionStats: Состояние контроллера допуска
+    """
+    return admission_controller.get_stats()
+
+
+@router.get("/metrics/loop", response_model=LoopStats)
+async def loop_metrics() -> LoopStats:
+    """Получить метрики цикла событий: задержку и медленные обратные вызовы по узлам графа и запросам API
+
+    Returns:
+        LoopStats: Состояние цикла событий
+    """
+    return loop_monitor.get_stats()
+
+
 @router.post("/research", response_model=ResearchSessionResponse, status_code=201)
 async def create_research(
     data: ResearchSessionCreate,
-    db: AsyncSession = Depends(get_db),  # noqa: B008
+    x_tenant_id: str | None = Header(None, max_length=64),
 ) -> ResearchSessionResponse:
     """Создать новое исследование
 
     Args:
         data (ResearchSessionCreate): Данные для создания исследования
-        db (AsyncSession): Сессия базы данных
+        x_tenant_id (str | None): ID тенанта из заголовка X-Tenant-ID
+
+    Raises:
+        HTTPException: 429, если тенант исчерпал квоту
 
     Returns:
         ResearchSessionResponse: Созданная сессия исследования
     """
-    session = await deep_research_service.create_research_session(db, data)
-    messages = json.loads(session.messages)
+    try:
+        session = await deep_research_service.create_research_session(data, x_tenant_id or settings.TENANT.DEFAULT_ID)
+    except QuotaExceededError as e:
+        raise build_quota_exception(e) from e
+    return await build_research_response(session)
 
-    return ResearchSessionResponse(
-        id=session.id,
-        status=session.status,
-        messages=messages,
-        research_brief=session.research_brief,
-        final_report=session.final_report,
+
+@router.get("/research/stats", response_model=ResearchStats)
+async def research_stats(
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),  # noqa: B008
+) -> ResearchStats:
+    """Сводная статистика затрат на исследования
+
+    Args:
+        limit (int): Количество самых затратных сессий в ответе
+        db (AsyncSession): Сессия базы данных
+
+    Returns:
+        ResearchStats: Суммарные и средние затраты и самые затратные сессии
+    """
+    return await deep_research_service.get_research_stats(db, limit)
+
+
+@router.get("/research/search", response_model=ResearchSearchResponse)
+async def search_research(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_db),  # noqa: B008
+) -> ResearchSearchResponse:
+    """Полнотекстовый поиск по заданиям и отчетам завершенных исследований
+
+    Объявлен до /research/{research_id}, чтобы путь не разбирался как ID сессии.
+
+    Args:
+        q (str): Поисковый запрос
+        limit (int): Размер страницы
+        offset (int): Смещение от начала выдачи
+        db (AsyncSession): Сессия базы данных
+
+    Returns:
+        ResearchSearchResponse: Найденные исследования, отсортированные по релевантности
+    """
+
+    try:
+        rows, total = await search_research_sessions(db, q, limit, offset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+    return ResearchSearchResponse(
+        items=[ResearchSearchResult.model_validate(row, from_attributes=True) for row in rows],
+        total=total,
+        limit=limit,
+        offset=offset,
+    )
+
+
+@router.get("/research/export", response_class=StreamingResponse)
+async def export_research(
+    format: ExportFormat = Query("ndjson"),  # noqa: B008
+    status: list[ResearchStatus] | None = Query(None),  # noqa: B008
+    min_id: int | None = Query(None, ge=1),
+    max_id: int | None = Query(None, ge=1),
+) -> StreamingResponse:
+    """Потоковая выгрузка исследований в NDJSON, CSV или Parquet
+
+    В отличие от GET /research, сессии не собираются в память, а читаются курсором на стороне сервера
+    и отдаются клиенту пачками. Объявлен до /research/{research_id}, чтобы путь не разбирался как ID сессии.
+
+    Args:
+        format (ExportFormat): Формат выгрузки: ndjson, csv или parquet
+        status (list[ResearchStatus] | None): Статусы выгружаемых сессий; параметр можно повторять
+        min_id (int | None): Минимальный ID сессии включительно
+        max_id (int | None): Максимальный ID сессии включительно
+
+    Returns:
+        StreamingResponse: Выгрузка сессий в порядке ID
+    """
+    try:
+        check_export_format(format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+    return StreamingResponse(
+        stream_research_sessions(format, status, min_id, max_id),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="research.{format}"'},
     )
 
 
 @router.get("/research/{research_id}", response_model=ResearchSessionResponse)
 async def get_research(
     research_id: int,
+    response: Response,
+    wait: float = Query(0, ge=0, le=settings.API.LONG_POLL_MAX_WAIT),
+    if_none_match: str | None = Header(None),
     db: AsyncSession = Depends(get_db),  # noqa: B008
-) -> ResearchSessionResponse:
+) -> ResearchSessionResponse | Response:
     """Получить исследование по ID
 
+    Поддерживает условный запрос: если ETag из заголовка If-None-Match совпадает с текущей
+    версией сессии, то возвращается 304 без загрузки данных сессии. С параметром wait запрос
+    ждет до wait секунд, пока сессия не изменится относительно версии из If-None-Match.
+
     Args:
         research_id (int): ID сессии
+        response (Response): Ответ, в который добавляется ETag
+        wait (float): Максимальное время ожидания изменений в секундах
+        if_none_match (str | None): ETag версии, которая уже есть у клиента
         db (AsyncSession): Сессия базы данных
 
     Returns:
-        ResearchSessionResponse: Данные сессии исследования
+        ResearchSessionResponse | Response: Данные сессии исследования или 304, если сессия не изменилась
     """
 
+    if cached := response_cache.get(research_id):
+        version, content = cached
+        return build_cached_response(content, build_etag(research_id, version), if_none_match)
+
+    version = await deep_research_service.get_research_session_version(research_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Сессия исследования не найдена")
+
+    if wait and etag_matches(if_none_match, build_etag(research_id, version)):
+        version = await deep_research_service.wait_for_research_session_update(research_id, version, wait)
+
+    etag = build_etag(research_id, version)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
     session = await deep_research_service.get_research_session(db, research_id)
     if not session:
         raise HTTPException(status_code=404, detail="Сессия исследования не найдена")
 
-    messages = json.loads(session.messages)
+    etag = build_etag(research_id, session.version)
+    if session.status == ResearchStatus.COMPLETED:
+        content = (await build_research_response(session)).model_dump_json().encode()
+        response_cache.put(research_id, session.version, content)
+        return build_cached_response(content, etag, if_none_match)
 
-    return ResearchSessionResponse(
-        id=session.id,
-        status=session.status,
-        messages=messages,
-        research_brief=session.research_brief,
-        final_report=session.final_report,
-    )
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return await build_research_response(session)
 
 
 @router.post("/research/{research_id}/continue", response_model=ResearchSessionResponse)
-async def continue_research(
-    research_id: int,
-    data: ResearchSessionContinue,
-    db: AsyncSession = Depends(get_db),  # noqa: B008
-) -> ResearchSessionResponse:
+async def continue_research(research_id: int, data: ResearchSessionContinue) -> ResearchSessionResponse:
     """Продолжить исследование после ответа на уточняющие вопросы
 
     Args:
         research_id (int): ID сессии
         data (ResearchSessionContinue): Ответ пользователя
-        db (AsyncSession): Сессия базы данных
 
     Returns:
         ResearchSessionResponse: Обновленная сессия исследования
     """
 
     try:
-        session = await deep_research_service.continue_research_session(db, research_id, data)
+        session = await deep_research_service.continue_research_session(research_id, data)
+    except QuotaExceededError as e:
+        raise build_quota_exception(e) from e
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e)) from e
 
-    messages = json.loads(session.messages)
+    return await build_research_response(session)
 
-    return ResearchSessionResponse(
-        id=session.id,
-        status=session.status,
-        messages=messages,
-        research_brief=session.research_brief,
-        final_report=session.final_report,
-    )
+
+@router.post("/research/{research_id}/resume", response_model=ResearchSessionResponse)
+async def resume_research(research_id: int) -> ResearchSessionResponse:
+    """Возобновить прерванное исследование с последнего сохраненного шага
+
+    Args:
+        research_id (int): ID сессии
+
+    Returns:
+        ResearchSessionResponse: Обновленная сессия исследования
+    """
+
+    try:
+        session = await deep_research_service.resume_research_session(research_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+    return await build_research_response(session)
 
 
 @router.get("/research", response_model=list[ResearchSessionResponse])
@@ -134,16 +375,6 @@ async def list_research(db: AsyncSession = Depends(get_db)) -> list[ResearchSess
     result = []
 
     for session in sessions:
-        messages = json.loads(session.messages)
-
-        result.append(
-            ResearchSessionResponse(
-                id=session.id,
-                status=session.status,
-                messages=messages,
-                research_brief=session.research_brief,
-                final_report=session.final_report,
-            )
-        )
+        result.append(await build_research_response(session))
 
     return result
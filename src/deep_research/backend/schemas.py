@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from pydantic import BaseModel
 
 from deep_research.backend.models import ResearchStatus
@@ -7,6 +9,7 @@ class ResearchSessionCreate(BaseModel):
     """Создание новой сессии исследования"""
 
     query: str
+    reuse_recent: bool = False
 
 
 class ResearchSessionContinue(BaseModel):
@@ -15,6 +18,23 @@ class ResearchSessionContinue(BaseModel):
     response: str
 
 
+class ResearchUsageTotals(BaseModel):
+    """Ресурсы, затраченные на исследования"""
+
+    input_tokens: int
+    output_tokens: int
+    llm_calls: int
+    search_calls: int
+    cache_hits: int
+    wall_time: float
+
+
+class ResearchSessionUsage(ResearchUsageTotals):
+    """Ресурсы, затраченные на сессию исследования, включая время работы узлов графа"""
+
+    node_wall_time: dict[str, float]
+
+
 class ResearchSessionResponse(BaseModel):
     """Ответ с данными сессии исследования"""
 
@@ -23,3 +43,94 @@ class ResearchSessionResponse(BaseModel):
     messages: list[dict[str, str]]
     research_brief: str | None = None
     final_report: str | None = None
+    version: int
+    tenant_id: str
+    usage: ResearchSessionUsage
+
+
+class ResearchCost(BaseModel):
+    """Затраты на одну сессию исследования"""
+
+    id: int
+    status: ResearchStatus
+    research_brief: str | None = None
+    total_tokens: int
+    llm_calls: int
+    search_calls: int
+    wall_time: float
+
+
+class ResearchStats(BaseModel):
+    """Сводная статистика затрат на исследования"""
+
+    sessions_by_status: dict[ResearchStatus, int]
+    totals: ResearchUsageTotals
+    average_tokens_per_completed: float
+    average_wall_time_per_completed: float
+    most_expensive: list[ResearchCost]
+
+
+class ResearchSearchResult(BaseModel):
+    """Найденное исследование"""
+
+    id: int
+    research_brief: str | None = None
+    snippet: str
+    rank: float
+    completed_at: datetime | None = None
+
+
+class ResearchSearchResponse(BaseModel):
+    """Страница результатов поиска по исследованиям"""
+
+    items: list[ResearchSearchResult]
+    total: int
+    limit: int
+    offset: int
+
+
+class AdmissionStats(BaseModel):
+    """Метрики допуска запросов, которые запускают агента"""
+
+    in_flight: int
+    worker_in_flight: int
+    max_in_flight: int
+    queued: int
+    max_queued: int
+    pending: int
+    limiter_waiting: int
+    limiter_estimated_wait: float
+    limiter_average_wait: float
+    average_duration: float
+    admitted: int
+    rejected: dict[str, int]
+
+
+class SlowCallbackStats(BaseModel):
+    """Медленные обратные вызовы цикла событий в одном узле графа или запросе API"""
+
+    activity: str
+    count: int
+    total_time: float
+    max_time: float
+
+
+class LoopStats(BaseModel):
+    """Задержка цикла событий и медленные обратные вызовы процесса"""
+
+    lag: float
+    lag_p50: float
+    lag_p99: float
+    lag_max: float
+    slow_callback_threshold: float
+    slow_callbacks: list[SlowCallbackStats]
+
+
+class DatabasePoolStats(BaseModel):
+    """Метрики пула соединений с базой данных"""
+
+    size: int
+    checked_in: int
+    checked_out: int
+    overflow: int
+    max_overflow: int
@@ -0,0 +1,132 @@
+"""Полнотекстовый поиск по завершенным исследованиям"""
+
+from typing import Any
+
+from sqlalchemy import Row, Update, func, literal_column, select, update
+from sqlalchemy.engine import Dialect
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from deep_research.backend.models import ResearchSession, ResearchStatus
+from deep_research.config import settings
+
+# Параметры ts_headline для фрагментов отчета с подсвеченными совпадениями
+SNIPPET_OPTIONS = "StartSel=<b>, StopSel=</b>, MaxFragments=2, MaxWords=35, MinWords=15, FragmentDelimiter= ... "
+
+
+def is_supported(dialect: Dialect) -> bool:
+    """Полнотекстовый поиск доступен только в PostgreSQL"""
+    return dialect.name == "postgresql"
+
+
+def build_weighted_vector(column: Any, weight: str) -> Any:
+    """Поисковый вектор текстовой колонки с весом A-D"""
+    text = func.coalesce(column, "")
+    return func.setweight(func.to_tsvector(settings.DATABASE.TEXT_SEARCH_CONFIG, text), literal_column(f"'{weight}'"))
+
+
+def build_index_statement(*where: Any) -> Update:
+    """Запрос, заполняющий поисковый вектор по заданию и отчету
+
+    Задание весит больше отчета, поэтому совпадения в нем выше в выдаче.
+
+    Args:
+        *where (Any): Условия отбора сессий
+
+    Returns:
+        Update: Запрос обновления поискового вектора
+    """
+    brief_vector = build_weighted_vector(ResearchSession.research_brief, "A")
+    report_vector = build_weighted_vector(ResearchSession.final_report, "B")
+    return (
+        update(ResearchSession)
+        .where(*where)
+        .values(search_vector=brief_vector.op("||")(report_vector))
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def index_research_session(db: AsyncSession, session_id: int) -> None:
+    """Добавляет завершенную сессию в поисковый индекс
+
+    Версия сессии не меняется: поисковый вектор не входит в ответ API.
+
+    Args:
+        db (AsyncSession): Сессия базы данных
+        session_id (int): ID сессии
+    """
+    if is_supported(db.get_bind().dialect):
+        await db.execute(build_index_statement(ResearchSession.id == session_id))
+
+
+async def index_missing_sessions(conn: AsyncConnection) -> None:
+    """Индексирует завершенные сессии, у которых еще нет поискового вектора
+
+    Args:
+        conn (AsyncConnection): Соединение с базой данных
+    """
+    if is_supported(conn.dialect):
+        await conn.execute(
+            build_index_statement(
+                ResearchSession.status == ResearchStatus.COMPLETED,
+                ResearchSession.search_vector.is_(None),
+            )
+        )
+
+
+async def search_research_sessions(
+    db: AsyncSession,
+    query: str,
+    limit: int,
+    offset: int,
+) -> tuple[list[Row], int]:
+    """Ищет завершенные сессии по заданию и отчету
+
+    Совпадения ищутся по GIN-индексу и ранжируются через ts_rank_cd. Фрагменты отчета строятся только
+    для сессий текущей страницы, так как ts_headline разбирает весь текст отчета.
+
+    Args:
+        db (AsyncSession): Сессия базы данных
+        query (str): Поисковый запрос в синтаксисе websearch_to_tsquery
+        limit (int): Размер страницы
+        offset (int): Смещение от начала выдачи
+
+    Raises:
+        ValueError: Если база данных не поддерживает полнотекстовый поиск
+
+    Returns:
+        tuple[list[Row], int]: Найденные сессии текущей страницы и общее количество совпадений
+    """
+    if not is_supported(db.get_bind().dialect):
+        raise ValueError("Полнотекстовый поиск доступен только в PostgreSQL")
+
+    config = settings.DATABASE.TEXT_SEARCH_CONFIG
+    ts_query = func.websearch_to_tsquery(config, query)
+    matches = ResearchSession.search_vector.bool_op("@@")(ts_query)
+    # Нормализация 1 делит ранг на логарифм длины документа, чтобы длинные отчеты не вытесняли остальные
+    rank = func.ts_rank_cd(ResearchSession.search_vector, ts_query, 1)
+
+    total = await db.scalar(select(func.count()).select_from(ResearchSession).where(matches))
+    if not total:
+        return [], 0
+
+    page = (
+        select(ResearchSession.id, rank.label("rank"))
+        .where(matches)
+        .order_by(rank.desc(), ResearchSession.id.desc())
+        .limit(limit)
+        .offset(offset)
+        .subquery()
+    )
+    snippet = func.ts_headline(config, func.coalesce(ResearchSession.final_report, ""), ts_query, SNIPPET_OPTIONS)
+    result = await db.execute(
+        select(
+            ResearchSession.id,
+            ResearchSession.research_brief,
+            ResearchSession.completed_at,
+            page.c.rank,
+            snippet.label("snippet"),
+        )
+        .join(page, page.c.id == ResearchSession.id)
+        .order_by(page.c.rank.desc(), ResearchSession.id.desc())
+    )
+    return list(result.all()), total
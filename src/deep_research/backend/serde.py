@@ -0,0 +1,196 @@
+"""Компактная сериализация чекпоинтов графа
+
+Значения сериализуются в msgpack сериализатором LangGraph по умолчанию и сжимаются zstd.
+Большие строки (результаты поиска, сжатые исследования, сырые заметки) выносятся из значений
+и хранятся один раз на поток по хэшу содержимого, а в самих значениях остаются ссылки на них.
+Без этого каждая новая версия канала сообщений или заметок заново записывала бы все накопленные тексты.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any
+
+import zstandard
+from langchain_core.messages import BaseMessage
+from langgraph.checkpoint.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+COMPRESSED_TYPE = "msgpack+zstd"
+INTERNED_TYPE = "str+zstd"
+ZSTD_LEVEL = 3
+# Строки короче этого порога дешевле хранить прямо в значении, чем ссылкой
+MIN_INTERNED_LENGTH = 1024
+# Ссылка начинается с нулевого символа, который не встречается в обычном тексте
+INTERNED_PREFIX = "\x00interned:"
+# Сколько вынесенных строк держать в памяти процесса, чтобы не хэшировать и не читать их заново
+INTERNED_CACHE_SIZE = 4096
+
+
+class CompactSerializer(SerializerProtocol):
+    """Сериализатор msgpack + zstd с вынесением больших строк
+
+    Данные, сохраненные сериализатором LangGraph по умолчанию, по-прежнему читаются. Недавние вынесенные
+    строки кэшируются: строки, которые переходят из чекпоинта в чекпоинт, не хэшируются повторно,
+    а при чтении не загружаются из базы данных.
+
+    Args:
+        min_interned_length (int): Минимальная длина строки, которая выносится по хэшу
+        level (int): Уровень сжатия zstd
+        cache_size (int): Сколько вынесенных строк хранить в кэше
+    """
+
+    def __init__(
+        self,
+        min_interned_length: int = MIN_INTERNED_LENGTH,
+        level: int = ZSTD_LEVEL,
+        cache_size: int = INTERNED_CACHE_SIZE,
+    ) -> None:
+        self.min_interned_length = min_interned_length
+        self.level = level
+        self.cache_size = cache_size
+        self._serde = JsonPlusSerializer()
+        # Строки по хэшу и хэши по строкам; сериализация может выполняться в нескольких потоках
+        self._strings: OrderedDict[str, str] = OrderedDict()
+        self._keys: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def _remember(self, key: str, value: str) -> None:
+        with self._lock:
+            if key in self._strings:
+                self._strings.move_to_end(key)
+                return
+            self._strings[key] = value
+            self._keys[value] = key
+            while len(self._strings) > self.cache_size:
+                _, evicted = self._strings.popitem(last=False)
+                self._keys.pop(evicted, None)
+
+    def _get_key(self, value: str) -> str:
+        key = self._keys.get(value)
+        if key is None:
+            key = hashlib.sha256(value.encode()).hexdigest()
+            self._remember(key, value)
+        return key
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        type_, data = self._serde.dumps_typed(obj)
+        if type_ != "msgpack":
+            return type_, data
+        return COMPRESSED_TYPE, zstandard.compress(data, self.level)
+
+    def loads_typed(self, data: tuple[str, bytes]) -> Any:
+        type_, payload = data
+        if type_ == COMPRESSED_TYPE:
+            return self._serde.loads_typed(("msgpack", zstandard.decompress(payload)))
+        return self._serde.loads_typed(data)
+
+    def intern(self, obj: Any) -> tuple[Any, dict[str, str]]:
+        """Заменяет большие строки в значении ссылками
+
+        Обходятся списки, кортежи, словари и содержимое сообщений LangChain. Остальные объекты,
+        включая подклассы этих типов (например, именованные кортежи), не меняются.
+
+        Args:
+            obj (Any): Значение канала или промежуточной записи
+
+        Returns:
+            tuple[Any, dict[str, str]]: Значение со ссылками и вынесенные строки по хэшу
+        """
+        strings: dict[str, str] = {}
+
+        def replace(value: Any) -> Any:
+            if isinstance(value, str):
+                if len(value) < self.min_interned_length:
+                    return value
+                key = self._get_key(value)
+                strings[key] = value
+                return INTERNED_PREFIX + key
+            if isinstance(value, BaseMessage):
+                content = replace(value.content)
+                return value if content is value.content else value.model_copy(update={"content": content})
+            if type(value) is list:
+                return [replace(item) for item in value]
+            if type(value) is tuple:
+                return tuple(replace(item) for item in value)
+            if type(value) is dict:
+                return {key: replace(item) for key, item in value.items()}
+            return value
+
+        return replace(obj), strings
+
+    @staticmethod
+    def find_interned(obj: Any) -> set[str]:
+        """Хэши строк, на которые ссылается значение"""
+        keys: set[str] = set()
+
+        def visit(value: Any) -> None:
+            if isinstance(value, str):
+                if value.startswith(INTERNED_PREFIX):
+                    keys.add(value.removeprefix(INTERNED_PREFIX))
+            elif isinstance(value, BaseMessage):
+                visit(value.content)
+            elif type(value) in (list, tuple):
+                for item in value:
+                    visit(item)
+            elif type(value) is dict:
+                for item in value.values():
+                    visit(item)
+
+        visit(obj)
+        return keys
+
+    @staticmethod
+    def restore(obj: Any, strings: dict[str, str]) -> Any:
+        """Подставляет вынесенные строки вместо ссылок
+
+        Сообщения изменяются на месте, поэтому значение должно быть только что десериализовано.
+        Одинаковые строки в разных значениях становятся одним объектом, что уменьшает память потока.
+
+        Args:
+            obj (Any): Значение со ссылками
+            strings (dict[str, str]): Вынесенные строки по хэшу
+
+        Returns:
+            Any: Исходное значение
+        """
+
+        def replace(value: Any) -> Any:
+            if isinstance(value, str):
+                if value.startswith(INTERNED_PREFIX):
+                    return strings[value.removeprefix(INTERNED_PREFIX)]
+                return value
+            if isinstance(value, BaseMessage):
+                value.content = replace(value.content)
+                return value
+            if type(value) is list:
+                return [replace(item) for item in value]
+            if type(value) is tuple:
+                return tuple(replace(item) for item in value)
+            if type(value) is dict:
+                return {key: replace(item) for key, item in value.items()}
+            return value
+
+        return replace(obj)
+
+    def get_cached(self, keys: set[str]) -> dict[str, str]:
+        """Вынесенные строки из кэша процесса
+
+        Args:
+            keys (set[str]): Хэши строк
+
+        Returns:
+            dict[str, str]: Найденные в кэше строки по хэшу
+        """
+        with self._lock:
+            return {key: self._strings[key] for key in keys if key in self._strings}
+
+    def dumps_interned(self, value: str) -> tuple[str, bytes]:
+        """Сериализует вынесенную строку"""
+        return INTERNED_TYPE, zstandard.compress(value.encode(), self.level)
+
+    def loads_interned(self, key: str, data: bytes) -> str:
+        """Читает вынесенную строку и кэширует ее"""
+        value = zstandard.decompress(data).decode()
+        self._remember(key, value)
+        return value
@@ -1,19 +1,79 @@
 """Бизнес-логика для работы с исследованиями"""
 
+import asyncio
+import contextlib
 import json
+import logging
+import os
+import socket
+import uuid
+from collections.abc import Awaitable
+from datetime import UTC, datetime, timedelta
+from functools import cached_property
+from typing import TYPE_CHECKING, Any
 
 from langchain_core.messages import AIMessage, AnyMessage, HumanMessage, ToolMessage
-from sqlalchemy import select
+from sqlalchemy import ColumnElement, func, or_, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from deep_research import ml
+from deep_research.backend.admission import admission_controller
+from deep_research.backend.cache import SQLAlchemyReportStore, get_reuse_threshold, hash_text
+from deep_research.backend.checkpointer import SQLAlchemyCheckpointSaver, SQLAlchemyResearchResultStore
+from deep_research.backend.database import async_session_maker
 from deep_research.backend.models import ResearchSession, ResearchStatus
-from deep_research.backend.schemas import ResearchSessionContinue, ResearchSessionCreate
-from deep_research.ml import deep_research_agent
+from deep_research.backend.schemas import (
+    ResearchCost,
+    ResearchSessionContinue,
+    ResearchSessionCreate,
+    ResearchStats,
+    ResearchUsageTotals,
+)
+from deep_research.backend.search import index_research_session
+from deep_research.backend.tenants import check_tenant_quota, select_fair_sessions
+from deep_research.config import settings
+from deep_research.ml.offload import adumps_json, aloads_json, get_messages_size
+from deep_research.ml.search_providers import get_search_provider, is_local_search_enabled
+from deep_research.ml.usage import ResearchUsage, UsageCallbackHandler
+from deep_research.ml.utils import get_llm
+
+if TYPE_CHECKING:
+    from langgraph.graph.state import CompiledStateGraph
+
+logger = logging.getLogger(__name__)
+
+
+class LeaseLostError(RuntimeError):
+    """Аренду сессии перехватил другой обработчик"""
 
 
 class DeepResearchService:
     def __init__(self) -> None:
-        self.deep_research_agent = deep_research_agent
+        self.checkpointer = SQLAlchemyCheckpointSaver(async_session_maker)
+        self.research_result_store = SQLAlchemyResearchResultStore(async_session_maker)
+        self.report_store = SQLAlchemyReportStore(async_session_maker)
+        # Событие изменения сессии и запросы, которые его ждут
+        self._update_events: dict[int, tuple[asyncio.Event, set[asyncio.Task]]] = {}
+        self._worker_wakeup = asyncio.Event()
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    @cached_property
+    def deep_research_agent(self) -> "CompiledStateGraph":
+        """Граф агента, который собирается при первом обращении"""
+        return ml.build_deep_research_agent(self.checkpointer)
+
+    def warmup(self) -> None:
+        """Заранее собирает граф агента, создает клиент LLM и готовит используемых поставщиков поиска
+
+        Без прогрева они создаются при первом исследовании, и его задержка увеличивается на время импорта и инициализации.
+        Клиент Tavily создается, только если он выбран в SEARCH_PROVIDER, а локальный индекс загружается,
+        если указан каталог документов.
+        """
+        _ = self.deep_research_agent
+        get_llm()
+        get_search_provider(settings.SEARCH.PROVIDER).warmup()
+        if settings.SEARCH.PROVIDER != "local" and is_local_search_enabled():
+            get_search_provider("local").warmup()
 
     def _extract_messages_history(self, messages: list[AnyMessage]) -> list[dict[str, str]]:
         """Извлекает историю сообщений в формате для БД
@@ -35,109 +95,605 @@ class DeepResearchService:
                 history.append({"role": "assistant", "content": f"[{tool_name}]\n{message.content}"})
         return history
 
-    async def create_research_session(
+    def _get_config(
         self,
-        db: AsyncSession,
-        data: ResearchSessionCreate,
+        session: ResearchSession,
+        usage_handler: UsageCallbackHandler | None = None,
+    ) -> dict[str, Any]:
+        """Конфигурация запуска графа для сессии
+
+        Args:
+            session (ResearchSession): Сессия исследования
+            usage_handler (UsageCallbackHandler | None): Обработчик учета ресурсов запуска
+
+        Returns:
+            dict[str, Any]: Конфигурация графа
+        """
+        config = {
+            "configurable": {
+                "thread_id": str(session.id),
+                "research_result_store": self.research_result_store,
+            }
+        }
+        if session.reuse_recent:
+            config["configurable"]["report_store"] = self.report_store
+        if usage_handler:
+            config["callbacks"] = [usage_handler]
+        return config
+
+    async def _get_input_message(self, session: ResearchSession) -> HumanMessage:
+        """Последнее сообщение пользователя сессии, которое нужно передать агенту
+
+        ID сообщения зависит только от его позиции в истории, поэтому при возобновлении
+        можно проверить, успело ли сообщение попасть в чекпоинт графа.
+
+        Args:
+            session (ResearchSession): Сессия исследования
+
+        Returns:
+            HumanMessage: Сообщение пользователя
+        """
+        history = await aloads_json(session.messages)
+        return HumanMessage(content=history[-1]["content"], id=f"user-{session.id}-{len(history) - 1}")
+
+    def _notify_update(self, session_id: int) -> None:
+        """Будит запросы, ожидающие изменения сессии
+
+        Args:
+            session_id (int): ID сессии
+        """
+        item = self._update_events.pop(session_id, None)
+        if item:
+            item[0].set()
+
+    async def _delete_thread(self, session_id: int) -> None:
+        """Удаляет чекпоинты графа и результаты исследователей сессии, которая больше не будет выполняться
+
+        Args:
+            session_id (int): ID завершенной или неудачной сессии
+        """
+        await self.checkpointer.adelete_thread(str(session_id))
+        await self.research_result_store.adelete_thread(str(session_id))
+
+    def _lease_values(self, now: datetime) -> dict[str, Any]:
+        """Значения полей сессии для захвата аренды текущим обработчиком
+
+        Args:
+            now (datetime): Текущее время
+
+        Returns:
+            dict[str, Any]: Значения полей аренды
+        """
+        return {
+            "status": ResearchStatus.IN_PROGRESS,
+            "lease_owner": self.worker_id,
+            "lease_expires_at": now + timedelta(seconds=settings.WORKER.LEASE_SECONDS),
+        }
+
+    def _lease_expired(self, now: datetime) -> ColumnElement[bool]:
+        """Условие, что аренда сессии истекла или не была выдана"""
+        return or_(ResearchSession.lease_expires_at.is_(None), ResearchSession.lease_expires_at < now)
+
+    async def _claim_sessions(self, limit: int) -> list[int]:
+        """Захватывает сессии, ожидающие обработки, для текущего обработчика
+
+        В первую очередь захватываются прерванные сессии с истекшей арендой. В режиме очереди оставшиеся
+        места заполняются новыми сессиями и продолжениями после уточнения через взвешенную справедливую
+        очередь тенантов. Строки блокируются через FOR UPDATE SKIP LOCKED, поэтому несколько обработчиков
+        на разных узлах не захватят одну и ту же сессию.
+
+        Args:
+            limit (int): Максимальное количество сессий
+
+        Returns:
+            list[int]: ID захваченных сессий
+        """
+        now = datetime.now(UTC)
+        async with async_session_maker() as db, db.begin():
+            result = await db.execute(
+                select(ResearchSession.id)
+                .where(ResearchSession.status == ResearchStatus.IN_PROGRESS, self._lease_expired(now))
+                .order_by(ResearchSession.id)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+            )
+            session_ids = list(result.scalars().all())
+
+            if settings.WORKER.QUEUE_ENABLED and len(session_ids) < limit:
+                scheduled_ids = await select_fair_sessions(db, limit - len(session_ids))
+                if scheduled_ids:
+                    result = await db.execute(
+                        select(ResearchSession.id)
+                        .where(ResearchSession.id.in_(scheduled_ids), ResearchSession.status == ResearchStatus.PENDING)
+                        .with_for_update(skip_locked=True)
+                    )
+                    session_ids += result.scalars().all()
+
+            if session_ids:
+                await db.execute(
+                    update(ResearchSession)
+                    .where(ResearchSession.id.in_(session_ids))
+                    .values(
+                        **self._lease_values(now),
+                        attempts=ResearchSession.attempts + 1,
+                        version=ResearchSession.version + 1,
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+
+        for session_id in session_ids:
+            self._notify_update(session_id)
+        return session_ids
+
+    async def _claim_session(self, session_id: int) -> bool:
+        """Захватывает прерванную сессию с истекшей арендой
+
+        Args:
+            session_id (int): ID сессии
+
+        Returns:
+            bool: True, если сессия захвачена текущим обработчиком
+        """
+        now = datetime.now(UTC)
+        async with async_session_maker() as db, db.begin():
+            result = await db.execute(
+                update(ResearchSession)
+                .where(
+                    ResearchSession.id == session_id,
+                    ResearchSession.status == ResearchStatus.IN_PROGRESS,
+                    self._lease_expired(now),
+                )
+                .values(
+                    **self._lease_values(now),
+                    attempts=ResearchSession.attempts + 1,
+                    version=ResearchSession.version + 1,
+                )
+                .execution_options(synchronize_session=False)
+            )
+        return result.rowcount == 1
+
+    async def _extend_lease(self, session_id: int) -> bool:
+        """Продлевает аренду сессии текущим обработчиком
+
+        Версия сессии при этом не меняется, чтобы не будить клиентов, ожидающих изменений.
+
+        Args:
+            session_id (int): ID сессии
+
+        Returns:
+            bool: True, если аренда все еще принадлежит текущему обработчику
+        """
+        now = datetime.now(UTC)
+        async with async_session_maker() as db, db.begin():
+            result = await db.execute(
+                update(ResearchSession)
+                .where(ResearchSession.id == session_id, ResearchSession.lease_owner == self.worker_id)
+                .values(lease_expires_at=now + timedelta(seconds=settings.WORKER.LEASE_SECONDS))
+                .execution_options(synchronize_session=False)
+            )
+        return result.rowcount == 1
+
+    async def _hold_lease(self, session_id: int, work: Awaitable[ResearchSession]) -> ResearchSession:
+        """Выполняет работу по сессии, продлевая ее аренду
+
+        Работа выполняется в отдельной задаче. Если аренду перехватил другой обработчик, то отменяется
+        только эта задача, а не задача вызывающего (например, HTTP-запроса).
+
+        Args:
+            session_id (int): ID сессии
+            work (Awaitable[ResearchSession]): Работа по сессии
+
+        Raises:
+            LeaseLostError: Если аренду сессии перехватил другой обработчик
+
+        Returns:
+            ResearchSession: Результат работы
+        """
+
+        async def heartbeat() -> None:
+            while True:
+                await asyncio.sleep(settings.WORKER.HEARTBEAT_INTERVAL)
+                try:
+                    if not await self._extend_lease(session_id):
+                        return
+                except Exception:
+                    # Аренда продлится при следующей попытке или истечет, и ее потерю обнаружит _save_result
+                    logger.exception("Не удалось продлить аренду сессии %s", session_id)
+
+        work_task = asyncio.ensure_future(work)
+        heartbeat_task = asyncio.create_task(heartbeat())
+        try:
+            await asyncio.wait({work_task, heartbeat_task}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            heartbeat_task.cancel()
+            if not work_task.done():
+                work_task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await work_task
+
+        if work_task.cancelled():
+            raise LeaseLostError(f"Аренда сессии {session_id} потеряна, выполнение прервано")
+        return work_task.result()
+
+    async def _process_session(self, session_id: int) -> ResearchSession:
+        """Выполняет захваченную сессию с последнего сохраненного чекпоинта
+
+        Если граф еще не получил последнее сообщение пользователя, то оно передается на вход.
+        Уже завершенные исследователи не перезапускаются: их результаты берутся из хранилища.
+
+        Args:
+            session_id (int): ID сессии, аренда которой принадлежит текущему обработчику
+
+        Returns:
+            ResearchSession: Обновленная сессия
+        """
+        async with async_session_maker() as db:
+            session = await self.get_research_session(db, session_id)
+
+        async def run() -> ResearchSession:
+            snapshot = await self.deep_research_agent.aget_state(self._get_config(session))
+            if snapshot.next:
+                return await self._run_agent(session, None)
+
+            input_message = await self._get_input_message(session)
+            if any(message.id == input_message.id for message in snapshot.values.get("messages", [])):
+                # Граф успел обработать сообщение, но результат не был сохранен в сессию
+                return await self._save_result(session_id, snapshot.values)
+
+            return await self._run_agent(session, {"messages": [input_message]})
+
+        try:
+            return await self._hold_lease(session_id, run())
+        except LeaseLostError:
+            # Сессией владеет другой обработчик, и ошибку этого запуска она не учитывает
+            logger.warning("Аренда сессии %s потеряна, результат запуска не сохранен", session_id)
+            raise
+        except Exception:
+            await self._handle_failure(session)
+            raise
+
+    async def _handle_failure(self, session: ResearchSession) -> None:
+        """Обрабатывает ошибку выполнения сессии
+
+        Аренда не снимается, поэтому после ее истечения сессию повторно захватит один из обработчиков.
+        Если попытки исчерпаны, то сессия помечается как неудачная, а ее чекпоинты удаляются. Это делается,
+        только если аренда все еще принадлежит текущему обработчику.
+
+        Args:
+            session (ResearchSession): Сессия исследования
+        """
+        logger.exception("Ошибка выполнения сессии исследования %s (попытка %s)", session.id, session.attempts)
+        if session.attempts < settings.WORKER.MAX_ATTEMPTS:
+            return
+
+        async with async_session_maker() as db, db.begin():
+            result = await db.execute(
+                update(ResearchSession)
+                .where(ResearchSession.id == session.id, ResearchSession.lease_owner == self.worker_id)
+                .values(
+                    status=ResearchStatus.FAILED,
+                    lease_owner=None,
+                    lease_expires_at=None,
+                    version=ResearchSession.version + 1,
+                )
+                .execution_options(synchronize_session=False)
+            )
+        if result.rowcount != 1:
+            logger.warning("Сессия %s выполняется другим обработчиком и не помечена как неудачная", session.id)
+            return
+        self._notify_update(session.id)
+        await self._delete_thread(session.id)
+
+    async def _run_agent(self, session: ResearchSession, input: dict[str, Any] | None) -> ResearchSession:
+        """Запускает агента для сессии и сохраняет результат
+
+        Соединение с БД не удерживается на время работы агента: результат сохраняется в отдельной короткой сессии.
+        Ресурсы, затраченные на запуск, сохраняются и при ошибке.
+
+        Args:
+            session (ResearchSession): Сессия исследования
+            input (dict[str, Any] | None): Вход графа или None для продолжения с последнего чекпоинта
+
+        Returns:
+            ResearchSession: Обновленная сессия
+        """
+        usage_handler = UsageCallbackHandler()
+        try:
+            result = await self.deep_research_agent.ainvoke(input, config=self._get_config(session, usage_handler))
+        except Exception:
+            await self._save_usage(session.id, usage_handler.get_usage())
+            raise
+        return await self._save_result(session.id, result, usage_handler.get_usage())
+
+    def _add_usage(self, session: ResearchSession, usage: ResearchUsage) -> None:
+        """Добавляет ресурсы запуска агента к ресурсам сессии
+
+        Args:
+            session (ResearchSession): Сессия исследования
+            usage (ResearchUsage): Ресурсы, затраченные на запуск
+        """
+        session.input_tokens += usage["input_tokens"]
+        session.output_tokens += usage["output_tokens"]
+        session.llm_calls += usage["llm_calls"]
+        session.search_calls += usage["search_calls"]
+        session.cache_hits += usage["cache_hits"]
+        session.wall_time += usage["wall_time"]
+
+        node_wall_time = json.loads(session.node_wall_time or "{}")
+        for path, seconds in usage["node_wall_time"].items():
+            node_wall_time[path] = round(node_wall_time.get(path, 0) + seconds, 3)
+        session.node_wall_time = json.dumps(node_wall_time)
+
+    async def _save_usage(self, session_id: int, usage: ResearchUsage) -> None:
+        """Сохраняет ресурсы прерванного запуска агента
+
+        Args:
+            session_id (int): ID сессии
+            usage (ResearchUsage): Ресурсы, затраченные на запуск
+        """
+        async with async_session_maker() as db:
+            session = await db.get(ResearchSession, session_id)
+            self._add_usage(session, usage)
+            await db.commit()
+
+    async def _save_result(
+        self,
+        session_id: int,
+        result: dict[str, Any],
+        usage: ResearchUsage | None = None,
     ) -> ResearchSession:
-        """Создает новую сессию исследования и запускает агента
+        """Сохраняет состояние графа в сессию и снимает аренду
+
+        Чекпоинты завершенного или неудачного исследования больше не нужны и удаляются.
 
         Args:
-            db (AsyncSession): База данных
-            data (ResearchSessionCreate): Данные для создания исследования
+            session_id (int): ID сессии
+            result (dict[str, Any]): Состояние графа
+            usage (ResearchUsage | None): Ресурсы, затраченные на запуск агента
+
+        Raises:
+            LeaseLostError: Если аренду сессии перехватил другой обработчик
 
         Returns:
-            ResearchSession: Созданная сессия исследования
+            ResearchSession: Обновленная сессия
         """
-        session = ResearchSession(
-            status=ResearchStatus.PENDING,
-            messages=json.dumps([{"role": "user", "content": data.query}]),
-            research_brief=None,
-            final_report=None,
-        )
-        db.add(session)
-        await db.commit()
-        await db.refresh(session)
+        # История сериализуется до блокировки строки сессии
+        history = self._extract_messages_history(result["messages"])
+        messages = await adumps_json(history, get_messages_size(history))
+        async with async_session_maker() as db:
+            session = await db.get(ResearchSession, session_id, with_for_update=True)
+            if session.lease_owner != self.worker_id:
+                raise LeaseLostError(f"Сессия {session_id} выполняется другим обработчиком")
+
+            self._apply_result(session, result, messages)
+            if usage:
+                self._add_usage(session, usage)
+            session.lease_owner = None
+            session.lease_expires_at = None
+            session.attempts = 0
+            if session.status == ResearchStatus.COMPLETED:
+                await db.flush()
+                await index_research_session(db, session_id)
+            await db.commit()
+            await db.refresh(session)
+        self._notify_update(session_id)
+
+        if session.status in (ResearchStatus.COMPLETED, ResearchStatus.FAILED):
+            await self._delete_thread(session_id)
 
-        thread_id = str(session.id)
-        config = {"configurable": {"thread_id": thread_id}}
+        return session
 
-        result = await self.deep_research_agent.ainvoke(
-            {"messages": [HumanMessage(content=data.query)]},
-            config=config,
-        )
+    def _apply_result(self, session: ResearchSession, result: dict[str, Any], messages: str) -> None:
+        """Переносит состояние графа в сессию исследования
 
-        messages = result["messages"]
-        session.messages = json.dumps(self._extract_messages_history(messages))
+        Граф, который завершился с заданием, но без отчета, повторный запуск с того же чекпоинта не исправит,
+        поэтому такая сессия помечается как неудачная, а не остается в процессе выполнения без аренды.
+
+        Args:
+            session (ResearchSession): Сессия исследования
+            result (dict[str, Any]): Состояние графа
+            messages (str): История сообщений в формате JSON
+        """
+        session.messages = messages
 
         if result.get("final_report"):
             session.status = ResearchStatus.COMPLETED
             session.research_brief = result["research_brief"]
+            session.brief_hash = hash_text(result["research_brief"])
             session.final_report = result["final_report"]
+            session.completed_at = datetime.now(UTC)
         elif result.get("research_brief"):
-            session.status = ResearchStatus.IN_PROGRESS
+            session.status = ResearchStatus.FAILED
             session.research_brief = result["research_brief"]
+            session.brief_hash = hash_text(result["research_brief"])
         else:
             session.status = ResearchStatus.AWAITING_CLARIFICATION
 
-        await db.commit()
-        await db.refresh(session)
-        return session
+    def _enqueue(self, session: ResearchSession) -> None:
+        """Ставит сессию на выполнение
+
+        В режиме очереди сессия ждет, пока ее захватит один из обработчиков. Иначе аренда сразу выдается
+        текущему процессу, и агент выполняется в рамках запроса.
+
+        Args:
+            session (ResearchSession): Сессия исследования
+        """
+        session.attempts = 0 if settings.WORKER.QUEUE_ENABLED else 1
+        if settings.WORKER.QUEUE_ENABLED:
+            session.status = ResearchStatus.PENDING
+            return
+
+        for key, value in self._lease_values(datetime.now(UTC)).items():
+            setattr(session, key, value)
+
+    async def create_research_session(self, data: ResearchSessionCreate, tenant_id: str) -> ResearchSession:
+        """Создает новую сессию исследования и запускает агента
+
+        Если включено повторное использование и недавно было завершено исследование по такому же запросу,
+        то агент не запускается, а создается сессия с уже готовым отчетом. В режиме очереди сессия
+        возвращается сразу в статусе PENDING.
+
+        Args:
+            data (ResearchSessionCreate): Данные для создания исследования
+            tenant_id (str): ID тенанта
+
+        Raises:
+            QuotaExceededError: Если тенант исчерпал квоту
+
+        Returns:
+            ResearchSession: Созданная сессия исследования
+        """
+        query_hash = hash_text(data.query)
+        session = ResearchSession(
+            status=ResearchStatus.IN_PROGRESS,
+            messages=json.dumps([{"role": "user", "content": data.query}]),
+            research_brief=None,
+            final_report=None,
+            query_hash=query_hash,
+            reuse_recent=data.reuse_recent,
+            tenant_id=tenant_id,
+        )
+        async with async_session_maker() as db:
+            if data.reuse_recent and (recent := await self._find_recent_session(db, query_hash)):
+                session.status = ResearchStatus.COMPLETED
+                session.messages = recent.messages
+                session.research_brief = recent.research_brief
+                session.brief_hash = recent.brief_hash
+                session.final_report = recent.final_report
+                session.completed_at = recent.completed_at
+                session.cache_hits = 1
+                db.add(session)
+                await db.flush()
+                await index_research_session(db, session.id)
+                await db.commit()
+                await db.refresh(session)
+                return session
+
+            await check_tenant_quota(db, tenant_id)
+            self._enqueue(session)
+            db.add(session)
+            await db.commit()
+            await db.refresh(session)
+
+        if settings.WORKER.QUEUE_ENABLED:
+            self._wake_worker()
+            return session
+        return await self._process_session(session.id)
 
     async def continue_research_session(
         self,
-        db: AsyncSession,
         session_id: int,
         data: ResearchSessionContinue,
     ) -> ResearchSession:
         """Продолжает исследование после ответа пользователя на уточняющие вопросы
 
         Args:
-            db (AsyncSession): База данных
             session_id (int): ID сессии
             data (ResearchSessionContinue): Данные для продолжения исследования
 
         Raises:
             ValueError: Если сессия не найдена
             ValueError: Если сессия не ожидает уточнения
+            QuotaExceededError: Если тенант сессии исчерпал квоту
+
+        Returns:
+            ResearchSession: Обновленная сессия
+        """
+        async with async_session_maker() as db:
+            session = await self.get_research_session(db, session_id)
+
+            if not session:
+                raise ValueError(f"Сессия с ID {session_id} не найдена")
+
+            if session.status != ResearchStatus.AWAITING_CLARIFICATION:
+                raise ValueError(f"Сессия не ожидает уточнения. Текущий статус: {session.status}")
+
+            await check_tenant_quota(db, session.tenant_id)
+            history = await aloads_json(session.messages)
+            history.append({"role": "user", "content": data.response})
+            session.messages = await adumps_json(history, len(session.messages) + len(data.response))
+            self._enqueue(session)
+            await db.commit()
+            await db.refresh(session)
+        self._notify_update(session.id)
+
+        if settings.WORKER.QUEUE_ENABLED:
+            self._wake_worker()
+            return session
+        return await self._process_session(session.id)
+
+    async def resume_research_session(self, session_id: int) -> ResearchSession:
+        """Возобновляет прерванное исследование с последнего сохраненного чекпоинта
+
+        Сессию можно возобновить, только если истекла аренда обработчика, который ее выполнял.
+
+        Args:
+            session_id (int): ID сессии
+
+        Raises:
+            ValueError: Если сессия не найдена
+            ValueError: Если сессия не находится в процессе выполнения
+            ValueError: Если сессия выполняется другим обработчиком
 
         Returns:
             ResearchSession: Обновленная сессия
         """
-        session = await self.get_research_session(db, session_id)
+        async with async_session_maker() as db:
+            session = await self.get_research_session(db, session_id)
 
         if not session:
             raise ValueError(f"Сессия с ID {session_id} не найдена")
 
-        if session.status != ResearchStatus.AWAITING_CLARIFICATION:
-            raise ValueError(f"Сессия не ожидает уточнения. Текущий статус: {session.status}")
-
-        thread_id = str(session.id)
-        config = {"configurable": {"thread_id": thread_id}}
+        if session.status != ResearchStatus.IN_PROGRESS:
+            raise ValueError(f"Сессия не находится в процессе выполнения. Текущий статус: {session.status}")
 
-        session.status = ResearchStatus.IN_PROGRESS
+        if not await self._claim_session(session_id):
+            raise ValueError("Сессия выполняется другим обработчиком")
+        self._notify_update(session_id)
 
-        result = await self.deep_research_agent.ainvoke(
-            {"messages": [HumanMessage(content=data.response)]},
-            config=config,
-        )
+        return await self._process_session(session_id)
 
-        messages = result["messages"]
-        session.messages = json.dumps(self._extract_messages_history(messages))
+    def _wake_worker(self) -> None:
+        """Будит обработчик текущего процесса, чтобы он не ждал следующего опроса очереди"""
+        self._worker_wakeup.set()
 
-        if result.get("final_report"):
-            session.status = ResearchStatus.COMPLETED
-            session.research_brief = result["research_brief"]
-            session.final_report = result["final_report"]
-        elif result.get("research_brief"):
-            session.status = ResearchStatus.IN_PROGRESS
-            session.research_brief = result["research_brief"]
-        else:
-            session.status = ResearchStatus.AWAITING_CLARIFICATION
+    async def run_worker(self) -> None:
+        """Обрабатывает очередь сессий исследований
 
-        await db.commit()
-        await db.refresh(session)
-        return session
+        Обработчик периодически захватывает новые сессии (в режиме очереди) и сессии, аренда которых истекла
+        из-за падения или перезапуска другого процесса. Одновременно выполняется не больше
+        WORKER_CONCURRENCY сессий.
+        """
+        running: set[asyncio.Task] = set()
+
+        async def process(session_id: int) -> None:
+            # Ошибка уже залогирована в _handle_failure
+            with contextlib.suppress(Exception):
+                async with admission_controller.track():
+                    await self._process_session(session_id)
+
+        logger.info("Обработчик исследований %s запущен", self.worker_id)
+        try:
+            while True:
+                free_slots = settings.WORKER.CONCURRENCY - len(running)
+                if free_slots > 0:
+                    try:
+                        session_ids = await self._claim_sessions(free_slots)
+                    except Exception:
+                        logger.exception("Не удалось захватить сессии исследований")
+                        session_ids = []
+                    for session_id in session_ids:
+                        task = asyncio.create_task(process(session_id))
+                        running.add(task)
+                        task.add_done_callback(running.discard)
+
+                self._worker_wakeup.clear()
+                with contextlib.suppress(TimeoutError):
+                    await asyncio.wait_for(self._worker_wakeup.wait(), settings.WORKER.POLL_INTERVAL)
+        finally:
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
 
     async def get_research_session(
         self,
@@ -156,6 +712,77 @@ class DeepResearchService:
         result = await db.execute(select(ResearchSession).where(ResearchSession.id == session_id))
         return result.scalar_one_or_none()
 
+    async def _find_recent_session(self, db: AsyncSession, query_hash: str) -> ResearchSession | None:
+        """Ищет недавно завершенное исследование по такому же запросу
+
+        Args:
+            db (AsyncSession): Сессия базы данных
+            query_hash (str): Хэш нормализованного запроса
+
+        Returns:
+            ResearchSession | None: Завершенная сессия или None, если подходящей нет
+        """
+        result = await db.execute(
+            select(ResearchSession)
+            .where(
+                ResearchSession.query_hash == query_hash,
+                ResearchSession.status == ResearchStatus.COMPLETED,
+                ResearchSession.completed_at >= get_reuse_threshold(),
+            )
+            .order_by(ResearchSession.completed_at.desc())
+            .limit(1)
+        )
+        return result.scalar_one_or_none()
+
+    async def get_research_session_version(self, session_id: int) -> int | None:
+        """Получает текущую версию сессии без загрузки ее данных
+
+        Args:
+            session_id (int): ID сессии
+
+        Returns:
+            int | None: Версия сессии или None, если сессия не найдена
+        """
+        async with async_session_maker() as db:
+            result = await db.execute(select(ResearchSession.version).where(ResearchSession.id == session_id))
+            return result.scalar_one_or_none()
+
+    async def wait_for_research_session_update(self, session_id: int, version: int, timeout: float) -> int:
+        """Ждет, пока версия сессии не изменится, но не дольше timeout секунд
+
+        Изменения, сделанные в этом процессе, будят ожидание сразу. Изменения из других процессов
+        обнаруживаются периодической проверкой версии в БД.
+
+        Args:
+            session_id (int): ID сессии
+            version (int): Версия сессии, известная клиенту
+            timeout (float): Максимальное время ожидания в секундах
+
+        Returns:
+            int: Актуальная версия сессии
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+
+        while (remaining := deadline - loop.time()) > 0:
+            event, waiters = self._update_events.setdefault(session_id, (asyncio.Event(), set()))
+            waiter = asyncio.current_task()
+            waiters.add(waiter)
+            try:
+                with contextlib.suppress(TimeoutError):
+                    await asyncio.wait_for(event.wait(), timeout=min(remaining, settings.API.LONG_POLL_INTERVAL))
+            finally:
+                waiters.discard(waiter)
+                # Событие удаляется, когда его перестает ждать последний запрос
+                if not waiters and session_id in self._update_events and self._update_events[session_id][0] is event:
+                    del self._update_events[session_id]
+
+            current_version = await self.get_research_session_version(session_id)
+            if current_version is not None and current_version != version:
+                return current_version
+
+        return version
+
     async def get_all_research_sessions(self, db: AsyncSession) -> list[ResearchSession]:
         """Получает все сессии исследований
 
@@ -168,5 +795,62 @@ class DeepResearchService:
         result = await db.execute(select(ResearchSession).order_by(ResearchSession.id.desc()))
         return list(result.scalars().all())
 
+    async def get_research_stats(self, db: AsyncSession, limit: int) -> ResearchStats:
+        """Собирает сводную статистику затрат на исследования
+
+        Args:
+            db (AsyncSession): Сессия базы данных
+            limit (int): Количество самых затратных сессий
+
+        Returns:
+            ResearchStats: Суммарные и средние затраты и самые затратные сессии
+        """
+        result = await db.execute(select(ResearchSession.status, func.count()).group_by(ResearchSession.status))
+        sessions_by_status = dict(result.tuples().all())
+
+        usage_columns = ["input_tokens", "output_tokens", "llm_calls", "search_calls", "cache_hits", "wall_time"]
+        result = await db.execute(
+            select(
+                *(
+                    func.coalesce(func.sum(getattr(ResearchSession, column)), 0).label(column)
+                    for column in usage_columns
+                )
+            )
+        )
+        totals = ResearchUsageTotals.model_validate(result.one(), from_attributes=True)
+        totals.wall_time = round(totals.wall_time, 3)
+
+        total_tokens = ResearchSession.input_tokens + ResearchSession.output_tokens
+        averages = (
+            await db.execute(
+                select(
+                    func.coalesce(func.avg(total_tokens), 0).label("tokens"),
+                    func.coalesce(func.avg(ResearchSession.wall_time), 0).label("wall_time"),
+                ).where(ResearchSession.status == ResearchStatus.COMPLETED)
+            )
+        ).one()
+
+        result = await db.execute(
+            select(
+                ResearchSession.id,
+                ResearchSession.status,
+                ResearchSession.research_brief,
+                total_tokens.label("total_tokens"),
+                ResearchSession.llm_calls,
+                ResearchSession.search_calls,
+                ResearchSession.wall_time,
+            )
+            .order_by(total_tokens.desc(), ResearchSession.id.desc())
+            .limit(limit)
+        )
+
+        return ResearchStats(
+            sessions_by_status=sessions_by_status,
+            totals=totals,
+            average_tokens_per_completed=round(averages.tokens, 1),
+            average_wall_time_per_completed=round(averages.wall_time, 3),
+            most_expensive=[ResearchCost.model_validate(row, from_attributes=True) for row in result.all()],
+        )
+
 
 deep_research_service = DeepResearchService()
@@ -0,0 +1,199 @@
+"""Квоты тенантов и справедливая очередь исследований"""
+
+import math
+from datetime import UTC, datetime, timedelta
+
+from sqlalchemy import ColumnElement, and_, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from deep_research.backend.models import ResearchSession, ResearchStatus
+from deep_research.config import settings
+
+
+class QuotaExceededError(Exception):
+    """Тенант исчерпал квоту
+
+    Attributes:
+        retry_after (int): Через сколько секунд стоит повторить запрос
+    """
+
+    def __init__(self, message: str, retry_after: int) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def get_tenant_weight(tenant_id: str) -> float:
+    """Вес тенанта в справедливой очереди: чем больше вес, тем больше доля исследователей"""
+    return max(settings.TENANT.WEIGHTS.get(tenant_id, 1.0), 1e-6)
+
+
+def get_token_window_start() -> datetime:
+    """Начало окна, за которое считается расход токенов тенантами"""
+    return datetime.now(UTC) - timedelta(seconds=settings.TENANT.TOKEN_WINDOW_SECONDS)
+
+
+def is_running() -> ColumnElement[bool]:
+    """Условие, что сессия выполняется обработчиком с действующей арендой
+
+    Сессии с истекшей арендой остались от упавших обработчиков и не учитываются в квоте, пока их не захватят снова.
+    """
+    return and_(
+        ResearchSession.status == ResearchStatus.IN_PROGRESS,
+        ResearchSession.lease_expires_at >= datetime.now(UTC),
+    )
+
+
+def is_over_limit(count: int, limit: int) -> bool:
+    """Достигнут ли лимит; лимит 0 означает отсутствие ограничения"""
+    return limit > 0 and count >= limit
+
+
+async def get_token_usage(db: AsyncSession, tenant_ids: list[str]) -> dict[str, int]:
+    """Токены, потраченные тенантами на исследования, созданные в текущем окне
+
+    Args:
+        db (AsyncSession): Сессия базы данных
+        tenant_ids (list[str]): ID тенантов
+
+    Returns:
+        dict[str, int]: Количество токенов по тенантам
+    """
+    result = await db.execute(
+        select(ResearchSession.tenant_id, func.sum(ResearchSession.input_tokens + ResearchSession.output_tokens))
+        .where(ResearchSession.tenant_id.in_(tenant_ids), ResearchSession.created_at >= get_token_window_start())
+        .group_by(ResearchSession.tenant_id)
+    )
+    return dict(result.tuples().all())
+
+
+async def check_tenant_quota(db: AsyncSession, tenant_id: str) -> None:
+    """Проверяет, может ли тенант запустить еще одно исследование
+
+    Квота токенов считается за скользящее окно TENANT_TOKEN_WINDOW_SECONDS. В режиме очереди
+    ограничивается количество ожидающих сессий тенанта, иначе - количество выполняемых с действующей арендой.
+    Нулевой лимит означает отсутствие ограничения.
+
+    Args:
+        db (AsyncSession): Сессия базы данных
+        tenant_id (str): ID тенанта
+
+    Raises:
+        QuotaExceededError: Если квота тенанта исчерпана
+    """
+    if settings.TENANT.TOKEN_QUOTA > 0:
+        used_tokens = (await get_token_usage(db, [tenant_id])).get(tenant_id, 0)
+        if used_tokens >= settings.TENANT.TOKEN_QUOTA:
+            oldest = await db.scalar(
+                select(func.min(ResearchSession.created_at)).where(
+                    ResearchSession.tenant_id == tenant_id,
+                    ResearchSession.created_at >= get_token_window_start(),
+                )
+            )
+            retry_after = settings.TENANT.RETRY_AFTER_SECONDS
+            if oldest:
+                # SQLite возвращает время без часового пояса
+                oldest = oldest if oldest.tzinfo else oldest.replace(tzinfo=UTC)
+                retry_after = math.ceil((oldest - get_token_window_start()).total_seconds())
+            raise QuotaExceededError(
+                f"Тенант {tenant_id} исчерпал квоту токенов: {used_tokens} из {settings.TENANT.TOKEN_QUOTA}",
+                max(retry_after, 1),
+            )
+
+    if settings.WORKER.QUEUE_ENABLED:
+        status, limit = ResearchStatus.PENDING, settings.TENANT.MAX_PENDING
+        condition = ResearchSession.status == status
+    else:
+        status, limit = ResearchStatus.IN_PROGRESS, settings.TENANT.MAX_CONCURRENT
+        condition = is_running()
+    if limit <= 0:
+        return
+
+    count = await db.scalar(select(func.count()).where(ResearchSession.tenant_id == tenant_id, condition))
+    if count >= limit:
+        raise QuotaExceededError(
+            f"У тенанта {tenant_id} уже {count} исследований в статусе {status}, допустимо не больше {limit}",
+            settings.TENANT.RETRY_AFTER_SECONDS,
+        )
+
+
+async def select_fair_sessions(db: AsyncSession, limit: int) -> list[int]:
+    """Выбирает ожидающие сессии для запуска с учетом квот и весов тенантов
+
+    Из очереди каждого тенанта берутся самые старые сессии, тенанты с исчерпанной квотой токенов
+    пропускаются, а сами сессии распределяются через schedule_fair. Строки не блокируются.
+
+    Args:
+        db (AsyncSession): Сессия базы данных
+        limit (int): Максимальное количество сессий
+
+    Returns:
+        list[int]: ID выбранных сессий
+    """
+    position = (
+        func.row_number().over(partition_by=ResearchSession.tenant_id, order_by=ResearchSession.id).label("position")
+    )
+    pending = (
+        select(ResearchSession.id, ResearchSession.tenant_id, position)
+        .where(ResearchSession.status == ResearchStatus.PENDING)
+        .subquery()
+    )
+    result = await db.execute(
+        select(pending.c.tenant_id, pending.c.id).where(pending.c.position <= limit).order_by(pending.c.id)
+    )
+    candidates: dict[str, list[int]] = {}
+    for tenant_id, session_id in result.tuples():
+        candidates.setdefault(tenant_id, []).append(session_id)
+    if not candidates:
+        return []
+
+    if settings.TENANT.TOKEN_QUOTA > 0:
+        token_usage = await get_token_usage(db, list(candidates))
+        candidates = {
+            tenant_id: session_ids
+            for tenant_id, session_ids in candidates.items()
+            if token_usage.get(tenant_id, 0) < settings.TENANT.TOKEN_QUOTA
+        }
+
+    result = await db.execute(
+        select(ResearchSession.tenant_id, func.count())
+        .where(ResearchSession.tenant_id.in_(list(candidates)), is_running())
+        .group_by(ResearchSession.tenant_id)
+    )
+    return schedule_fair(candidates, dict(result.tuples().all()), limit)
+
+
+def schedule_fair(candidates: dict[str, list[int]], running: dict[str, int], limit: int) -> list[int]:
+    """Выбирает сессии для запуска по взвешенной справедливой очереди
+
+    Каждая следующая сессия берется у тенанта с наименьшим числом выполняемых сессий на единицу веса,
+    а внутри тенанта - в порядке создания. Тенанты, достигшие TENANT_MAX_CONCURRENT (если он не 0), пропускаются.
+
+    Args:
+        candidates (dict[str, list[int]]): ID ожидающих сессий каждого тенанта в порядке создания
+        running (dict[str, int]): Количество выполняемых сессий каждого тенанта
+        limit (int): Максимальное количество сессий
+
+    Returns:
+        list[int]: ID выбранных сессий
+    """
+    queues = {tenant_id: list(session_ids) for tenant_id, session_ids in candidates.items()}
+    running = dict(running)
+    scheduled = []
+
+    while len(scheduled) < limit:
+        eligible = [
+            tenant_id
+            for tenant_id, session_ids in queues.items()
+            if session_ids and not is_over_limit(running.get(tenant_id, 0), settings.TENANT.MAX_CONCURRENT)
+        ]
+        if not eligible:
+            break
+
+        tenant_id = min(
+            eligible,
+            key=lambda tenant_id: (running.get(tenant_id, 0) / get_tenant_weight(tenant_id), queues[tenant_id][0]),
+        )
+        scheduled.append(queues[tenant_id].pop(0))
+        running[tenant_id] = running.get(tenant_id, 0) + 1
+
+    return scheduled
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic import BaseModel
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -7,6 +9,13 @@ class AgentConfig(BaseModel):
 
     LLM_NAME: str
     RATE_LIMIT_PER_MINUTE: int
+    MAX_PARALLEL_RESEARCHERS: int = 3
+    MAX_ACTIVE_RESEARCHERS: int = 8
+    TOPIC_SIMILARITY_THRESHOLD: float = 0.6
+    SUMMARY_BATCH_TOKENS: int = 12000
+    SUMMARY_BATCH_MAX_PAGES: int = 5
+    INCREMENTAL_COMPRESSION: bool = False
+    DIGEST_MAX_WORDS: int = 1500
     GOOGLE_API_KEY: str
     TAVILY_API_KEY: str
 
@@ -19,7 +28,11 @@ class ApiConfig(BaseModel):
     VERSION: str
     HOST: str
     PORT: int
-    RELOAD: bool
+    RELOAD: bool = False
+    WORKERS: int = 1
+    LONG_POLL_MAX_WAIT: float = 60
+    LONG_POLL_INTERVAL: float = 1
+    EXPORT_BATCH_SIZE: int = 500
 
 
 class DatabaseConfig(BaseModel):
@@ -29,10 +42,104 @@ class DatabaseConfig(BaseModel):
     USER: str
     PASSWORD: str
     HOST: str
+    PORT: int = 5432
+    POOL_SIZE: int = 20
+    MAX_OVERFLOW: int = 20
+    POOL_TIMEOUT: float = 30
+    POOL_RECYCLE: int = 1800
+    POOL_PRE_PING: bool = True
+    STATEMENT_TIMEOUT_MS: int = 30000
+    TEXT_SEARCH_CONFIG: str = "russian"
+    DSN: str = ""
 
     @property
     def URL(self) -> str:
-        return f"postgresql+asyncpg://{self.USER}:{self.PASSWORD}@{self.HOST}:5432/{self.NAME}"
+        if self.DSN:
+            return self.DSN
+        return f"postgresql+asyncpg://{self.USER}:{self.PASSWORD}@{self.HOST}:{self.PORT}/{self.NAME}"
+
+
+class CacheConfig(BaseModel):
+    """Конфигурация кэширования готовых исследований"""
+
+    RESPONSE_SIZE: int = 1024
+    REUSE_WINDOW_SECONDS: int = 86400
+
+
+class WorkerConfig(BaseModel):
+    """Конфигурация обработчиков исследований"""
+
+    QUEUE_ENABLED: bool = False
+    IN_API: bool = True
+    CONCURRENCY: int = 4
+    POLL_INTERVAL: float = 2
+    LEASE_SECONDS: int = 120
+    HEARTBEAT_INTERVAL: float = 30
+    MAX_ATTEMPTS: int = 3
+
+
+class TenantConfig(BaseModel):
+    """Конфигурация квот тенантов"""
+
+    DEFAULT_ID: str = "default"
+    MAX_CONCURRENT: int = 4
+    MAX_PENDING: int = 20
+    TOKEN_QUOTA: int = 0
+    TOKEN_WINDOW_SECONDS: int = 86400
+    RETRY_AFTER_SECONDS: int = 30
+    WEIGHTS: dict[str, float] = {}
+
+
+class AdmissionConfig(BaseModel):
+    """Конфигурация допуска запросов, которые запускают агента"""
+
+    ENABLED: bool = True
+    MAX_IN_FLIGHT: int = 8
+    MAX_QUEUED: int = 16
+    QUEUE_TIMEOUT_SECONDS: float = 30
+    MAX_LIMITER_WAIT_SECONDS: float = 60
+    MAX_PENDING: int = 200
+    RETRY_AFTER_SECONDS: int = 30
+
+
+class SearchConfig(BaseModel):
+    """Конфигурация поставщиков поиска"""
+
+    PROVIDER: Literal["tavily", "local"] = "tavily"
+    LOCAL_DOCS_PATH: str = ""
+    LOCAL_INDEX_PATH: str = "search_index"
+    LOCAL_EXTENSIONS: list[str] = [".txt", ".md", ".rst"]
+    LOCAL_REFRESH_SECONDS: float = 60
+    CACHE_SIZE: int = 1024
+    CACHE_TTL_SECONDS: float = 3600
+    SPECULATIVE_BUDGET: int = 0
+
+
+class ToolsConfig(BaseModel):
+    """Конфигурация выполнения инструментов: лимиты одновременных вызовов и таймауты по названию инструмента"""
+
+    CONCURRENCY: dict[str, int] = {"web_search_tool": 8, "local_search_tool": 16}
+    TIMEOUTS: dict[str, float] = {"web_search_tool": 180, "local_search_tool": 60}
+
+
+class CassetteConfig(BaseModel):
+    """Конфигурация записи и воспроизведения вызовов LLM и веб-поиска"""
+
+    MODE: Literal["off", "record", "replay"] = "off"
+    PATH: str = "cassettes/cassette.jsonl.gz"
+    LATENCY_SCALE: float = 0
+    LATENCY_SECONDS: float = 0
+
+
+class LoopConfig(BaseModel):
+    """Конфигурация мониторинга цикла событий и выноса тяжелой синхронной работы в пул потоков"""
+
+    MONITOR_ENABLED: bool = True
+    LAG_INTERVAL_SECONDS: float = 0.5
+    LAG_WINDOW: int = 600
+    SLOW_CALLBACK_MS: float = 100
+    OFFLOAD_ENABLED: bool = True
+    OFFLOAD_MIN_CHARS: int = 100000
 
 
 class Settings(BaseSettings):
@@ -41,6 +148,14 @@ class Settings(BaseSettings):
     AGENT: AgentConfig
     DATABASE: DatabaseConfig
     API: ApiConfig
+    CACHE: CacheConfig = CacheConfig()
+    WORKER: WorkerConfig = WorkerConfig()
+    TENANT: TenantConfig = TenantConfig()
+    ADMISSION: AdmissionConfig = AdmissionConfig()
+    SEARCH: SearchConfig = SearchConfig()
+    TOOLS: ToolsConfig = ToolsConfig()
+    CASSETTE: CassetteConfig = CassetteConfig()
+    LOOP: LoopConfig = LoopConfig()
 
     model_config = SettingsConfigDict(
         env_file=".env",
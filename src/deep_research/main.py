@@ -3,9 +3,14 @@ import uvicorn
 from deep_research.config import settings
 
 if __name__ == "__main__":
+    # При перезагрузке uvicorn запускает один процесс и игнорирует количество обработчиков
+    if settings.API.RELOAD and settings.API.WORKERS > 1:
+        raise SystemExit("API_RELOAD=true нельзя использовать вместе с API_WORKERS > 1")
+
     uvicorn.run(
         "deep_research.backend.app:app",
         host=settings.API.HOST,
         port=settings.API.PORT,
         reload=settings.API.RELOAD,
+        workers=settings.API.WORKERS,
     )
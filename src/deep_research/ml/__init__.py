@@ -1,3 +1,33 @@
-from .graph import deep_research_agent
+from importlib import import_module
+from typing import TYPE_CHECKING, Any
 
-__all__ = ["deep_research_agent"]
+if TYPE_CHECKING:
+    from .graph import build_deep_research_agent
+    from .store import ReportStore, ResearchResult, ResearchResultStore
+    from .usage import ResearchUsage, UsageCallbackHandler
+
+__all__ = [
+    "build_deep_research_agent",
+    "ReportStore",
+    "ResearchResult",
+    "ResearchResultStore",
+    "ResearchUsage",
+    "UsageCallbackHandler",
+]
+
+# Модули загружаются при первом обращении к атрибуту, чтобы импорт пакета
+# не тянул за собой графы, langgraph и клиенты моделей
+_exports = {
+    "build_deep_research_agent": ".graph",
+    "ReportStore": ".store",
+    "ResearchResult": ".store",
+    "ResearchResultStore": ".store",
+    "ResearchUsage": ".usage",
+    "UsageCallbackHandler": ".usage",
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name in _exports:
+        return getattr(import_module(_exports[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,277 @@
+"""Запись и воспроизведение вызовов LLM и веб-поиска
+
+В режиме записи каждый ответ LLM и веб-поиска сохраняется в кассету на диске по хэшу запроса.
+В режиме воспроизведения граф работает только по кассете, без обращения к внешним API,
+что позволяет повторять реальные сессии офлайн для профилирования и бенчмарков.
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import re
+import threading
+import time
+from collections.abc import Sequence
+from contextlib import nullcontext
+from functools import cache
+from pathlib import Path
+from typing import Any
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumpd, load
+
+from deep_research.config import settings
+from deep_research.ml.file_lock import file_lock
+
+# Дата и время в промптах меняются от запуска к запуску и не должны влиять на ключ
+DATETIME_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(\.\d+)?")
+
+
+class CassetteMissError(LookupError):
+    """В кассете нет ответа на запрос в режиме воспроизведения"""
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Убирает из сериализованных сообщений ID и текущее время, которые различаются между запусками
+
+    Args:
+        prompt (str): Сообщения, сериализованные LangChain
+
+    Returns:
+        str: Нормализованная строка для ключа кассеты
+    """
+
+    def strip_ids(value: Any) -> Any:
+        if isinstance(value, list):
+            return [strip_ids(item) for item in value]
+        if isinstance(value, dict):
+            if "lc" in value and isinstance(value.get("kwargs"), dict):
+                value = {**value, "kwargs": {key: item for key, item in value["kwargs"].items() if key != "id"}}
+            return {key: strip_ids(item) for key, item in value.items()}
+        return value
+
+    try:
+        prompt = json.dumps(strip_ids(json.loads(prompt)), ensure_ascii=False, sort_keys=True)
+    except json.JSONDecodeError:
+        pass
+    return DATETIME_PATTERN.sub("<datetime>", prompt)
+
+
+class Cassette:
+    """Кассета с ответами на запросы к LLM и веб-поиску
+
+    Записи дописываются в сжатый gzip файл JSON Lines: каждая строка содержит ключ запроса,
+    ответ и время, за которое он был получен. Запись выполняется под блокировкой файла <path>.lock,
+    поэтому в одну кассету могут писать несколько потоков и процессов.
+    """
+
+    def __init__(self, path: Path, replay: bool, latency_scale: float = 0, latency_seconds: float = 0) -> None:
+        self.path = path
+        self.replay = replay
+        self.latency_scale = latency_scale
+        self.latency_seconds = latency_seconds
+        self._entries: dict[str, dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        # При воспроизведении кассета не меняется и может лежать в каталоге только для чтения
+        with nullcontext() if replay else file_lock(self.lock_path):
+            if path.exists():
+                with gzip.open(path, "rt", encoding="utf-8") as file:
+                    for line in file:
+                        entry = json.loads(line)
+                        self._entries[entry["key"]] = entry
+
+    @property
+    def lock_path(self) -> Path:
+        """Файл блокировки, под которой кассета читается и дописывается"""
+        return self.path.with_name(self.path.name + ".lock")
+
+    @staticmethod
+    def build_key(kind: str, *parts: str) -> str:
+        """Ключ запроса в кассете
+
+        Args:
+            kind (str): Тип запроса: llm или search
+            *parts (str): Части запроса, от которых зависит ответ
+
+        Returns:
+            str: SHA-256 хэш запроса
+        """
+        return hashlib.sha256("\0".join((kind, *parts)).encode()).hexdigest()
+
+    def _find(self, key: str) -> tuple[Any | None, float]:
+        """Записанный ответ и синтетическая задержка его воспроизведения"""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            if self.replay:
+                raise CassetteMissError(f"Ответа на запрос {key} нет в кассете {self.path}")
+            return None, 0
+
+        delay = entry["elapsed"] * self.latency_scale + self.latency_seconds if self.replay else 0
+        return entry["value"], delay
+
+    def get(self, key: str) -> Any | None:
+        """Получить записанный ответ в синхронном коде; задержка воспроизведения блокирует поток
+
+        Args:
+            key (str): Ключ запроса
+
+        Raises:
+            CassetteMissError: Если в режиме воспроизведения ответа нет в кассете
+
+        Returns:
+            Any | None: Ответ или None, если в режиме записи ответа еще нет
+        """
+        value, delay = self._find(key)
+        if delay > 0:
+            time.sleep(delay)
+        return value
+
+    async def aget(self, key: str) -> Any | None:
+        """Получить записанный ответ
+
+        В режиме воспроизведения ответ отдается с синтетической задержкой: записанное время ответа,
+        умноженное на CASSETTE_LATENCY_SCALE, плюс CASSETTE_LATENCY_SECONDS.
+
+        Args:
+            key (str): Ключ запроса
+
+        Raises:
+            CassetteMissError: Если в режиме воспроизведения ответа нет в кассете
+
+        Returns:
+            Any | None: Ответ или None, если в режиме записи ответа еще нет
+        """
+        value, delay = self._find(key)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return value
+
+    def _add(self, key: str, value: Any, elapsed: float) -> str | None:
+        """Добавляет ответ в память и возвращает строку для файла или None, если ответ уже записан"""
+        entry = {"key": key, "value": value, "elapsed": round(elapsed, 3)}
+        with self._lock:
+            if key in self._entries:
+                return None
+            self._entries[key] = entry
+        return json.dumps(entry, ensure_ascii=False) + "\n"
+
+    def _append(self, line: str) -> None:
+        """Дописывает строку в файл кассеты"""
+        # Каждая запись - отдельный член gzip, и под блокировкой он дописывается в файл целиком
+        with (
+            file_lock(self.lock_path),
+            gzip.open(self.path, "at", encoding="utf-8") as file,
+        ):
+            file.write(line)
+
+    def put(self, key: str, value: Any, elapsed: float) -> None:
+        """Записать ответ в кассету в синхронном коде; запись в файл блокирует поток
+
+        Args:
+            key (str): Ключ запроса
+            value (Any): Ответ, сериализуемый в JSON
+            elapsed (float): Время получения ответа в секундах
+        """
+        if line := self._add(key, value, elapsed):
+            self._append(line)
+
+    async def aput(self, key: str, value: Any, elapsed: float) -> None:
+        """Записать ответ в кассету
+
+        Ожидание блокировки файла и сжатие выполняются в отдельном потоке, чтобы не блокировать цикл событий.
+        Ответ доступен для чтения сразу, еще до записи в файл.
+
+        Args:
+            key (str): Ключ запроса
+            value (Any): Ответ, сериализуемый в JSON
+            elapsed (float): Время получения ответа в секундах
+        """
+        if line := self._add(key, value, elapsed):
+            await asyncio.to_thread(self._append, line)
+
+
+class CassetteLLMCache(BaseCache):
+    """Кэш LangChain, который записывает ответы LLM в кассету и воспроизводит их
+
+    Кэш проверяется до ограничителя частоты запросов, поэтому при воспроизведении лимит не расходуется.
+    Синхронные вызовы модели работают с той же кассетой, что и асинхронные.
+    """
+
+    def __init__(self, cassette: Cassette) -> None:
+        self.cassette = cassette
+        self._started: dict[str, float] = {}
+
+    def _build_key(self, prompt: str, llm_string: str) -> str:
+        return self.cassette.build_key("llm", normalize_prompt(prompt), llm_string)
+
+    def _load(self, key: str, value: Any | None) -> RETURN_VAL_TYPE | None:
+        if value is None:
+            self._started[key] = time.monotonic()
+            return None
+        return [load(generation, allowed_objects="core") for generation in value]
+
+    def _dump(self, key: str, return_val: Sequence[Any]) -> tuple[list[Any], float]:
+        elapsed = time.monotonic() - self._started.pop(key, time.monotonic())
+        return [dumpd(generation) for generation in return_val], elapsed
+
+    def lookup(self, prompt: str, llm_string: str) -> RETURN_VAL_TYPE | None:
+        key = self._build_key(prompt, llm_string)
+        return self._load(key, self.cassette.get(key))
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = self._build_key(prompt, llm_string)
+        self.cassette.put(key, *self._dump(key, return_val))
+
+    def clear(self, **kwargs: Any) -> None:
+        pass
+
+    async def alookup(self, prompt: str, llm_string: str) -> RETURN_VAL_TYPE | None:
+        key = self._build_key(prompt, llm_string)
+        return self._load(key, await self.cassette.aget(key))
+
+    async def aupdate(self, prompt: str, llm_string: str, return_val: Sequence[Any]) -> None:
+        key = self._build_key(prompt, llm_string)
+        await self.cassette.aput(key, *self._dump(key, return_val))
+
+
+class CassetteSearchClient:
+    """Клиент веб-поиска, который записывает ответы в кассету и воспроизводит их"""
+
+    def __init__(self, cassette: Cassette, client: Any | None, params: str) -> None:
+        self.cassette = cassette
+        self.client = client
+        self.params = params
+
+    async def ainvoke(self, query: str) -> dict[str, Any]:
+        key = self.cassette.build_key("search", self.params, query)
+        value = await self.cassette.aget(key)
+        if value is not None:
+            return value
+
+        start = time.monotonic()
+        value = await self.client.ainvoke(query)
+        await self.cassette.aput(key, value, time.monotonic() - start)
+        return value
+
+    async def abatch(self, queries: list[str]) -> list[dict[str, Any]]:
+        return list(await asyncio.gather(*(self.ainvoke(query) for query in queries)))
+
+
+@cache
+def get_cassette() -> Cassette | None:
+    """Получить кассету текущего процесса
+
+    Returns:
+        Cassette | None: Кассета или None, если запись и воспроизведение выключены
+    """
+    if settings.CASSETTE.MODE == "off":
+        return None
+
+    return Cassette(
+        Path(settings.CASSETTE.PATH),
+        replay=settings.CASSETTE.MODE == "replay",
+        latency_scale=settings.CASSETTE.LATENCY_SCALE,
+        latency_seconds=settings.CASSETTE.LATENCY_SECONDS,
+    )
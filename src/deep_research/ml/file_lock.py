@@ -0,0 +1,49 @@
+"""Блокировка файлов между процессами
+
+Кассету и локальный поисковый индекс могут одновременно изменять несколько обработчиков
+на одном узле, поэтому запись в них выполняется под эксклюзивной блокировкой файла.
+"""
+
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+# Блокировка fcntl принадлежит процессу, поэтому потоки одного процесса дополнительно упорядочиваются здесь
+_thread_locks: dict[Path, threading.Lock] = {}
+_thread_locks_guard = threading.Lock()
+
+
+def _get_thread_lock(path: Path) -> threading.Lock:
+    with _thread_locks_guard:
+        return _thread_locks.setdefault(path, threading.Lock())
+
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """Эксклюзивная блокировка файла path между потоками и процессами
+
+    Блокируется отдельный файл path, который создается при первом вызове. Без модуля fcntl (в Windows)
+    блокировка действует только внутри процесса.
+
+    Args:
+        path (Path): Путь к файлу блокировки
+    """
+    path = path.absolute()
+    with _get_thread_lock(path):
+        if fcntl is None:
+            yield
+            return
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
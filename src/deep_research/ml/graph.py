@@ -1,19 +1,26 @@
 from datetime import datetime
 from typing import Literal
 
-from langchain_core.messages import AIMessage, HumanMessage, get_buffer_string
+from langchain_core.callbacks import adispatch_custom_event
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import END, START, StateGraph
+from langgraph.graph.state import CompiledStateGraph
 from langgraph.types import Command
 
+from deep_research.ml.offload import aget_buffer_string
 from deep_research.ml.prompts import (
     CLARIFY_WITH_USER_PROMPT,
     GENERATE_REPORT_PROMPT,
     WRITE_RESEARCH_BRIEF_PROMPT,
 )
 from deep_research.ml.state import ClarifyWithUser, DeepResearchState
-from deep_research.ml.supervisor_subgraph import supervisor_subgraph
-from deep_research.ml.utils import llm
+from deep_research.ml.store import ReportStore
+from deep_research.ml.supervisor_subgraph import get_supervisor_subgraph
+from deep_research.ml.usage import CACHE_HIT_EVENT
+from deep_research.ml.utils import get_llm
 
 
 async def clarify_with_user(state: DeepResearchState) -> Command[Literal["write_research_brief", "__end__"]]:
@@ -21,11 +28,11 @@ async def clarify_with_user(state: DeepResearchState) -> Command[Literal["write_
     messages = state["messages"]
 
     prompt = CLARIFY_WITH_USER_PROMPT.format(
-        messages=get_buffer_string(messages),
+        messages=await aget_buffer_string(messages),
         date=datetime.now().isoformat(),
     )
 
-    structured_llm = llm.with_structured_output(ClarifyWithUser)
+    structured_llm = get_llm().with_structured_output(ClarifyWithUser)
     response = await structured_llm.ainvoke([HumanMessage(content=prompt)])
 
     if response.need_clarification:
@@ -42,22 +49,44 @@ async def clarify_with_user(state: DeepResearchState) -> Command[Literal["write_
         )
 
 
-async def write_research_brief(state: DeepResearchState) -> DeepResearchState:
-    """Преобразует диалог в одно точно и детализированное исследовательское задание"""
+async def write_research_brief(
+    state: DeepResearchState,
+    config: RunnableConfig,
+) -> Command[Literal["supervisor", "__end__"]]:
+    """Преобразует диалог в одно точно и детализированное исследовательское задание
+
+    Если в конфигурации передано хранилище отчетов и в нем есть отчет по такому же заданию,
+    то исследование не проводится и граф завершается с готовым отчетом.
+    """
     messages = state["messages"]
 
     prompt = WRITE_RESEARCH_BRIEF_PROMPT.format(
-        messages=get_buffer_string(messages),
+        messages=await aget_buffer_string(messages),
         date=datetime.now().isoformat(),
     )
 
-    response = await llm.ainvoke([HumanMessage(content=prompt)])
+    response = await get_llm().ainvoke([HumanMessage(content=prompt)])
     research_brief = response.content
 
-    return {
-        "messages": [HumanMessage(content=research_brief)],
-        "research_brief": research_brief,
-    }
+    report_store: ReportStore | None = config.get("configurable", {}).get("report_store")
+    if report_store and (final_report := await report_store.afind(research_brief)):
+        await adispatch_custom_event(CACHE_HIT_EVENT, {"research_brief": research_brief}, config=config)
+        return Command(
+            goto=END,
+            update={
+                "messages": [HumanMessage(content=research_brief), AIMessage(content=final_report)],
+                "research_brief": research_brief,
+                "final_report": final_report,
+            },
+        )
+
+    return Command(
+        goto="supervisor",
+        update={
+            "messages": [HumanMessage(content=research_brief)],
+            "research_brief": research_brief,
+        },
+    )
 
 
 async def generate_report(state: DeepResearchState) -> DeepResearchState:
@@ -69,11 +98,11 @@ async def generate_report(state: DeepResearchState) -> DeepResearchState:
 
     prompt = GENERATE_REPORT_PROMPT.format(
         research_brief=research_brief,
-        messages=get_buffer_string(messages),
+        messages=await aget_buffer_string(messages),
         information=information,
     )
 
-    response = await llm.ainvoke([HumanMessage(content=prompt)])
+    response = await get_llm().ainvoke([HumanMessage(content=prompt)])
     final_report = response.content
 
     return {
@@ -82,16 +111,25 @@ async def generate_report(state: DeepResearchState) -> DeepResearchState:
     }
 
 
-workflow = StateGraph(DeepResearchState)
+def build_deep_research_agent(checkpointer: BaseCheckpointSaver | None = None) -> CompiledStateGraph:
+    """Собирает граф агента с заданным чекпоинтером
+
+    Args:
+        checkpointer (BaseCheckpointSaver | None): Чекпоинтер для сохранения состояния графа.
+            По умолчанию используется MemorySaver, состояние которого не переживает перезапуск процесса
+
+    Returns:
+        CompiledStateGraph: Скомпилированный граф агента
+    """
+    workflow = StateGraph(DeepResearchState)
 
-workflow.add_node("clarify_with_user", clarify_with_user)
-workflow.add_node("write_research_brief", write_research_brief)
-workflow.add_node("supervisor", supervisor_subgraph)
-workflow.add_node("generate_report", generate_report)
+    workflow.add_node("clarify_with_user", clarify_with_user)
+    workflow.add_node("write_research_brief", write_research_brief)
+    workflow.add_node("supervisor", get_supervisor_subgraph())
+    workflow.add_node("generate_report", generate_report)
 
-workflow.add_edge(START, "clarify_with_user")
-workflow.add_edge("write_research_brief", "supervisor")
-workflow.add_edge("supervisor", "generate_report")
-workflow.add_edge("generate_report", END)
+    workflow.add_edge(START, "clarify_with_user")
+    workflow.add_edge("supervisor", "generate_report")
+    workflow.add_edge("generate_report", END)
 
-deep_research_agent = workflow.compile(checkpointer=MemorySaver())
+    return workflow.compile(checkpointer=checkpointer or MemorySaver())
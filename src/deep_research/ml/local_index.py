@@ -0,0 +1,443 @@
+"""Локальный поиск BM25 по каталогу документов
+
+Индекс хранится на диске как набор неизменяемых сегментов и манифест index.json со списком сегментов
+и удаленных из них документов. Сегмент состоит из трех файлов: метаданные документов, отсортированный
+словарь термов и постинг-листы; словарь и постинг-листы отображаются в память через mmap.
+
+При обновлении заново читаются только новые и измененные документы, и из них пишется новый сегмент,
+а старые версии документов помечаются удаленными в манифесте. Когда сегментов становится больше
+MAX_SEGMENTS, живые документы всех сегментов сливаются в один. Манифест заменяется атомарно, поэтому
+читатели никогда не видят наполовину записанный индекс. Обновлять индекс могут несколько процессов:
+чтение каталога, запись сегмента, замена манифеста и удаление ненужных файлов выполняются
+под блокировкой файла.
+"""
+
+import contextlib
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import threading
+import time
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Any, TypedDict
+
+from deep_research.ml.file_lock import file_lock
+
+# Слова сводятся к префиксам: грубая замена стемминга, которая объединяет словоформы
+STEM_LENGTH = 6
+WORD_PATTERN = re.compile(r"\w+")
+INDEX_FILE = "index.json"
+LOCK_FILE = "index.lock"
+SEGMENT_PREFIX = "segment-"
+# Постинг-листы индекса до появления сегментов
+LEGACY_PREFIX = "postings-"
+MAX_SEGMENTS = 8
+SNIPPET_LENGTH = 300
+
+# Параметры BM25
+K1 = 1.2
+B = 0.75
+
+
+class IndexedDocument(TypedDict):
+    """Документ в индексе: метаданные файла для инкрементального обновления"""
+
+    path: str
+    mtime_ns: int
+    size: int
+    title: str
+    length: int
+
+
+class SearchHit(TypedDict):
+    """Найденный документ"""
+
+    path: str
+    title: str
+    score: float
+
+
+def tokenize(text: str) -> list[str]:
+    """Разбивает текст на термы: слова в нижнем регистре, обрезанные до STEM_LENGTH символов"""
+    return [word[:STEM_LENGTH] for word in WORD_PATTERN.findall(text.casefold()) if len(word) > 1]
+
+
+def get_title(path: Path, text: str) -> str:
+    """Заголовок документа: первая непустая строка без разметки Markdown или имя файла"""
+    for line in text.splitlines():
+        if title := line.strip().lstrip("#").strip():
+            return title[:200]
+    return path.stem
+
+
+def write_segment(directory: Path, name: str, documents: list[IndexedDocument], postings: dict[str, list[int]]) -> None:
+    """Записывает сегмент индекса
+
+    Словарь - массив uint32: количество термов, для каждого терма смещение его байтов в блоке термов,
+    смещение постинг-листа в парах (doc_id, частота) и количество документов, затем длина блока термов
+    и сам блок термов в UTF-8, отсортированный побайтово.
+
+    Args:
+        directory (Path): Каталог индекса
+        name (str): Имя сегмента
+        documents (list[IndexedDocument]): Документы сегмента, doc_id - индекс в списке
+        postings (dict[str, list[int]]): Постинг-листы: терм -> пары (doc_id, частота) подряд
+    """
+    terms = sorted(term.encode() for term in postings)
+    lexicon = array("I", [len(terms)])
+    values = array("I")
+    blob = bytearray()
+    for term in terms:
+        pairs = postings[term.decode()]
+        lexicon.extend((len(blob), len(values) // 2, len(pairs) // 2))
+        blob += term
+        values.extend(pairs)
+    lexicon.append(len(blob))
+
+    (directory / f"{name}.documents.json").write_text(json.dumps(documents, ensure_ascii=False), encoding="utf-8")
+    with open(directory / f"{name}.lexicon.bin", "wb") as file:
+        lexicon.tofile(file)
+        file.write(blob)
+    with open(directory / f"{name}.postings.bin", "wb") as file:
+        values.tofile(file)
+
+
+class Segment:
+    """Неизменяемый сегмент индекса, словарь и постинг-листы которого отображены в память
+
+    Args:
+        directory (Path): Каталог индекса
+        name (str): Имя сегмента
+    """
+
+    def __init__(self, directory: Path, name: str) -> None:
+        self.name = name
+        self.documents: list[IndexedDocument] = json.loads(
+            (directory / f"{name}.documents.json").read_text(encoding="utf-8")
+        )
+        # doc_id документов, которые удалены или заменены более новой версией
+        self.deleted: set[int] = set()
+        self._maps: list[mmap.mmap] = []
+
+        lexicon = self._map(directory / f"{name}.lexicon.bin")
+        self._count = lexicon[:4].cast("I")[0]
+        terms_offset = (self._count * 3 + 2) * 4
+        self._lexicon = lexicon[:terms_offset].cast("I")
+        self._terms = lexicon[terms_offset:]
+        self._postings = self._map(directory / f"{name}.postings.bin").cast("I")
+
+    def _map(self, path: Path) -> memoryview:
+        with open(path, "rb") as file:
+            # Пустой файл нельзя отобразить в память
+            if not os.fstat(file.fileno()).st_size:
+                return memoryview(b"")
+            file_map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(file_map)
+        return memoryview(file_map)
+
+    def _get_term(self, index: int) -> bytes:
+        return bytes(self._terms[self._lexicon[1 + index * 3] : self._lexicon[4 + index * 3]])
+
+    def _get_pairs(self, index: int) -> list[int]:
+        offset, document_frequency = self._lexicon[2 + index * 3 : 4 + index * 3]
+        return self._postings[offset * 2 : (offset + document_frequency) * 2].tolist()
+
+    def find(self, term: str) -> list[int]:
+        """Постинг-лист терма двоичным поиском по словарю
+
+        Args:
+            term (str): Терм
+
+        Returns:
+            list[int]: Пары (doc_id, частота) подряд, включая удаленные документы
+        """
+        key = term.encode()
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            found = self._get_term(middle)
+            if found < key:
+                low = middle + 1
+            elif found > key:
+                high = middle
+            else:
+                return self._get_pairs(middle)
+        return []
+
+    def copy_live(self, deleted: set[int], documents: list[IndexedDocument], postings: dict[str, list[int]]) -> None:
+        """Дописывает неудаленные документы сегмента и их постинг-листы, чтобы слить сегменты
+
+        Args:
+            deleted (set[int]): doc_id удаленных документов с учетом текущего обновления
+            documents (list[IndexedDocument]): Документы нового сегмента
+            postings (dict[str, list[int]]): Постинг-листы нового сегмента
+        """
+        doc_ids = {}
+        for doc_id, document in enumerate(self.documents):
+            if doc_id not in deleted:
+                doc_ids[doc_id] = len(documents)
+                documents.append(document)
+
+        for index in range(self._count):
+            pairs = self._get_pairs(index)
+            live = [
+                value
+                for doc_id, frequency in zip(pairs[::2], pairs[1::2], strict=True)
+                if doc_id in doc_ids
+                for value in (doc_ids[doc_id], frequency)
+            ]
+            if live:
+                postings.setdefault(self._get_term(index).decode(), []).extend(live)
+
+    def close(self) -> None:
+        """Освобождает отображения файлов"""
+        self._lexicon.release()
+        self._terms.release()
+        self._postings.release()
+        for file_map in self._maps:
+            file_map.close()
+        self._maps = []
+
+
+class LocalSearchIndex:
+    """Инвертированный индекс BM25 по каталогу текстовых документов
+
+    Args:
+        docs_path (Path): Каталог с документами
+        index_path (Path): Каталог, в котором хранится индекс
+        extensions (list[str]): Расширения файлов, которые попадают в индекс
+        refresh_interval (float): Как часто проверять каталог на изменения, в секундах
+    """
+
+    def __init__(self, docs_path: Path, index_path: Path, extensions: list[str], refresh_interval: float) -> None:
+        self.docs_path = docs_path
+        self.index_path = index_path
+        self.extensions = {extension.lower() for extension in extensions}
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._generation: int | None = None
+        self._segments: list[Segment] = []
+        self._total = 0
+        self._average_length = 0.0
+        self._refreshed_at: float | None = None
+
+    def refresh(self, force: bool = False) -> bool:
+        """Обновляет индекс, если документы в каталоге изменились
+
+        Args:
+            force (bool): Проверить каталог, даже если не прошел refresh_interval
+
+        Returns:
+            bool: True, если этот вызов записал новую версию индекса
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._refreshed_at is not None and now - self._refreshed_at < self.refresh_interval:
+                return False
+            self._refreshed_at = now
+
+            with file_lock(self.index_path / LOCK_FILE):
+                # Другой процесс мог уже обновить индекс, поэтому изменения ищутся относительно его версии
+                self._load()
+                return self._update()
+
+    def _update(self) -> bool:
+        """Записывает сегмент с новыми и измененными документами и новый манифест"""
+        deleted = {segment.name: set(segment.deleted) for segment in self._segments}
+        changed = self._read_changes(deleted)
+        if not changed and all(deleted[segment.name] == segment.deleted for segment in self._segments):
+            return False
+
+        documents: list[IndexedDocument] = []
+        postings: dict[str, list[int]] = {}
+        segments = [segment for segment in self._segments if len(deleted[segment.name]) < len(segment.documents)]
+        if len(segments) + bool(changed) > MAX_SEGMENTS:
+            # Живые документы всех сегментов сливаются в новый сегмент вместе с измененными
+            for segment in segments:
+                segment.copy_live(deleted[segment.name], documents, postings)
+            segments = []
+        for document, terms in changed:
+            for term, frequency in terms.items():
+                postings.setdefault(term, []).extend((len(documents), frequency))
+            documents.append(document)
+
+        self._write(segments, deleted, documents, postings)
+        self._load()
+        return True
+
+    def _read_changes(self, deleted: dict[str, set[int]]) -> list[tuple[IndexedDocument, Counter[str]]]:
+        """Читает новые и измененные документы каталога
+
+        Args:
+            deleted (dict[str, set[int]]): Удаленные документы по сегментам, сюда добавляются измененные
+                и пропавшие из каталога документы
+
+        Returns:
+            list[tuple[IndexedDocument, Counter[str]]]: Документы, которые нужно записать, и частоты их термов
+        """
+        live = {
+            document["path"]: (segment, doc_id)
+            for segment in self._segments
+            for doc_id, document in enumerate(segment.documents)
+            if doc_id not in segment.deleted
+        }
+        changed = []
+        files = sorted(
+            path for path in self.docs_path.rglob("*") if path.is_file() and path.suffix.lower() in self.extensions
+        )
+        for path in files:
+            relative_path = path.relative_to(self.docs_path).as_posix()
+            try:
+                stat = path.stat()
+                if relative_path in live:
+                    segment, doc_id = live[relative_path]
+                    document = segment.documents[doc_id]
+                    if document["mtime_ns"] == stat.st_mtime_ns and document["size"] == stat.st_size:
+                        del live[relative_path]
+                        continue
+                text = path.read_text(encoding="utf-8", errors="replace")
+            except FileNotFoundError:
+                # Файл удалили после обхода каталога
+                continue
+
+            terms = tokenize(text)
+            document = IndexedDocument(
+                path=relative_path,
+                mtime_ns=stat.st_mtime_ns,
+                size=stat.st_size,
+                title=get_title(path, text),
+                length=len(terms),
+            )
+            changed.append((document, Counter(terms)))
+        # Прежние версии измененных документов и документы, которых больше нет в каталоге
+        for segment, doc_id in live.values():
+            deleted[segment.name].add(doc_id)
+        return changed
+
+    def _write(
+        self,
+        segments: list[Segment],
+        deleted: dict[str, set[int]],
+        documents: list[IndexedDocument],
+        postings: dict[str, list[int]],
+    ) -> None:
+        """Записывает новый сегмент и манифест следующего поколения, затем удаляет ненужные файлы"""
+        generation = (self._generation or 0) + 1
+        manifest: dict[str, Any] = {
+            "generation": generation,
+            "segments": [{"name": segment.name, "deleted": sorted(deleted[segment.name])} for segment in segments],
+        }
+        if documents:
+            name = f"{SEGMENT_PREFIX}{generation}"
+            write_segment(self.index_path, name, documents, postings)
+            manifest["segments"].append({"name": name, "deleted": []})
+
+        index_file = self.index_path / INDEX_FILE
+        temporary_file = index_file.with_suffix(".tmp")
+        temporary_file.write_text(json.dumps(manifest), encoding="utf-8")
+        os.replace(temporary_file, index_file)
+
+        # Старые файлы удаляются только после замены манифеста: до нее их еще могут открыть другие процессы
+        referenced = {entry["name"] for entry in manifest["segments"]}
+        for path in self.index_path.iterdir():
+            if path.name.startswith(LEGACY_PREFIX) or (
+                path.name.startswith(SEGMENT_PREFIX) and path.name.split(".", 1)[0] not in referenced
+            ):
+                with contextlib.suppress(OSError):
+                    path.unlink()
+
+    def _load(self) -> None:
+        """Загружает манифест с диска, если он изменился, и открывает новые сегменты"""
+        index_file = self.index_path / INDEX_FILE
+        manifest = json.loads(index_file.read_text(encoding="utf-8")) if index_file.exists() else {}
+        # У индекса до появления сегментов нет поколения: он перестраивается целиком
+        generation = manifest.get("generation", 0)
+        if generation == self._generation:
+            return
+
+        opened = {segment.name: segment for segment in self._segments}
+        segments = []
+        for entry in manifest.get("segments", []):
+            segment = opened.pop(entry["name"], None) or Segment(self.index_path, entry["name"])
+            segment.deleted = set(entry["deleted"])
+            segments.append(segment)
+        for segment in opened.values():
+            segment.close()
+
+        self._generation = generation
+        self._segments = segments
+        lengths = [
+            document["length"]
+            for segment in segments
+            for doc_id, document in enumerate(segment.documents)
+            if doc_id not in segment.deleted
+        ]
+        self._total = len(lengths)
+        self._average_length = sum(lengths) / len(lengths) if lengths else 0.0
+
+    def search(self, query: str, limit: int) -> list[SearchHit]:
+        """Ищет документы по запросу
+
+        Args:
+            query (str): Поисковый запрос
+            limit (int): Максимальное количество документов
+
+        Returns:
+            list[SearchHit]: Документы в порядке убывания оценки BM25
+        """
+        with self._lock:
+            if not self._total:
+                return []
+
+            scores: dict[tuple[int, int], float] = {}
+            for term in set(tokenize(query)):
+                matches = []
+                for index, segment in enumerate(self._segments):
+                    pairs = segment.find(term)
+                    matches.extend(
+                        (index, doc_id, frequency)
+                        for doc_id, frequency in zip(pairs[::2], pairs[1::2], strict=True)
+                        if doc_id not in segment.deleted
+                    )
+                if not matches:
+                    continue
+
+                document_frequency = len(matches)
+                idf = math.log(1 + (self._total - document_frequency + 0.5) / (document_frequency + 0.5))
+                for index, doc_id, frequency in matches:
+                    document = self._segments[index].documents[doc_id]
+                    length_norm = 1 - B + B * document["length"] / self._average_length
+                    scores[index, doc_id] = scores.get((index, doc_id), 0.0) + idf * frequency * (K1 + 1) / (
+                        frequency + K1 * length_norm
+                    )
+
+            best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+            hits = []
+            for (index, doc_id), score in best:
+                document = self._segments[index].documents[doc_id]
+                hits.append(SearchHit(path=document["path"], title=document["title"], score=score))
+            return hits
+
+    def get_result(self, hit: SearchHit) -> dict[str, Any]:
+        """Результат поиска в формате Tavily с полным текстом документа
+
+        Args:
+            hit (SearchHit): Найденный документ
+
+        Returns:
+            dict[str, Any]: Результат с url, title, content, raw_content и score
+        """
+        path = self.docs_path / hit["path"]
+        raw_content = path.read_text(encoding="utf-8", errors="replace")
+        return {
+            "url": path.resolve().as_uri(),
+            "title": hit["title"],
+            "content": raw_content[:SNIPPET_LENGTH],
+            "raw_content": raw_content,
+            "score": hit["score"],
+        }
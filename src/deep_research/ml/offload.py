@@ -0,0 +1,126 @@
+"""Вынос тяжелой синхронной работы из цикла событий
+
+Пока выполняется синхронный код, цикл событий не обслуживает ни запросы API, ни другие исследования.
+Работа над большими данными выполняется в пуле потоков, а небольшая - сразу, потому что переход
+в поток дороже нее.
+
+Кодировщик и парсер JSON на C держат GIL до конца работы, поэтому в потоке они блокируют цикл событий
+почти так же, как и в нем самом. Для больших данных JSON кодируется кодировщиком на Python, а списки
+разбираются по одному элементу: результат тот же, но поток регулярно отпускает GIL.
+"""
+
+import asyncio
+import json
+import re
+from collections.abc import Callable, Sequence
+from typing import Any, TypeVar
+
+from langchain_core.messages import AnyMessage, get_buffer_string
+
+from deep_research.config import settings
+
+T = TypeVar("T")
+
+JSON_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def should_offload(size: int | None) -> bool:
+    """Нужно ли выполнять работу над данными размера size в пуле потоков
+
+    Args:
+        size (int | None): Размер данных в символах; None - размер неизвестен, работа заведомо тяжелая
+
+    Returns:
+        bool: True, если работу стоит выполнить в пуле потоков
+    """
+    if not settings.LOOP.OFFLOAD_ENABLED:
+        return False
+    return size is None or size >= settings.LOOP.OFFLOAD_MIN_CHARS
+
+
+async def offload(func: Callable[..., T], *args: Any, size: int | None = None) -> T:
+    """Выполняет функцию в пуле потоков, если данные достаточно большие
+
+    Args:
+        func (Callable[..., T]): Синхронная функция
+        *args (Any): Аргументы функции
+        size (int | None): Размер данных в символах; None - всегда в пуле потоков
+
+    Returns:
+        T: Результат функции
+    """
+    if should_offload(size):
+        return await asyncio.to_thread(func, *args)
+    return func(*args)
+
+
+def dumps_json(value: Any) -> str:
+    """json.dumps кодировщиком на Python, который не держит GIL все время кодирования"""
+    return "".join(json.JSONEncoder().iterencode(value))
+
+
+def loads_json(text: str) -> Any:
+    """json.loads, который разбирает элементы списка по одному и между ними отпускает GIL"""
+    index = JSON_WHITESPACE.match(text).end()
+    if not text.startswith("[", index):
+        return json.loads(text)
+
+    decoder = json.JSONDecoder()
+    items = []
+    index = JSON_WHITESPACE.match(text, index + 1).end()
+    if text.startswith("]", index):
+        index += 1
+    else:
+        while True:
+            item, index = decoder.raw_decode(text, index)
+            items.append(item)
+            index = JSON_WHITESPACE.match(text, index).end()
+            if text.startswith("]", index):
+                index += 1
+                break
+            if not text.startswith(",", index):
+                raise json.JSONDecodeError("Expecting ',' delimiter", text, index)
+            index = JSON_WHITESPACE.match(text, index + 1).end()
+
+    if JSON_WHITESPACE.match(text, index).end() != len(text):
+        raise json.JSONDecodeError("Extra data", text, index)
+    return items
+
+
+async def adumps_json(value: Any, size: int) -> str:
+    """Сериализует значение в JSON, для больших значений - в пуле потоков
+
+    Args:
+        value (Any): Значение
+        size (int): Примерный размер значения в символах
+
+    Returns:
+        str: JSON, такой же, как у json.dumps
+    """
+    if should_offload(size):
+        return await asyncio.to_thread(dumps_json, value)
+    return json.dumps(value)
+
+
+async def aloads_json(text: str) -> Any:
+    """Разбирает JSON, большой - в пуле потоков
+
+    Args:
+        text (str): JSON
+
+    Returns:
+        Any: Значение
+    """
+    if should_offload(len(text)):
+        return await asyncio.to_thread(loads_json, text)
+    return json.loads(text)
+
+
+def get_messages_size(messages: Sequence[AnyMessage | dict[str, Any]]) -> int:
+    """Примерный размер истории сообщений в символах"""
+    return sum(len(message["content"] if isinstance(message, dict) else message.content) for message in messages)
+
+
+async def aget_buffer_string(messages: Sequence[AnyMessage]) -> str:
+    """get_buffer_string, который для длинной истории выполняется в пуле потоков"""
+    return await offload(get_buffer_string, messages, size=get_messages_size(messages))
@@ -0,0 +1,127 @@
+"""Планирование запуска исследователей супервизором"""
+
+import re
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import TypedDict
+
+from langchain_core.messages import ToolCall, ToolMessage
+
+from deep_research.config import settings
+from deep_research.ml.utils import get_rate_limiter
+
+# Темы сравниваются по префиксам слов: это грубая замена стемминга, которая сводит словоформы к одному терму
+STEM_LENGTH = 6
+MIN_WORD_LENGTH = 3
+
+MERGED_MESSAGE = "Тема объединена с похожей темой исследования {tool_call_id}, результаты приведены в ответе на нее."
+DEFERRED_MESSAGE = (
+    "Исследование отложено: достигнут предел параллельных исследователей. "
+    "Если тема все еще нужна, вызови conduct_research_tool повторно в следующем ходе."
+)
+
+
+class ResearchLoad:
+    """Нагрузка на исследователей во всем процессе
+
+    Все исследователи процесса используют один ограничитель частоты запросов к LLM,
+    поэтому запас для новых исследователей считается по процессу, а не по сессии.
+    """
+
+    def __init__(self) -> None:
+        self.active = 0
+
+    @contextmanager
+    def track(self) -> Iterator[None]:
+        """Учитывает исследователя как активного, пока выполняется блок"""
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+
+    def get_headroom(self, limit: int) -> int:
+        """Сколько исследователей можно запустить сейчас
+
+        Каждый запрос, ожидающий в ограничителе частоты, означает, что лимит LLM уже исчерпан,
+        и новые исследователи только удлинят очередь.
+
+        Args:
+            limit (int): Максимальное количество исследователей за один ход супервизора
+
+        Returns:
+            int: Количество исследователей от 1 до limit
+        """
+        free = settings.AGENT.MAX_ACTIVE_RESEARCHERS - self.active - get_rate_limiter().waiting
+        return max(1, min(limit, free))
+
+
+research_load = ResearchLoad()
+
+
+class ResearchPlan(TypedDict):
+    """План запуска исследователей на один ход супервизора"""
+
+    calls: list[ToolCall]
+    skipped_messages: list[ToolMessage]
+
+
+def get_topic_terms(topic: str) -> set[str]:
+    """Множество термов темы исследования для сравнения с другими темами"""
+    words = re.findall(r"\w+", topic.casefold())
+    return {word[:STEM_LENGTH] for word in words if len(word) >= MIN_WORD_LENGTH}
+
+
+def get_similarity(terms: set[str], other_terms: set[str]) -> float:
+    """Сходство тем по коэффициенту Жаккара"""
+    if not terms or not other_terms:
+        return 0.0
+    return len(terms & other_terms) / len(terms | other_terms)
+
+
+def plan_research(tool_calls: list[ToolCall]) -> ResearchPlan:
+    """Планирует запуск исследователей по вызовам conduct_research_tool
+
+    Похожие темы объединяются в одно исследование. Количество исследователей ограничивается
+    запасом ограничителя частоты и числом уже активных исследователей, а темы сверх предела
+    откладываются: супервизор получает об этом ответ и может повторить вызов в следующем ходе.
+    Вызовы идут в порядке приоритета, в котором их перечислил супервизор.
+
+    Args:
+        tool_calls (list[ToolCall]): Вызовы conduct_research_tool
+
+    Returns:
+        ResearchPlan: Вызовы для запуска и ответы на объединенные и отложенные вызовы
+    """
+    capacity = research_load.get_headroom(settings.AGENT.MAX_PARALLEL_RESEARCHERS)
+    planned: list[tuple[ToolCall, set[str]]] = []
+    skipped_messages = []
+
+    for tool_call in tool_calls:
+        topic = tool_call["args"]["research_topic"]
+        terms = get_topic_terms(topic)
+        similar = next(
+            (
+                (planned_call, planned_terms)
+                for planned_call, planned_terms in planned
+                if get_similarity(planned_terms, terms) >= settings.AGENT.TOPIC_SIMILARITY_THRESHOLD
+            ),
+            None,
+        )
+
+        if similar:
+            planned_call, planned_terms = similar
+            planned_call["args"]["research_topic"] += f"\n\nТакже учти: {topic}"
+            planned_terms |= terms
+            content = MERGED_MESSAGE.format(tool_call_id=planned_call["id"])
+        elif len(planned) < capacity:
+            planned.append(({**tool_call, "args": {**tool_call["args"]}}, terms))
+            continue
+        else:
+            content = DEFERRED_MESSAGE
+
+        skipped_messages.append(
+            ToolMessage(content=content, name="conduct_research_tool", tool_call_id=tool_call["id"])
+        )
+
+    return ResearchPlan(calls=[planned_call for planned_call, _ in planned], skipped_messages=skipped_messages)
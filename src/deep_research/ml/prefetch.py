@@ -0,0 +1,117 @@
+"""Упреждающая загрузка результатов поиска, пока исследователь ждет ответа модели"""
+
+import asyncio
+import logging
+import re
+
+from langchain_core.messages import AnyMessage
+
+from deep_research.config import settings
+from deep_research.ml.search_providers import get_search_provider
+from deep_research.ml.tools import SEARCH_MAX_RESULTS, find_webpages, pack_webpages, summarize_webpages_cached
+from deep_research.ml.utils import get_rate_limiter
+
+logger = logging.getLogger(__name__)
+
+SOURCE_TITLE_PATTERN = re.compile(r"^SOURCE \d+: (.+)$", re.MULTILINE)
+# Запрос по теме собирается из ее начала: модель обычно начинает с широкого запроса по формулировке темы
+TOPIC_QUERY_WORDS = 12
+MAX_QUERIES_PER_TURN = 2
+
+# Ссылки на фоновые задачи, чтобы их не удалил сборщик мусора
+_tasks: set[asyncio.Task] = set()
+
+
+def normalize_query(query: str) -> str:
+    """Запрос без учета регистра и лишних пробелов"""
+    return " ".join(query.casefold().split())
+
+
+def predict_queries(messages: list[AnyMessage], speculative_queries: list[str]) -> list[str]:
+    """Предсказывает следующие поисковые запросы исследователя
+
+    До первого поиска предсказывается запрос по началу темы исследования, после поиска - запросы
+    по заголовкам найденных источников. Запросы, которые уже выполнялись или загружались, пропускаются.
+
+    Args:
+        messages (list[AnyMessage]): Сообщения исследователя
+        speculative_queries (list[str]): Запросы, уже загруженные упреждающе
+
+    Returns:
+        list[str]: Предсказанные запросы в порядке приоритета
+    """
+    seen = {normalize_query(query) for query in speculative_queries}
+    candidates = []
+    for message in messages:
+        if message.type == "human" and not candidates:
+            candidates.append(" ".join(str(message.content).split()[:TOPIC_QUERY_WORDS]))
+        elif message.type == "ai":
+            for tool_call in message.tool_calls:
+                if tool_call["name"] == "web_search_tool":
+                    seen.update(normalize_query(query) for query in tool_call["args"].get("queries", []))
+        elif message.type == "tool" and message.name == "web_search_tool":
+            # Заголовки источников последнего поиска важнее заголовков предыдущих
+            candidates[1:1] = SOURCE_TITLE_PATTERN.findall(str(message.content))
+
+    predicted = []
+    for query in candidates:
+        if query and normalize_query(query) not in seen:
+            seen.add(normalize_query(query))
+            predicted.append(query)
+    return predicted
+
+
+def has_headroom() -> bool:
+    """Есть ли у ограничителя частоты запросов место для упреждающего вызова LLM"""
+    return not get_rate_limiter().waiting
+
+
+async def prefetch(query: str) -> None:
+    """Загружает результаты поиска и резюме страниц в кэш
+
+    Результаты поиска загружаются всегда, а резюме - пакетами, пока у ограничителя частоты есть место.
+    Пока страницы ищутся, очередь к модели могла вырасти, поэтому место проверяется перед каждым пакетом,
+    и оставшиеся страницы суммирует уже сам исследователь, если они ему понадобятся.
+    """
+    try:
+        search_results = await find_webpages(
+            get_search_provider(settings.SEARCH.PROVIDER), [query], SEARCH_MAX_RESULTS, "general"
+        )
+        webpage_contents = [result["raw_content"] for result in search_results.values()]
+        batches = pack_webpages(
+            webpage_contents,
+            settings.AGENT.SUMMARY_BATCH_TOKENS,
+            settings.AGENT.SUMMARY_BATCH_MAX_PAGES,
+        )
+        for batch in batches:
+            if not has_headroom():
+                logger.debug("Упреждающая суммаризация по запросу %r остановлена: модель занята", query)
+                return
+            await summarize_webpages_cached([webpage_contents[index] for index in batch])
+    except Exception:
+        logger.debug("Не удалось упреждающе загрузить результаты поиска по запросу %r", query, exc_info=True)
+
+
+def start_prefetch(messages: list[AnyMessage], speculative_queries: list[str]) -> list[str]:
+    """Запускает в фоне загрузку предсказанных запросов в пределах SEARCH_SPECULATIVE_BUDGET на исследователя
+
+    Упреждающая загрузка суммирует страницы через ту же модель, поэтому она выключена по умолчанию
+    и не запускается, когда запросы к модели уже ждут в ограничителе частоты и лишняя работа задержала бы основную.
+
+    Args:
+        messages (list[AnyMessage]): Сообщения исследователя
+        speculative_queries (list[str]): Запросы, уже загруженные упреждающе
+
+    Returns:
+        list[str]: Запущенные запросы
+    """
+    budget = min(settings.SEARCH.SPECULATIVE_BUDGET - len(speculative_queries), MAX_QUERIES_PER_TURN)
+    if budget <= 0 or not has_headroom():
+        return []
+
+    queries = predict_queries(messages, speculative_queries)[:budget]
+    for query in queries:
+        task = asyncio.create_task(prefetch(query))
+        _tasks.add(task)
+        task.add_done_callback(_tasks.discard)
+    return queries
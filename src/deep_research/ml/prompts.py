@@ -61,6 +61,7 @@ SUPERVISOR_PROMPT = """
 Правила:
 - Используй think_tool перед каждым conduct_research_tool (план) и после (оценка). Не сочетай think_tool с другими инструментами в одном ходе.
 - Минимизируй делегирование; по умолчанию один под-агент, если нет очевидного параллелизма.
+- Не больше {max_parallel_researchers} conduct_research_tool за ход, самые важные темы — первыми. Похожие темы объединяются, а темы сверх доступного запаса откладываются.
 - Остановись, когда можешь уверенно ответить.
 
 Отображай мышление в think_tool:
@@ -80,7 +81,7 @@ RESEARCH_SYSTEM_PROMPT = """
 
 Инструменты:
 - web_search_tool: веб-поиск
-- think_tool: только для рефлексии/планирования
+{local_search_tool}- think_tool: только для рефлексии/планирования
 
 Процесс:
 1) Начни с широких запросов; затем сужай.
@@ -94,6 +95,11 @@ RESEARCH_SYSTEM_PROMPT = """
 """
 
 
+LOCAL_SEARCH_TOOL_PROMPT = """- local_search_tool: поиск по внутренней базе документов; используй его для внутренних тем \
+(продукты, процессы, документация компании), а web_search_tool - для внешней информации
+"""
+
+
 COMPRESS_RESEARCH_SYSTEM_PROMPT = """
 У тебя есть сырые сообщения исследования (выводы инструментов, результаты поиска). Сегодня {date}.
 
@@ -113,6 +119,58 @@ COMPRESS_RESEARCH_SYSTEM_PROMPT = """
 """
 
 
+UPDATE_DIGEST_PROMPT = """
+Ты ведёшь сводку находок исследователя по теме. Сегодня {date}.
+
+Тема исследования:
+<research_topic>
+{research_topic}
+</research_topic>
+
+Текущая сводка:
+<digest>
+{digest}
+</digest>
+
+Новые результаты инструментов:
+<tool_results>
+{tool_results}
+</tool_results>
+
+Задача: обнови сводку, добавив из новых результатов все релевантные факты и источники.
+
+Правила:
+- Сохрани всё из текущей сводки; новые факты добавляй, повторы объединяй (напр., «[1],[3] утверждают X»).
+- Каждому уникальному URL — один номер; используй встроенные ссылки [n] и держи в конце список «Источники».
+- Не длиннее {max_words} слов: если места не хватает, сокращай формулировки, а не факты и источники.
+- topic_covered = true, только если сводки уже достаточно для полного ответа по теме: ключевые вопросы закрыты \
+и есть ≥3 релевантных источника.
+"""
+
+
+COMPRESS_DIGEST_PROMPT = """
+Тема исследования:
+<research_topic>
+{research_topic}
+</research_topic>
+
+Вызовы инструментов:
+<tool_calls>
+{tool_calls}
+</tool_calls>
+
+Сводка находок, собранная по ходу исследования:
+<digest>
+{digest}
+</digest>
+
+Результаты инструментов, которые ещё не вошли в сводку:
+<tool_results>
+{tool_results}
+</tool_results>
+"""
+
+
 GENERATE_REPORT_PROMPT = """
 Составь подробный, хорошо структурированный ответ на бриф.
 
@@ -163,3 +221,24 @@ SUMMARIZE_WEBPAGE_PROMPT = """
 
 Сегодняшняя дата: {date}.
 """
+
+
+SUMMARIZE_WEBPAGES_BATCH_PROMPT = """
+Суммаризируй сырое содержимое каждой из нескольких веб‑страниц для дальнейшего исследования, сохранив ключевую информацию.
+Страницы независимы: не смешивай факты разных страниц в одном резюме.
+
+Вход:
+{webpages}
+
+Рекомендации:
+- Сохрани основную тему и ключевые факты (цифры, имена, даты, места, шаги/списки, цитаты).
+- Поддерживай хронологию, если важна.
+- Сократи до ~25–30% объёма, если текст не и так краток.
+
+Верни строгий JSON со списком "summaries", по одному элементу на каждую страницу, с ключами ровно так:
+"page_id": номер страницы из атрибута id,
+"summary": "Краткое содержание (абзацы и/или пункты)",
+"key_excerpts": "Цитата 1, Цитата 2, Цитата 3 ... до 5"
+
+Сегодняшняя дата: {date}.
+"""
@@ -1,36 +1,157 @@
+import asyncio
+import json
+import logging
 from datetime import datetime
+from functools import cache
 
-from langchain_core.messages import SystemMessage
+from langchain_core.messages import AnyMessage, HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import BaseTool
 from langgraph.graph import END, START, StateGraph
-from langgraph.prebuilt import ToolNode, tools_condition
+from langgraph.graph.state import CompiledStateGraph
+from langgraph.prebuilt import tools_condition
+
+from deep_research.config import settings
+from deep_research.ml.prefetch import has_headroom, start_prefetch
+from deep_research.ml.prompts import (
+    COMPRESS_DIGEST_PROMPT,
+    COMPRESS_RESEARCH_SYSTEM_PROMPT,
+    LOCAL_SEARCH_TOOL_PROMPT,
+    RESEARCH_SYSTEM_PROMPT,
+    UPDATE_DIGEST_PROMPT,
+)
+from deep_research.ml.search_providers import is_local_search_enabled
+from deep_research.ml.state import ResearchDigest, ResearcherState
+from deep_research.ml.tool_executor import ToolExecutor
+from deep_research.ml.tools import local_search_tool, think_tool, web_search_tool
+from deep_research.ml.usage import SEARCH_TOOLS
+from deep_research.ml.utils import get_llm
+
+logger = logging.getLogger(__name__)
+
+
+def has_local_search_tool() -> bool:
+    """Доступен ли исследователю отдельный поиск по локальным документам
+
+    Если поиск и так идет по локальному каталогу, то отдельный инструмент не нужен.
+    """
+    return is_local_search_enabled() and settings.SEARCH.PROVIDER != "local"
+
+
+def get_researcher_tools() -> list[BaseTool]:
+    """Инструменты исследователя"""
+    if has_local_search_tool():
+        return [web_search_tool, local_search_tool, think_tool]
+    return [web_search_tool, think_tool]
+
+
+def format_tool_calls(messages: list[AnyMessage]) -> str:
+    """Список выполненных вызовов инструментов исследователя"""
+    answered = {message.tool_call_id for message in messages if message.type == "tool"}
+    return "\n".join(
+        f"- {tool_call['name']}: {json.dumps(tool_call['args'], ensure_ascii=False)}"
+        for message in messages
+        if message.type == "ai"
+        for tool_call in message.tool_calls
+        if tool_call["id"] in answered
+    )
+
+
+def format_tool_results(messages: list[AnyMessage]) -> str:
+    """Результаты поисковых инструментов из сообщений; рефлексия think_tool в сводку не входит"""
+    return "\n\n".join(
+        f'<result tool="{message.name}">\n{message.content}\n</result>'
+        for message in messages
+        if message.type == "tool" and message.name in SEARCH_TOOLS
+    )
+
+
+async def update_digest(state: ResearcherState) -> ResearcherState:
+    """Добавляет в сводку находок результаты поиска, которые еще не вошли в нее
 
-from deep_research.ml.prompts import COMPRESS_RESEARCH_SYSTEM_PROMPT, RESEARCH_SYSTEM_PROMPT
-from deep_research.ml.state import ResearcherState
-from deep_research.ml.tools import think_tool, web_search_tool
-from deep_research.ml.utils import llm
+    Если обновить сводку не удалось, то результаты остаются непросмотренными и попадут в финальное сжатие.
+
+    Args:
+        state (ResearcherState): Состояние исследователя
+
+    Returns:
+        ResearcherState: Обновленная сводка или пустое обновление, если новых результатов нет
+    """
+    researcher_messages = state["researcher_messages"]
+    tool_results = format_tool_results(researcher_messages[state.get("digested_messages", 0) :])
+    if not tool_results:
+        return {}
+
+    prompt = UPDATE_DIGEST_PROMPT.format(
+        date=datetime.now().isoformat(),
+        research_topic=researcher_messages[0].content,
+        digest=state.get("research_digest", ""),
+        tool_results=tool_results,
+        max_words=settings.AGENT.DIGEST_MAX_WORDS,
+    )
+    try:
+        structured_llm = get_llm().with_structured_output(ResearchDigest)
+        response = await structured_llm.ainvoke([HumanMessage(content=prompt)])
+        return {
+            "research_digest": response.digest,
+            "digested_messages": len(researcher_messages),
+            "research_complete": response.topic_covered,
+        }
+    except Exception:
+        logger.warning("Не удалось обновить сводку находок, результаты войдут в финальное сжатие")
+        return {}
 
 
 async def researcher(state: ResearcherState) -> ResearcherState:
-    """Исследовательский агент, который проводит исследование по заданной теме"""
+    """Исследовательский агент, который проводит исследование по заданной теме
+
+    Пока модель выбирает следующий шаг, в фоне загружаются результаты вероятных следующих поисковых запросов,
+    а при инкрементальном сжатии параллельно обновляется сводка находок по результатам последнего поиска.
+    Сводка обновляется, только если у ограничителя частоты есть место: иначе дополнительный вызов задержал бы
+    основные, а непросмотренные результаты войдут в сводку на одном из следующих шагов.
+    """
     researcher_messages = state["researcher_messages"]
+    speculative_queries = start_prefetch(researcher_messages, state.get("speculative_queries", []))
 
-    prompt = RESEARCH_SYSTEM_PROMPT.format(date=datetime.now().isoformat())
+    prompt = RESEARCH_SYSTEM_PROMPT.format(
+        date=datetime.now().isoformat(),
+        local_search_tool=LOCAL_SEARCH_TOOL_PROMPT if has_local_search_tool() else "",
+    )
     messages_with_system = [SystemMessage(content=prompt)] + researcher_messages
 
-    llm_with_tools = llm.bind_tools([web_search_tool, think_tool])
-    response = await llm_with_tools.ainvoke(messages_with_system)
+    llm_with_tools = get_llm().bind_tools(get_researcher_tools())
+    if settings.AGENT.INCREMENTAL_COMPRESSION and has_headroom():
+        response, digest_update = await asyncio.gather(
+            llm_with_tools.ainvoke(messages_with_system),
+            update_digest(state),
+        )
+    else:
+        response, digest_update = await llm_with_tools.ainvoke(messages_with_system), {}
 
-    return {"researcher_messages": [response]}
+    return {"researcher_messages": [response], "speculative_queries": speculative_queries, **digest_update}
 
 
 async def compress_research(state: ResearcherState) -> ResearcherState:
-    """Сжимает исследование, чтобы уменьшить количество информации, которую нужно обработать"""
+    """Сжимает исследование, чтобы уменьшить количество информации, которую нужно обработать
+
+    При инкрементальном сжатии модель получает не всю историю исследователя, а сводку находок
+    и только те результаты поиска, которые в нее еще не вошли.
+    """
     researcher_messages = state["researcher_messages"]
 
     prompt = COMPRESS_RESEARCH_SYSTEM_PROMPT.format(date=datetime.now().isoformat())
-    messages_with_system = [SystemMessage(content=prompt)] + researcher_messages
-
-    response = await llm.ainvoke(messages_with_system)
+    if settings.AGENT.INCREMENTAL_COMPRESSION:
+        digest_prompt = COMPRESS_DIGEST_PROMPT.format(
+            research_topic=researcher_messages[0].content,
+            tool_calls=format_tool_calls(researcher_messages),
+            digest=state.get("research_digest", ""),
+            tool_results=format_tool_results(researcher_messages[state.get("digested_messages", 0) :]),
+        )
+        messages_with_system = [SystemMessage(content=prompt), HumanMessage(content=digest_prompt)]
+    else:
+        messages_with_system = [SystemMessage(content=prompt)] + researcher_messages
+
+    response = await get_llm().ainvoke(messages_with_system)
     compressed_research = response.content
 
     raw_notes = [message.content for message in researcher_messages]
@@ -41,26 +162,46 @@ async def compress_research(state: ResearcherState) -> ResearcherState:
     }
 
 
-async def custom_condition(state: ResearcherState):
-    return tools_condition(state, messages_key="researcher_messages")
-
+async def researcher_tools(state: ResearcherState, config: RunnableConfig) -> ResearcherState:
+    """Выполняет все вызовы инструментов исследователя из последнего хода одновременно"""
+    tool_calls = state["researcher_messages"][-1].tool_calls
+    tool_messages = await ToolExecutor.from_tools(get_researcher_tools()).aexecute(tool_calls, config)
+    return {"researcher_messages": tool_messages}
 
-workflow = StateGraph(ResearcherState)
 
-workflow.add_node("researcher", researcher)
-workflow.add_node("researcher_tools", ToolNode([web_search_tool, think_tool], messages_key="researcher_messages"))
-workflow.add_node("compress_research", compress_research)
+async def custom_condition(state: ResearcherState):
+    # Исследователь останавливается досрочно, как только сводки находок достаточно для ответа по теме
+    if state.get("research_complete"):
+        return "__end__"
+    return tools_condition(state, messages_key="researcher_messages")
 
-workflow.add_edge(START, "researcher")
-workflow.add_conditional_edges(
-    "researcher",
-    custom_condition,
-    {
-        "tools": "researcher_tools",
-        "__end__": "compress_research",
-    },
-)
-workflow.add_edge("researcher_tools", "researcher")
-workflow.add_edge("compress_research", END)
 
-researcher_subgraph = workflow.compile()
+@cache
+def get_researcher_subgraph() -> CompiledStateGraph:
+    """Собирает граф исследователя при первом обращении
+
+    Returns:
+        CompiledStateGraph: Скомпилированный граф исследователя
+    """
+    workflow = StateGraph(ResearcherState)
+
+    workflow.add_node("researcher", researcher)
+    workflow.add_node("researcher_tools", researcher_tools)
+    workflow.add_node("compress_research", compress_research)
+
+    workflow.add_edge(START, "researcher")
+    workflow.add_conditional_edges(
+        "researcher",
+        custom_condition,
+        {
+            "tools": "researcher_tools",
+            "__end__": "compress_research",
+        },
+    )
+    workflow.add_edge("researcher_tools", "researcher")
+    workflow.add_edge("compress_research", END)
+
+    # Исследователи запускаются параллельно внутри одного шага супервизора, и их чекпоинты
+    # делили бы пространства имен в порядке запуска. Результаты исследователей сохраняются
+    # отдельно (см. ResearchResultStore), поэтому чекпоинты для подграфа отключены.
+    return workflow.compile(checkpointer=False)
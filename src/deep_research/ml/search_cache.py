@@ -0,0 +1,120 @@
+"""Кэш результатов поиска и резюме страниц"""
+
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
+from deep_research.config import settings
+
+
+class SearchCache:
+    """LRU-кэш с ограниченным временем жизни, общий для всех исследователей процесса
+
+    Значения хранятся как задачи asyncio, поэтому запрос, который уже выполняется (например, упреждающий),
+    не запускается повторно: следующий вызов дожидается той же задачи. Задачи, завершившиеся ошибкой,
+    из кэша удаляются.
+    """
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items: OrderedDict[Hashable, tuple[float, asyncio.Future]] = OrderedDict()
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def _get(self, key: Hashable) -> asyncio.Future | None:
+        loop = asyncio.get_running_loop()
+        # Задачи привязаны к циклу событий, в котором были созданы
+        if loop is not self._loop:
+            self._items.clear()
+            self._loop = loop
+
+        item = self._items.get(key)
+        if item is None:
+            return None
+        created_at, future = item
+        if time.monotonic() - created_at > self.ttl:
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return future
+
+    def _put(self, key: Hashable, future: asyncio.Future) -> None:
+        def discard_failed(future: asyncio.Future) -> None:
+            if (future.cancelled() or future.exception()) and self._items.get(key, (0, None))[1] is future:
+                del self._items[key]
+
+        future.add_done_callback(discard_failed)
+        if self.max_size <= 0:
+            return
+        self._items[key] = (time.monotonic(), future)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    async def aget(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """Получить значение из кэша или вычислить его
+
+        Args:
+            key (Hashable): Ключ
+            compute (Callable[[], Awaitable[Any]]): Функция, которая вычисляет значение
+
+        Returns:
+            Any: Значение
+        """
+        future = self._get(key)
+        if future is None:
+            future = asyncio.ensure_future(compute())
+            self._put(key, future)
+        # Отмена одного из ожидающих не должна отменять вычисление для остальных
+        return await asyncio.shield(future)
+
+    async def aget_many(
+        self,
+        keys: list[Hashable],
+        values: list[Any],
+        compute: Callable[[list[Any]], Awaitable[list[Any]]],
+    ) -> list[Any]:
+        """Получить значения из кэша, вычислив все недостающие одним вызовом
+
+        Args:
+            keys (list[Hashable]): Ключи
+            values (list[Any]): Входные данные для вычисления, по одному на ключ
+            compute (Callable[[list[Any]], Awaitable[list[Any]]]): Функция, которая вычисляет значения
+                для списка входных данных
+
+        Returns:
+            list[Any]: Значения в порядке ключей
+        """
+        futures: dict[Hashable, asyncio.Future] = {}
+        # Недостающие значения по ключу: повторяющиеся ключи вычисляются один раз
+        missing: dict[Hashable, Any] = {}
+        for key, value in zip(keys, values, strict=True):
+            if key in futures or key in missing:
+                continue
+            future = self._get(key)
+            if future is None:
+                missing[key] = value
+            else:
+                futures[key] = future
+
+        if missing:
+            batch = asyncio.ensure_future(compute(list(missing.values())))
+
+            async def pick(position: int) -> Any:
+                return (await batch)[position]
+
+            for position, key in enumerate(missing):
+                futures[key] = asyncio.ensure_future(pick(position))
+                self._put(key, futures[key])
+
+        return list(await asyncio.shield(asyncio.gather(*(futures[key] for key in keys))))
+
+
+def hash_content(content: str) -> str:
+    """Хэш содержимого страницы для ключа резюме"""
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+search_cache = SearchCache(settings.SEARCH.CACHE_SIZE, settings.SEARCH.CACHE_TTL_SECONDS)
@@ -0,0 +1,105 @@
+"""Поставщики поиска для исследователей"""
+
+import asyncio
+from abc import ABC, abstractmethod
+from functools import cache
+from pathlib import Path
+from typing import Any, Literal
+
+from deep_research.config import settings
+from deep_research.ml.local_index import LocalSearchIndex
+from deep_research.ml.utils import get_search_client
+
+SearchTopic = Literal["general", "news", "finance"]
+
+
+class SearchProvider(ABC):
+    """Поставщик поиска
+
+    Результаты возвращаются в формате Tavily: по каждому запросу словарь с ключом results,
+    в котором у каждого результата есть url, title, content и raw_content.
+    """
+
+    @abstractmethod
+    async def asearch(self, queries: list[str], max_results: int, topic: SearchTopic) -> list[dict[str, Any]]:
+        """Выполнить поисковые запросы
+
+        Args:
+            queries (list[str]): Поисковые запросы
+            max_results (int): Максимальное количество результатов на запрос
+            topic (SearchTopic): Тема поиска
+
+        Returns:
+            list[dict[str, Any]]: Ответы на запросы в том же порядке
+        """
+
+    @abstractmethod
+    def warmup(self) -> None:
+        """Заранее создает клиентов и загружает данные, нужные для поиска"""
+
+
+class TavilySearchProvider(SearchProvider):
+    """Веб-поиск Tavily"""
+
+    async def asearch(self, queries: list[str], max_results: int, topic: SearchTopic) -> list[dict[str, Any]]:
+        return await get_search_client(max_results, topic).abatch(queries)
+
+    def warmup(self) -> None:
+        get_search_client()
+
+
+class LocalSearchProvider(SearchProvider):
+    """Поиск BM25 по локальному каталогу документов
+
+    Тема поиска не учитывается. Индекс проверяется на изменения не чаще раза в SEARCH_LOCAL_REFRESH_SECONDS,
+    а чтение файлов выполняется в отдельном потоке, чтобы не блокировать цикл событий.
+    """
+
+    def __init__(self, index: LocalSearchIndex) -> None:
+        self.index = index
+
+    def _search(self, queries: list[str], max_results: int) -> list[dict[str, Any]]:
+        self.index.refresh()
+        return [
+            {"query": query, "results": [self.index.get_result(hit) for hit in self.index.search(query, max_results)]}
+            for query in queries
+        ]
+
+    async def asearch(self, queries: list[str], max_results: int, topic: SearchTopic) -> list[dict[str, Any]]:
+        return await asyncio.to_thread(self._search, queries, max_results)
+
+    def warmup(self) -> None:
+        self.index.refresh()
+
+
+def is_local_search_enabled() -> bool:
+    """Настроен ли каталог документов для локального поиска"""
+    return bool(settings.SEARCH.LOCAL_DOCS_PATH)
+
+
+@cache
+def get_search_provider(name: Literal["tavily", "local"]) -> SearchProvider:
+    """Получить поставщика поиска
+
+    Args:
+        name (Literal["tavily", "local"]): Название поставщика
+
+    Raises:
+        ValueError: Если для локального поиска не указан SEARCH_LOCAL_DOCS_PATH
+
+    Returns:
+        SearchProvider: Поставщик поиска
+    """
+    if name == "tavily":
+        return TavilySearchProvider()
+
+    if not is_local_search_enabled():
+        raise ValueError("Для локального поиска нужно указать каталог документов в SEARCH_LOCAL_DOCS_PATH")
+    return LocalSearchProvider(
+        LocalSearchIndex(
+            Path(settings.SEARCH.LOCAL_DOCS_PATH),
+            Path(settings.SEARCH.LOCAL_INDEX_PATH),
+            settings.SEARCH.LOCAL_EXTENSIONS,
+            settings.SEARCH.LOCAL_REFRESH_SECONDS,
+        )
+    )
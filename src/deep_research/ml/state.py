@@ -1,7 +1,7 @@
 from operator import add
 from typing import Annotated, TypedDict
 
-from langchain_core.messages import AnyMessage
+from langchain_core.messages import AnyMessage, ToolCall
 from langgraph.graph import add_messages
 from pydantic import BaseModel, Field
 
@@ -33,6 +33,33 @@ class WebSummary(BaseModel):
     )
 
 
+class IndexedWebSummary(WebSummary):
+    """Резюме одной из нескольких веб-страниц, суммируемых за один вызов"""
+
+    page_id: int = Field(
+        description="Номер страницы из атрибута id тега <webpage>",
+    )
+
+
+class WebSummaryBatch(BaseModel):
+    """Резюме нескольких веб-страниц"""
+
+    summaries: list[IndexedWebSummary] = Field(
+        description="Резюме для каждой страницы из входа, по одному на страницу",
+    )
+
+
+class ResearchDigest(BaseModel):
+    """Сводка находок исследователя"""
+
+    digest: str = Field(
+        description="Обновленная сводка находок со встроенными ссылками [n] и списком источников",
+    )
+    topic_covered: bool = Field(
+        description="Достаточно ли сводки для полного ответа по теме исследования",
+    )
+
+
 # States
 
 
@@ -49,9 +76,14 @@ class SupervisorState(TypedDict):
     research_brief: str
     raw_notes: Annotated[list[str], add]
     notes: Annotated[list[str], add]
+    research_calls: list[ToolCall]
 
 
 class ResearcherState(TypedDict):
     researcher_messages: Annotated[list[AnyMessage], add_messages]
+    speculative_queries: Annotated[list[str], add]
     raw_notes: Annotated[list[str], add]
     compressed_research: str
+    research_digest: str
+    digested_messages: int
+    research_complete: bool
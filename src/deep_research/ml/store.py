@@ -0,0 +1,66 @@
+from abc import ABC, abstractmethod
+from typing import TypedDict
+
+
+class ResearchResult(TypedDict):
+    """Результат работы одного исследователя"""
+
+    compressed_research: str
+    raw_notes: list[str]
+
+
+class ResearchResultStore(ABC):
+    """Хранилище результатов исследователей
+
+    Позволяет при возобновлении прерванного запуска не выполнять повторно исследования,
+    которые уже были завершены. Результаты хранятся по паре (thread_id, tool_call_id).
+    """
+
+    @abstractmethod
+    async def aget(self, thread_id: str, tool_call_id: str) -> ResearchResult | None:
+        """Получить сохраненный результат исследователя
+
+        Args:
+            thread_id (str): ID потока графа
+            tool_call_id (str): ID вызова conduct_research_tool
+
+        Returns:
+            ResearchResult | None: Результат или None, если исследование не завершалось
+        """
+
+    @abstractmethod
+    async def aput(self, thread_id: str, tool_call_id: str, result: ResearchResult) -> None:
+        """Сохранить результат исследователя
+
+        Args:
+            thread_id (str): ID потока графа
+            tool_call_id (str): ID вызова conduct_research_tool
+            result (ResearchResult): Результат исследователя
+        """
+
+    @abstractmethod
+    async def adelete_thread(self, thread_id: str) -> None:
+        """Удалить все результаты потока
+
+        Args:
+            thread_id (str): ID потока графа
+        """
+
+
+class ReportStore(ABC):
+    """Хранилище готовых отчетов
+
+    Позволяет не проводить исследование повторно, если недавно уже был подготовлен отчет
+    по такому же исследовательскому заданию.
+    """
+
+    @abstractmethod
+    async def afind(self, research_brief: str) -> str | None:
+        """Найти готовый отчет по исследовательскому заданию
+
+        Args:
+            research_brief (str): Исследовательское задание
+
+        Returns:
+            str | None: Готовый отчет или None, если подходящий отчет не найден
+        """
@@ -1,35 +1,117 @@
-import asyncio
 from datetime import datetime
+from functools import cache
 from typing import Literal
 
-from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage, filter_messages
+from langchain_core.callbacks import adispatch_custom_event
+from langchain_core.messages import HumanMessage, SystemMessage, ToolCall, ToolMessage, filter_messages
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import END, START, StateGraph
+from langgraph.graph.state import CompiledStateGraph
 from langgraph.types import Command
 
+from deep_research.config import settings
+from deep_research.ml.planner import plan_research, research_load
 from deep_research.ml.prompts import SUPERVISOR_PROMPT
-from deep_research.ml.researcher_subgraph import researcher_subgraph
+from deep_research.ml.researcher_subgraph import get_researcher_subgraph
 from deep_research.ml.state import SupervisorState
+from deep_research.ml.store import ResearchResult, ResearchResultStore
+from deep_research.ml.tool_executor import ToolExecutor, build_tool_handler
 from deep_research.ml.tools import conduct_research_tool, think_tool
-from deep_research.ml.utils import llm
+from deep_research.ml.usage import CACHE_HIT_EVENT
+from deep_research.ml.utils import get_llm
 
 
 async def supervisor(state: SupervisorState) -> SupervisorState:
     """Супервизор, который выполняет инструменты супервизора"""
     supervisor_messages = state["messages"]
 
-    prompt = SUPERVISOR_PROMPT.format(date=datetime.now().isoformat())
+    prompt = SUPERVISOR_PROMPT.format(
+        date=datetime.now().isoformat(),
+        max_parallel_researchers=settings.AGENT.MAX_PARALLEL_RESEARCHERS,
+    )
     messages_with_system = [SystemMessage(content=prompt)] + supervisor_messages
 
-    llm_with_tools = llm.bind_tools([think_tool, conduct_research_tool])
+    llm_with_tools = get_llm().bind_tools([think_tool, conduct_research_tool])
     response = await llm_with_tools.ainvoke(messages_with_system)
 
     return {"messages": [response]}
 
 
-async def supervisor_tools(state: SupervisorState) -> Command[Literal["supervisor", "__end__"]]:
+async def conduct_research(tool_call: ToolCall, config: RunnableConfig) -> ResearchResult:
+    """Запускает исследователя по теме из вызова conduct_research_tool
+
+    Если в конфигурации передано хранилище результатов, то завершенное исследование
+    берется из него, а новый результат сохраняется сразу после завершения исследователя.
+    Благодаря этому при возобновлении прерванного запуска выполняются только незавершенные исследования.
+    """
+    configurable = config.get("configurable", {})
+    store: ResearchResultStore | None = configurable.get("research_result_store")
+    thread_id = configurable.get("thread_id")
+
+    if store and thread_id:
+        result = await store.aget(thread_id, tool_call["id"])
+        if result:
+            await adispatch_custom_event(CACHE_HIT_EVENT, {"tool_call_id": tool_call["id"]}, config=config)
+            return result
+
+    with research_load.track():
+        response = await get_researcher_subgraph().ainvoke(
+            {"researcher_messages": [HumanMessage(content=tool_call["args"]["research_topic"])]}
+        )
+    result = ResearchResult(
+        compressed_research=response["compressed_research"],
+        raw_notes=response["raw_notes"],
+    )
+
+    if store and thread_id:
+        await store.aput(thread_id, tool_call["id"], result)
+
+    return result
+
+
+async def run_researcher(tool_call: ToolCall, config: RunnableConfig) -> ToolMessage:
+    """Обработчик вызова conduct_research_tool: сжатое исследование в ответе, сырые заметки в artifact"""
+    result = await conduct_research(tool_call, config)
+    return ToolMessage(
+        content=result["compressed_research"],
+        artifact=result["raw_notes"],
+        name="conduct_research_tool",
+        tool_call_id=tool_call["id"],
+    )
+
+
+@cache
+def get_supervisor_tool_executor() -> ToolExecutor:
+    """Исполнитель инструментов супервизора
+
+    Ошибки исследователей пробрасываются, чтобы запуск можно было возобновить: завершенные исследования
+    при этом берутся из хранилища результатов.
+    """
+    return ToolExecutor(
+        {"think_tool": build_tool_handler(think_tool), "conduct_research_tool": run_researcher},
+        raise_errors={"conduct_research_tool"},
+    )
+
+
+async def plan_researchers(state: SupervisorState) -> SupervisorState:
+    """Планирует исследователей: объединяет похожие темы и откладывает темы сверх доступного запаса
+
+    План сохраняется в состоянии, поэтому при возобновлении прерванного запуска выполняются те же исследования.
+    """
+    tool_calls = state["messages"][-1].tool_calls
+    conduct_research_calls = [tool_call for tool_call in tool_calls if tool_call["name"] == "conduct_research_tool"]
+    plan = plan_research(conduct_research_calls)
+
+    return {"messages": plan["skipped_messages"], "research_calls": plan["calls"]}
+
+
+async def supervisor_tools(
+    state: SupervisorState,
+    config: RunnableConfig,
+) -> Command[Literal["supervisor", "__end__"]]:
     """Выполняет инструменты супервизора"""
     supervisor_messages = state["messages"]
-    last_message = supervisor_messages[-1]
+    last_message = next(message for message in reversed(supervisor_messages) if message.type == "ai")
     tool_calls = last_message.tool_calls
 
     if not tool_calls:
@@ -39,41 +121,20 @@ async def supervisor_tools(state: SupervisorState) -> Command[Literal["superviso
             update={"notes": notes},
         )
 
-    tool_messages = []
-    all_raw_notes = []
-
-    think_calls = [tool_call for tool_call in tool_calls if tool_call["name"] == "think_tool"]
-    for tool_call in think_calls:
-        reflection = await think_tool.ainvoke(tool_call["args"])
-
-        tool_messages.append(
-            ToolMessage(
-                content=reflection,
-                name="think_tool",
-                tool_call_id=tool_call["id"],
-            )
-        )
-
-    conduct_research_calls = [tool_call for tool_call in tool_calls if tool_call["name"] == "conduct_research_tool"]
-    conduct_research_tasks = [
-        researcher_subgraph.ainvoke(
-            {"researcher_messages": [HumanMessage(content=tool_call["args"]["research_topic"])]}
-        )
-        for tool_call in conduct_research_calls
+    # Отложенные планировщиком исследования уже получили ответ, а объединенные заменены вызовами из плана
+    research_calls = {tool_call["id"]: tool_call for tool_call in state.get("research_calls", [])}
+    tool_calls = [
+        research_calls.get(tool_call["id"], tool_call)
+        for tool_call in tool_calls
+        if tool_call["name"] == "think_tool" or tool_call["id"] in research_calls
     ]
-    responses = await asyncio.gather(*conduct_research_tasks)
-    for response, tool_call in zip(responses, conduct_research_calls, strict=True):
-        compressed_research = response["compressed_research"]
-        raw_notes = response["raw_notes"]
-        all_raw_notes.extend(raw_notes)
-
-        tool_messages.append(
-            ToolMessage(
-                content=compressed_research,
-                name="conduct_research_tool",
-                tool_call_id=tool_call["id"],
-            )
-        )
+    tool_messages = await get_supervisor_tool_executor().aexecute(tool_calls, config)
+    all_raw_notes = []
+    for tool_message in tool_messages:
+        if tool_message.name == "conduct_research_tool" and tool_message.artifact:
+            all_raw_notes.extend(tool_message.artifact)
+            # Сырые заметки сохраняются в raw_notes, дублировать их в истории сообщений не нужно
+            tool_message.artifact = None
 
     return Command(
         goto="supervisor",
@@ -84,12 +145,21 @@ async def supervisor_tools(state: SupervisorState) -> Command[Literal["superviso
     )
 
 
-workflow = StateGraph(SupervisorState)
+@cache
+def get_supervisor_subgraph() -> CompiledStateGraph:
+    """Собирает граф супервизора при первом обращении
+
+    Returns:
+        CompiledStateGraph: Скомпилированный граф супервизора
+    """
+    workflow = StateGraph(SupervisorState)
 
-workflow.add_node("supervisor", supervisor)
-workflow.add_node("supervisor_tools", supervisor_tools)
+    workflow.add_node("supervisor", supervisor)
+    workflow.add_node("plan_researchers", plan_researchers)
+    workflow.add_node("supervisor_tools", supervisor_tools)
 
-workflow.add_edge(START, "supervisor")
-workflow.add_edge("supervisor", "supervisor_tools")
+    workflow.add_edge(START, "supervisor")
+    workflow.add_edge("supervisor", "plan_researchers")
+    workflow.add_edge("plan_researchers", "supervisor_tools")
 
-supervisor_subgraph = workflow.compile()
+    return workflow.compile()
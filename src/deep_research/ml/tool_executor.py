@@ -0,0 +1,126 @@
+"""Параллельное выполнение вызовов инструментов супервизора и исследователей"""
+
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable, Collection
+from typing import Any
+
+from langchain_core.messages import ToolCall, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import BaseTool
+
+from deep_research.config import settings
+
+logger = logging.getLogger(__name__)
+
+ToolHandler = Callable[[ToolCall, RunnableConfig], Awaitable[ToolMessage]]
+
+
+class ToolLimits:
+    """Ограничения одновременных вызовов инструментов, общие для всего процесса
+
+    Лимиты задаются в TOOLS_CONCURRENCY по названию инструмента; инструменты без лимита не ограничиваются.
+    """
+
+    def __init__(self) -> None:
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def get_semaphore(self, name: str) -> asyncio.Semaphore | None:
+        """Семафор инструмента или None, если количество вызовов не ограничено"""
+        limit = settings.TOOLS.CONCURRENCY.get(name, 0)
+        if limit <= 0:
+            return None
+
+        # Семафоры привязаны к циклу событий, в котором ими начали пользоваться
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._semaphores.clear()
+            self._loop = loop
+        if name not in self._semaphores:
+            self._semaphores[name] = asyncio.Semaphore(limit)
+        return self._semaphores[name]
+
+
+def build_tool_handler(tool: BaseTool) -> ToolHandler:
+    """Обработчик вызова обычного инструмента LangChain"""
+
+    async def handle(tool_call: ToolCall, config: RunnableConfig) -> ToolMessage:
+        return await tool.ainvoke(tool_call, config)
+
+    return handle
+
+
+class ToolExecutor:
+    """Выполняет все вызовы инструментов одного хода модели одновременно
+
+    Каждый вызов ограничен лимитом одновременных вызовов своего инструмента и таймаутом из TOOLS_TIMEOUTS.
+    Ошибка или таймаут одного вызова не отменяет остальные: вместо результата модель получает сообщение
+    об ошибке. Исключение составляют инструменты из raise_errors: их ошибки пробрасываются после завершения
+    всех вызовов хода, чтобы прерванный запуск можно было возобновить.
+
+    Args:
+        handlers (dict[str, ToolHandler]): Обработчики вызовов по названию инструмента
+        raise_errors (Collection[str]): Инструменты, ошибки которых пробрасываются
+    """
+
+    def __init__(self, handlers: dict[str, ToolHandler], raise_errors: Collection[str] = ()) -> None:
+        self.handlers = handlers
+        self.raise_errors = set(raise_errors)
+
+    @classmethod
+    def from_tools(cls, tools: list[BaseTool]) -> "ToolExecutor":
+        """Исполнитель для обычных инструментов LangChain"""
+        return cls({tool.name: build_tool_handler(tool) for tool in tools})
+
+    async def _execute(self, tool_call: ToolCall, config: RunnableConfig) -> ToolMessage:
+        name = tool_call["name"]
+        handler = self.handlers.get(name)
+        if handler is None:
+            return self._error_message(tool_call, f"Инструмента {name} нет. Доступны: {', '.join(self.handlers)}")
+
+        timeout = settings.TOOLS.TIMEOUTS.get(name, 0) or None
+        semaphore = tool_limits.get_semaphore(name)
+        try:
+            async with asyncio.timeout(timeout):
+                if semaphore is None:
+                    return await handler(tool_call, config)
+                async with semaphore:
+                    return await handler(tool_call, config)
+        except Exception as e:
+            if isinstance(e, TimeoutError) and timeout:
+                logger.warning("Инструмент %s не ответил за %s с", name, timeout)
+                return self._error_message(tool_call, f"Инструмент {name} не ответил за {timeout:g} с")
+            if name in self.raise_errors:
+                raise
+            logger.warning("Ошибка при выполнении инструмента %s: %r", name, e)
+            return self._error_message(tool_call, f"Ошибка при выполнении инструмента {name}: {e}")
+
+    @staticmethod
+    def _error_message(tool_call: ToolCall, content: str) -> ToolMessage:
+        return ToolMessage(content=content, name=tool_call["name"], tool_call_id=tool_call["id"], status="error")
+
+    async def aexecute(self, tool_calls: list[ToolCall], config: RunnableConfig) -> list[ToolMessage]:
+        """Выполнить вызовы инструментов
+
+        Args:
+            tool_calls (list[ToolCall]): Вызовы инструментов
+            config (RunnableConfig): Конфигурация запуска графа
+
+        Raises:
+            Exception: Первая ошибка инструмента из raise_errors
+
+        Returns:
+            list[ToolMessage]: Результаты в порядке вызовов
+        """
+        results: list[Any] = await asyncio.gather(
+            *(self._execute(tool_call, config) for tool_call in tool_calls),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return results
+
+
+tool_limits = ToolLimits()
@@ -1,22 +1,31 @@
 import asyncio
+import logging
 from datetime import datetime
-from typing import Annotated, Literal
+from functools import partial
+from typing import Annotated, Any
 
 from langchain_core.messages import HumanMessage
 from langchain_core.tools import InjectedToolArg, tool
-from langchain_tavily import TavilySearch
 
 from deep_research.config import settings
-from deep_research.ml.prompts import SUMMARIZE_WEBPAGE_PROMPT
-from deep_research.ml.state import WebSummary
-from deep_research.ml.utils import llm
+from deep_research.ml.prompts import SUMMARIZE_WEBPAGE_PROMPT, SUMMARIZE_WEBPAGES_BATCH_PROMPT
+from deep_research.ml.search_cache import hash_content, search_cache
+from deep_research.ml.search_providers import SearchProvider, SearchTopic, get_search_provider
+from deep_research.ml.state import WebSummary, WebSummaryBatch
+from deep_research.ml.utils import get_llm
+
+logger = logging.getLogger(__name__)
+
+# Грубая оценка: в среднем около 4 символов на токен
+CHARS_PER_TOKEN = 4
+SEARCH_MAX_RESULTS = 5
 
 
 @tool
 async def web_search_tool(
     queries: list[str],
-    max_results: Annotated[int, InjectedToolArg] = 5,
-    topic: Annotated[Literal["general", "news", "finance"], InjectedToolArg] = "general",
+    max_results: Annotated[int, InjectedToolArg] = SEARCH_MAX_RESULTS,
+    topic: Annotated[SearchTopic, InjectedToolArg] = "general",
 ) -> str:
     """
     Получает и суммирует результаты веб‑поиска по запросу
@@ -29,13 +38,125 @@ async def web_search_tool(
     Returns:
         str: Отформатированный ответ с результатами поиска
     """
-    search_tool = TavilySearch(
-        tavily_api_key=settings.AGENT.TAVILY_API_KEY,
-        max_results=max_results,
-        topic=topic,
-        include_raw_content=True,
+    return await search_and_summarize(get_search_provider(settings.SEARCH.PROVIDER), queries, max_results, topic)
+
+
+@tool
+async def local_search_tool(
+    queries: list[str],
+    max_results: Annotated[int, InjectedToolArg] = SEARCH_MAX_RESULTS,
+) -> str:
+    """
+    Получает и суммирует документы из внутренней базы знаний по запросу
+
+    Args:
+        queries (list[str]): Поисковые запросы
+        max_results (int): Максимальное количество документов
+
+    Returns:
+        str: Отформатированный ответ с найденными документами
+    """
+    return await search_and_summarize(get_search_provider("local"), queries, max_results, "general")
+
+
+async def search_and_summarize(
+    provider: SearchProvider,
+    queries: list[str],
+    max_results: int,
+    topic: SearchTopic,
+) -> str:
+    """Выполняет поиск, суммирует найденные страницы и форматирует ответ для исследователя
+
+    Args:
+        provider (SearchProvider): Поставщик поиска
+        queries (list[str]): Поисковые запросы
+        max_results (int): Максимальное количество результатов на запрос
+        topic (SearchTopic): Тема поиска
+
+    Returns:
+        str: Отформатированный ответ с результатами поиска
+    """
+    unique_search_results = await search_webpages(provider, queries, max_results, topic)
+    return format_search_results(unique_search_results)
+
+
+def format_search_results(search_results: dict[str, dict[str, str]]) -> str:
+    """Форматирует резюме найденных страниц для исследователя
+
+    Части ответа собираются списком и склеиваются один раз, а не дописываются к строке по одной.
+
+    Args:
+        search_results (dict[str, dict[str, str]]): Заголовок и резюме страниц по URL
+
+    Returns:
+        str: Отформатированный ответ с результатами поиска
+    """
+    parts = ["Результаты поиска:"]
+    for i, (url, result) in enumerate(search_results.items()):
+        parts.append(
+            f"\n\nSOURCE {i + 1}: {result['title']}\nURL: {url}\nSUMMARY:\n\n{result['summary']}\n\n" + "-" * 100
+        )
+    return "".join(parts)
+
+
+async def search_webpages(
+    provider: SearchProvider,
+    queries: list[str],
+    max_results: int,
+    topic: SearchTopic,
+) -> dict[str, dict[str, str]]:
+    """Выполняет поиск, убирает повторы источников и суммирует найденные страницы
+
+    Ответы поиска и резюме страниц берутся из общего кэша, поэтому запросы, уже выполненные
+    другим исследователем или упреждающей загрузкой, не повторяются.
+
+    Args:
+        provider (SearchProvider): Поставщик поиска
+        queries (list[str]): Поисковые запросы
+        max_results (int): Максимальное количество результатов на запрос
+        topic (SearchTopic): Тема поиска
+
+    Returns:
+        dict[str, dict[str, str]]: Заголовок, содержимое и резюме страниц по URL
+    """
+    unique_search_results = await find_webpages(provider, queries, max_results, topic)
+    summaries = await summarize_webpages_cached([result["raw_content"] for result in unique_search_results.values()])
+    for url, summary in zip(unique_search_results.keys(), summaries, strict=True):
+        unique_search_results[url]["summary"] = summary
+
+    return unique_search_results
+
+
+async def find_webpages(
+    provider: SearchProvider,
+    queries: list[str],
+    max_results: int,
+    topic: SearchTopic,
+) -> dict[str, dict[str, str]]:
+    """Выполняет поиск через общий кэш и убирает повторы источников
+
+    Args:
+        provider (SearchProvider): Поставщик поиска
+        queries (list[str]): Поисковые запросы
+        max_results (int): Максимальное количество результатов на запрос
+        topic (SearchTopic): Тема поиска
+
+    Returns:
+        dict[str, dict[str, str]]: Заголовок и содержимое страниц по URL
+    """
+
+    async def search(query: str) -> dict[str, Any]:
+        return (await provider.asearch([query], max_results, topic))[0]
+
+    search_results = await asyncio.gather(
+        *(
+            search_cache.aget(
+                ("search", type(provider).__name__, " ".join(query.casefold().split()), max_results, topic),
+                partial(search, query),
+            )
+            for query in queries
+        )
     )
-    search_results = await search_tool.abatch(queries)
 
     unique_search_results = {}
     for response in search_results:
@@ -49,19 +170,139 @@ async def web_search_tool(
                     "raw_content": raw_content,
                 }
 
-    summarize_web_tasks = [summarize_web(result["raw_content"]) for result in unique_search_results.values()]
-    summaries = await asyncio.gather(*summarize_web_tasks)
-    for url, summary in zip(unique_search_results.keys(), summaries, strict=True):
-        unique_search_results[url]["summary"] = summary
+    return unique_search_results
+
+
+def get_summary_key(webpage_content: str) -> tuple[str, str]:
+    """Ключ резюме страницы в общем кэше"""
+    return ("summary", hash_content(webpage_content))
+
+
+async def summarize_webpages_cached(webpage_contents: list[str]) -> list[str]:
+    """Суммирует веб-страницы через общий кэш: страницы, которые уже суммировались, не отправляются в LLM
+
+    Args:
+        webpage_contents (list[str]): Содержимое веб-страниц
+
+    Returns:
+        list[str]: Резюме страниц в том же порядке
+    """
+    return await search_cache.aget_many(
+        [get_summary_key(content) for content in webpage_contents],
+        webpage_contents,
+        summarize_webpages,
+    )
+
+
+def format_web_summary(summary: WebSummary) -> str:
+    """Форматирует резюме веб-страницы для исследователя"""
+    return f"<summary>\n{summary.summary}\n</summary>\n\n<key_excerpts>\n{summary.key_excerpts}\n</key_excerpts>"
+
+
+def estimate_tokens(text: str) -> int:
+    """Оценивает количество токенов в тексте без токенизатора модели"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def pack_webpages(webpage_contents: list[str], token_budget: int, max_pages: int) -> list[list[int]]:
+    """Раскладывает страницы по пакетам для суммаризации методом first-fit decreasing
+
+    Страницы перебираются от самой длинной к самой короткой, и каждая кладется в первый пакет,
+    где хватает места по бюджету токенов и количеству страниц. Страница длиннее бюджета попадает в отдельный пакет.
+
+    Args:
+        webpage_contents (list[str]): Содержимое веб-страниц
+        token_budget (int): Бюджет токенов содержимого на один пакет
+        max_pages (int): Максимальное количество страниц в пакете
+
+    Returns:
+        list[list[int]]: Индексы страниц в каждом пакете
+    """
+    batches: list[list[int]] = []
+    batch_tokens: list[int] = []
+    tokens = [estimate_tokens(content) for content in webpage_contents]
+
+    for index in sorted(range(len(webpage_contents)), key=lambda i: tokens[i], reverse=True):
+        for batch_index, batch in enumerate(batches):
+            if len(batch) < max_pages and batch_tokens[batch_index] + tokens[index] <= token_budget:
+                batch.append(index)
+                batch_tokens[batch_index] += tokens[index]
+                break
+        else:
+            batches.append([index])
+            batch_tokens.append(tokens[index])
+
+    return batches
+
+
+async def summarize_webpages(webpage_contents: list[str]) -> list[str]:
+    """Суммирует веб-страницы, объединяя короткие страницы в один вызов LLM
+
+    Каждый вызов занимает место в лимите запросов в минуту, поэтому короткие страницы суммируются пакетами.
+    Пакетная суммаризация отключается при AGENT_SUMMARY_BATCH_TOKENS=0.
+
+    Args:
+        webpage_contents (list[str]): Содержимое веб-страниц
+
+    Returns:
+        list[str]: Резюме страниц в том же порядке
+    """
+    if settings.AGENT.SUMMARY_BATCH_TOKENS <= 0:
+        return list(await asyncio.gather(*(summarize_web(content) for content in webpage_contents)))
+
+    batches = pack_webpages(
+        webpage_contents,
+        settings.AGENT.SUMMARY_BATCH_TOKENS,
+        settings.AGENT.SUMMARY_BATCH_MAX_PAGES,
+    )
+    batch_summaries = await asyncio.gather(
+        *(summarize_web_batch([webpage_contents[index] for index in batch]) for batch in batches)
+    )
 
-    formatted_summary = "Результаты поиска:"
-    for i, (url, result) in enumerate(unique_search_results.items()):
-        formatted_summary += f"\n\nSOURCE {i + 1}: {result['title']}\n"
-        formatted_summary += f"URL: {url}\n"
-        formatted_summary += f"SUMMARY:\n\n{result['summary']}\n\n"
-        formatted_summary += "-" * 100
+    summaries = [""] * len(webpage_contents)
+    for batch, batch_summary in zip(batches, batch_summaries, strict=True):
+        for index, summary in zip(batch, batch_summary, strict=True):
+            summaries[index] = summary
+    return summaries
 
-    return formatted_summary
+
+async def summarize_web_batch(webpage_contents: list[str]) -> list[str]:
+    """Суммирует несколько веб-страниц за один вызов LLM
+
+    Страницы, для которых модель не вернула резюме, а также все страницы пакета при ошибке вызова,
+    суммируются по одной.
+
+    Args:
+        webpage_contents (list[str]): Содержимое веб-страниц
+
+    Returns:
+        list[str]: Резюме страниц в том же порядке
+    """
+    if len(webpage_contents) == 1:
+        return [await summarize_web(webpage_contents[0])]
+
+    webpages = "\n\n".join(
+        f'<webpage id="{page_id}">\n{content}\n</webpage>' for page_id, content in enumerate(webpage_contents, 1)
+    )
+    prompt = SUMMARIZE_WEBPAGES_BATCH_PROMPT.format(webpages=webpages, date=datetime.now().isoformat())
+
+    summaries: dict[int, str] = {}
+    try:
+        structured_llm = get_llm().with_structured_output(WebSummaryBatch)
+        response = await structured_llm.ainvoke([HumanMessage(content=prompt)])
+        for summary in response.summaries:
+            if 1 <= summary.page_id <= len(webpage_contents):
+                summaries.setdefault(summary.page_id - 1, format_web_summary(summary))
+    except Exception:
+        logger.warning(
+            "Не удалось суммировать пакет из %s страниц, страницы суммируются по одной", len(webpage_contents)
+        )
+
+    missing = [index for index in range(len(webpage_contents)) if index not in summaries]
+    fallback_summaries = await asyncio.gather(*(summarize_web(webpage_contents[index]) for index in missing))
+    summaries.update(zip(missing, fallback_summaries, strict=True))
+
+    return [summaries[index] for index in range(len(webpage_contents))]
 
 
 async def summarize_web(webpage_content: str) -> str:
@@ -79,13 +320,10 @@ async def summarize_web(webpage_content: str) -> str:
         date=datetime.now().isoformat(),
     )
 
-    structured_llm = llm.with_structured_output(WebSummary)
+    structured_llm = get_llm().with_structured_output(WebSummary)
     response = await structured_llm.ainvoke([HumanMessage(content=prompt)])
 
-    formatted_summary = (
-        f"<summary>\n{response.summary}\n</summary>\n\n<key_excerpts>\n{response.key_excerpts}\n</key_excerpts>"
-    )
-    return formatted_summary
+    return format_web_summary(response)
 
 
 @tool()
@@ -0,0 +1,127 @@
+"""Учет ресурсов, затраченных на исследование"""
+
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Any, TypedDict
+from uuid import UUID
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.outputs import LLMResult
+
+# Событие, которое узлы графа отправляют, когда результат берется из хранилища вместо повторного выполнения
+CACHE_HIT_EVENT = "cache_hit"
+SEARCH_TOOLS = {"web_search_tool", "local_search_tool"}
+
+# Где выполняется код: путь узла графа или запрос API. Задачи наследуют значение от места создания,
+# поэтому по нему мониторинг цикла событий определяет, кто его заблокировал
+current_activity: ContextVar[str | None] = ContextVar("current_activity", default=None)
+
+
+class ResearchUsage(TypedDict):
+    """Ресурсы, затраченные на исследование"""
+
+    input_tokens: int
+    output_tokens: int
+    llm_calls: int
+    search_calls: int
+    cache_hits: int
+    wall_time: float
+    node_wall_time: dict[str, float]
+
+
+class UsageCallbackHandler(AsyncCallbackHandler):
+    """Собирает токены, вызовы LLM и веб-поиска, попадания в кэш и время работы узлов графа
+
+    Обработчик передается в callbacks конфигурации запуска и наследуется всеми подграфами.
+    Время узлов суммируется по пути узла в графе, например supervisor/supervisor_tools,
+    поэтому время параллельно работающих исследователей складывается.
+
+    Обработчик вызывается в задаче самого узла и записывает путь узла в current_activity.
+    """
+
+    run_inline = True
+
+    def __init__(self) -> None:
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.llm_calls = 0
+        self.search_calls = 0
+        self.cache_hits = 0
+        self.node_wall_time: defaultdict[str, float] = defaultdict(float)
+        self._started_at = time.monotonic()
+        self._node_starts: dict[UUID, tuple[str, float, str | None]] = {}
+
+    async def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        for generations in response.generations:
+            for generation in generations:
+                usage_metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                # LangChain обнуляет стоимость у ответов из кэша модели (например, из кассеты)
+                if usage_metadata.get("total_cost") == 0:
+                    self.cache_hits += 1
+                    continue
+                self.llm_calls += 1
+                self.input_tokens += usage_metadata.get("input_tokens", 0)
+                self.output_tokens += usage_metadata.get("output_tokens", 0)
+
+    async def on_tool_start(
+        self,
+        serialized: dict[str, Any],
+        input_str: str,
+        *,
+        run_id: UUID,
+        inputs: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> None:
+        if (serialized or {}).get("name", kwargs.get("name")) in SEARCH_TOOLS:
+            self.search_calls += len((inputs or {}).get("queries", [])) or 1
+
+    async def on_custom_event(self, name: str, data: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        if name == CACHE_HIT_EVENT:
+            self.cache_hits += 1
+
+    async def on_chain_start(
+        self,
+        serialized: dict[str, Any],
+        inputs: dict[str, Any],
+        *,
+        run_id: UUID,
+        metadata: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> None:
+        metadata = metadata or {}
+        node = metadata.get("langgraph_node")
+        if not node or kwargs.get("name") != node:
+            return
+
+        namespace = metadata.get("langgraph_checkpoint_ns", node)
+        # Части пространства имен вида node:task_id; номера параллельных вызовов подграфа отбрасываются
+        names = [part.split(":")[0] for part in namespace.split("|")]
+        path = "/".join(name for name in names if not name.isdigit())
+        self._node_starts[run_id] = (path, time.monotonic(), current_activity.get())
+        current_activity.set(path)
+
+    async def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish_node(run_id)
+
+    async def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish_node(run_id)
+
+    def _finish_node(self, run_id: UUID) -> None:
+        if started := self._node_starts.pop(run_id, None):
+            path, started_at, previous_activity = started
+            self.node_wall_time[path] += time.monotonic() - started_at
+            # Узел, выполненный в задаче графа, а не в своей, не должен оставить свой путь следующему коду
+            current_activity.set(previous_activity)
+
+    def get_usage(self) -> ResearchUsage:
+        """Ресурсы, затраченные с момента создания обработчика"""
+        return ResearchUsage(
+            input_tokens=self.input_tokens,
+            output_tokens=self.output_tokens,
+            llm_calls=self.llm_calls,
+            search_calls=self.search_calls,
+            cache_hits=self.cache_hits,
+            wall_time=time.monotonic() - self._started_at,
+            node_wall_time={path: round(seconds, 3) for path, seconds in self.node_wall_time.items()},
+        )
@@ -1,7 +1,15 @@
+import time
+from functools import cache
+from typing import TYPE_CHECKING, Any, Literal
+
 from langchain_core.rate_limiters import InMemoryRateLimiter
-from langchain_google_genai import ChatGoogleGenerativeAI
 
 from deep_research.config import settings
+from deep_research.ml.cassette import CassetteLLMCache, CassetteSearchClient, get_cassette
+
+if TYPE_CHECKING:
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    from langchain_tavily import TavilySearch
 
 model_exception_message = """Ошибка при инициализации языковой модели (LLM):
 Убедитесь, что указан верный API ключ в .env файле.
@@ -11,26 +19,67 @@ Gemini модель из Google AI Studio не поддерживается на
 Стабильно работает бесплатный VPN Proxy Master (доступен в AppStore). Может потребоваться множественное переподключение VPN."""
 
 
-def get_llm() -> ChatGoogleGenerativeAI:
+# Вес нового замера в скользящем среднем времени ожидания
+WAIT_SMOOTHING = 0.2
+
+
+class QueueAwareRateLimiter(InMemoryRateLimiter):
+    """Ограничитель частоты запросов, который знает, сколько запросов ждут своей очереди
+    и сколько они в среднем ждут"""
+
+    def __init__(self, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.waiting = 0
+        self.average_wait = 0.0
+
+    @property
+    def estimated_wait(self) -> float:
+        """Сколько секунд будет ждать новый запрос, пока обслуживаются уже ждущие"""
+        return self.waiting / self.requests_per_second
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        self.waiting += 1
+        start = time.monotonic()
+        try:
+            return await super().aacquire(blocking=blocking)
+        finally:
+            self.waiting -= 1
+            self.average_wait += WAIT_SMOOTHING * (time.monotonic() - start - self.average_wait)
+
+
+@cache
+def get_rate_limiter() -> QueueAwareRateLimiter:
+    """Получить общий для всех вызовов LLM ограничитель частоты запросов"""
+    return QueueAwareRateLimiter(
+        requests_per_second=settings.AGENT.RATE_LIMIT_PER_MINUTE / 60,
+        check_every_n_seconds=1,
+        max_bucket_size=1,
+    )
+
+
+@cache
+def get_llm() -> "ChatGoogleGenerativeAI":
     """Получить Gemini модель из Google AI Studio
 
+    Модель создается при первом вызове и переиспользуется во всех узлах графа.
+    Импорт langchain_google_genai тоже откладывается до первого вызова, так как он заметно замедляет старт.
+    Если включена кассета, то ответы модели записываются в нее или воспроизводятся из нее.
+
     Raises:
         Exception: Ошибка при инициализации языковой модели (из-за неверного API или невключенного/неподходящего VPN)
 
     Returns:
         ChatGoogleGenerativeAI: Gemini модель из Google AI Studio
     """
-    rate_limiter = InMemoryRateLimiter(
-        requests_per_second=settings.AGENT.RATE_LIMIT_PER_MINUTE / 60,
-        check_every_n_seconds=1,
-        max_bucket_size=1,
-    )
+    from langchain_google_genai import ChatGoogleGenerativeAI
 
+    cassette = get_cassette()
     try:
         llm = ChatGoogleGenerativeAI(
             model=settings.AGENT.LLM_NAME,
             google_api_key=settings.AGENT.GOOGLE_API_KEY,
-            rate_limiter=rate_limiter,
+            rate_limiter=get_rate_limiter(),
+            cache=CassetteLLMCache(cassette) if cassette else None,
         )
 
         # _ = llm.invoke("Hello!")
@@ -40,5 +89,34 @@ def get_llm() -> ChatGoogleGenerativeAI:
         raise Exception(model_exception_message) from None
 
 
-# Синглтон
-llm = get_llm()
+@cache
+def get_search_client(
+    max_results: int = 5,
+    topic: Literal["general", "news", "finance"] = "general",
+) -> "TavilySearch | CassetteSearchClient":
+    """Получить клиент веб-поиска Tavily
+
+    Клиент создается при первом вызове с данными параметрами и затем переиспользуется.
+    Если включена кассета, то клиент записывает ответы в нее, а в режиме воспроизведения Tavily не используется.
+
+    Args:
+        max_results (int): Максимальное количество результатов
+        topic (Literal["general", "news", "finance"]): Тема поиска
+
+    Returns:
+        TavilySearch | CassetteSearchClient: Клиент веб-поиска
+    """
+    cassette = get_cassette()
+    params = f"{max_results}:{topic}"
+    if cassette and cassette.replay:
+        return CassetteSearchClient(cassette, None, params)
+
+    from langchain_tavily import TavilySearch
+
+    client = TavilySearch(
+        tavily_api_key=settings.AGENT.TAVILY_API_KEY,
+        max_results=max_results,
+        topic=topic,
+        include_raw_content=True,
+    )
+    return CassetteSearchClient(cassette, client, params) if cassette else client
@@ -0,0 +1,18 @@
+import asyncio
+import logging
+
+from deep_research.backend.database import init_db
+from deep_research.backend.loop_monitor import loop_monitor
+from deep_research.backend.service import deep_research_service
+
+
+async def main() -> None:
+    loop_monitor.start()
+    await init_db()
+    deep_research_service.warmup()
+    await deep_research_service.run_worker()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
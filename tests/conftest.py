@@ -0,0 +1,26 @@
+"""Общие настройки тестов
+
+Настройки сервиса читаются из окружения при импорте deep_research.config, поэтому обязательные
+переменные задаются до импорта тестируемых модулей. Значения из окружения и .env имеют приоритет.
+"""
+
+import os
+
+REQUIRED_ENV = {
+    "AGENT_LLM_NAME": "fake",
+    "AGENT_RATE_LIMIT_PER_MINUTE": "600",
+    "AGENT_GOOGLE_API_KEY": "fake",
+    "AGENT_TAVILY_API_KEY": "fake",
+    "DATABASE_NAME": "postgres",
+    "DATABASE_USER": "postgres",
+    "DATABASE_PASSWORD": "postgres",
+    "DATABASE_HOST": "localhost",
+    "API_TITLE": "Deep Research API",
+    "API_DESCRIPTION": "Tests",
+    "API_VERSION": "test",
+    "API_HOST": "127.0.0.1",
+    "API_PORT": "8000",
+}
+
+for key, value in REQUIRED_ENV.items():
+    os.environ.setdefault(key, value)
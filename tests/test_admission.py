@@ -0,0 +1,206 @@
+import asyncio
+from typing import Any
+
+import pytest
+
+from deep_research.backend import admission
+from deep_research.backend.admission import AdmissionController, AdmissionMiddleware, AdmissionRejectedError
+from deep_research.config import settings
+
+
+@pytest.fixture(autouse=True)
+def admission_settings(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings.ADMISSION, "ENABLED", True)
+    monkeypatch.setattr(settings.ADMISSION, "MAX_IN_FLIGHT", 1)
+    monkeypatch.setattr(settings.ADMISSION, "MAX_QUEUED", 4)
+    monkeypatch.setattr(settings.ADMISSION, "QUEUE_TIMEOUT_SECONDS", 1)
+    monkeypatch.setattr(settings.ADMISSION, "MAX_LIMITER_WAIT_SECONDS", 60)
+    monkeypatch.setattr(settings.WORKER, "QUEUE_ENABLED", False)
+
+
+def test_waiters_get_slots_in_arrival_order() -> None:
+    controller = AdmissionController()
+    admitted: list[str] = []
+
+    async def request(name: str) -> None:
+        await controller.acquire(in_request=True)
+        admitted.append(name)
+
+    async def main() -> None:
+        await request("first")
+        tasks = []
+        for name in ("a", "b", "c"):
+            tasks.append(asyncio.create_task(request(name)))
+            await asyncio.sleep(0)
+        assert controller.queued == 3
+
+        for _ in tasks:
+            controller.release(0)
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert admitted == ["first", "a", "b", "c"]
+    assert controller.in_flight == 1
+    assert controller.admitted == 4
+
+
+def test_new_request_does_not_overtake_waiters() -> None:
+    controller = AdmissionController()
+    admitted: list[str] = []
+
+    async def request(name: str) -> None:
+        await controller.acquire(in_request=True)
+        admitted.append(name)
+
+    async def main() -> None:
+        await request("first")
+        waiter = asyncio.create_task(request("waiter"))
+        await asyncio.sleep(0)
+        # Слот передается ждущему напрямую, поэтому пришедший следом запрос встает в очередь
+        controller.release(0)
+        newcomer = asyncio.create_task(request("newcomer"))
+        await asyncio.sleep(0)
+        assert controller.queued == 1
+        controller.release(0)
+        await asyncio.gather(waiter, newcomer)
+
+    asyncio.run(main())
+    assert admitted == ["first", "waiter", "newcomer"]
+
+
+def test_release_without_waiters_frees_slot() -> None:
+    controller = AdmissionController()
+
+    async def main() -> None:
+        await controller.acquire(in_request=True)
+        controller.release(0)
+        await controller.acquire(in_request=True)
+
+    asyncio.run(main())
+    assert controller.in_flight == 1
+    assert controller.queued == 0
+
+
+def test_queue_timeout_rejects_and_leaves_queue(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings.ADMISSION, "QUEUE_TIMEOUT_SECONDS", 0.01)
+    controller = AdmissionController()
+    controller.average_duration = 10
+
+    async def main() -> AdmissionRejectedError:
+        await controller.acquire(in_request=True)
+        with pytest.raises(AdmissionRejectedError) as error:
+            await controller.acquire(in_request=True)
+        return error.value
+
+    error = asyncio.run(main())
+    assert error.reason == "queue_timeout"
+    # Освобождения одного слота ждет один запрос: 10 с на исследование при одном слоте
+    assert error.retry_after == 10
+    assert controller.queued == 0
+    assert controller.in_flight == 1
+    assert controller.rejected == {"queue_timeout": 1}
+
+
+def test_full_queue_rejects_immediately(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings.ADMISSION, "MAX_IN_FLIGHT", 2)
+    monkeypatch.setattr(settings.ADMISSION, "MAX_QUEUED", 1)
+    controller = AdmissionController()
+    controller.average_duration = 3
+
+    async def main() -> AdmissionRejectedError:
+        await controller.acquire(in_request=True)
+        await controller.acquire(in_request=True)
+        waiter = asyncio.create_task(controller.acquire(in_request=True))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejectedError) as error:
+            await controller.acquire(in_request=True)
+        waiter.cancel()
+        return error.value
+
+    error = asyncio.run(main())
+    assert error.reason == "queue_full"
+    # Впереди один ждущий и сам запрос: 3 с * 2 / 2 слота
+    assert error.retry_after == 3
+    assert controller.queued == 0
+
+
+def test_retry_after_is_at_least_one_second(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings.ADMISSION, "MAX_QUEUED", 0)
+    controller = AdmissionController()
+    controller.average_duration = 0.2
+
+    async def main() -> AdmissionRejectedError:
+        await controller.acquire(in_request=True)
+        with pytest.raises(AdmissionRejectedError) as error:
+            await controller.acquire(in_request=True)
+        return error.value
+
+    assert asyncio.run(main()).retry_after == 1
+
+
+def test_cancelled_waiter_does_not_take_slot() -> None:
+    controller = AdmissionController()
+
+    async def main() -> None:
+        await controller.acquire(in_request=True)
+        cancelled = asyncio.create_task(controller.acquire(in_request=True))
+        waiting = asyncio.create_task(controller.acquire(in_request=True))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        assert controller.queued == 1
+
+        controller.release(0)
+        await waiting
+
+    asyncio.run(main())
+    assert controller.in_flight == 1
+    assert controller.queued == 0
+
+
+def test_worker_runs_do_not_take_slots() -> None:
+    controller = AdmissionController()
+
+    async def main() -> None:
+        async with controller.track():
+            assert controller.worker_in_flight == 1
+            await controller.acquire(in_request=True)
+
+    asyncio.run(main())
+    assert controller.worker_in_flight == 0
+    assert controller.in_flight == 1
+
+
+def test_middleware_rejects_with_503_and_retry_after(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings.ADMISSION, "MAX_QUEUED", 0)
+    controller = AdmissionController()
+    controller.average_duration = 42
+    monkeypatch.setattr(admission, "admission_controller", controller)
+    calls: list[str] = []
+
+    async def app(scope: dict[str, Any], receive: Any, send: Any) -> None:
+        calls.append(scope["path"])
+
+    async def receive() -> dict[str, Any]:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def request(path: str) -> list[dict[str, Any]]:
+        messages: list[dict[str, Any]] = []
+
+        async def send(message: dict[str, Any]) -> None:
+            messages.append(message)
+
+        scope = {"type": "http", "method": "POST", "path": path, "headers": []}
+        await AdmissionMiddleware(app)(scope, receive, send)
+        return messages
+
+    async def main() -> list[dict[str, Any]]:
+        await controller.acquire(in_request=True)
+        assert await request("/research/export") == []
+        return await request("/research")
+
+    start, _ = asyncio.run(main())
+    assert calls == ["/research/export"]
+    assert start["status"] == 503
+    assert (b"retry-after", b"42") in start["headers"]
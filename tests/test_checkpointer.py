@@ -0,0 +1,241 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from typing import Any
+
+import pytest
+from langchain_core.messages import HumanMessage, ToolCall
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from langgraph.checkpoint.base import Checkpoint, CheckpointTuple, empty_checkpoint
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from deep_research.backend.checkpointer import (
+    INTERNED_CHANNEL,
+    SQLAlchemyCheckpointSaver,
+    SQLAlchemyResearchResultStore,
+)
+from deep_research.backend.models import Base, CheckpointBlob
+from deep_research.ml import ResearchResult, supervisor_subgraph
+from deep_research.ml.supervisor_subgraph import get_supervisor_tool_executor
+
+LONG_TEXT = "Результаты поиска. " * 100
+
+SessionMaker = async_sessionmaker[AsyncSession]
+
+
+def run_with_db(path: Path, scenario: Callable[[SessionMaker], Awaitable[Any]]) -> Any:
+    """Выполняет сценарий с базой SQLite, в которой созданы таблицы сервиса"""
+
+    async def main() -> Any:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path / 'checkpoints.db'}")
+        try:
+            async with engine.begin() as connection:
+                await connection.run_sync(Base.metadata.create_all)
+            return await scenario(async_sessionmaker(engine, expire_on_commit=False))
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(main())
+
+
+def build_checkpoint(values: dict[str, Any], versions: dict[str, str]) -> Checkpoint:
+    checkpoint = empty_checkpoint()
+    checkpoint["channel_values"] = values
+    checkpoint["channel_versions"] = versions
+    return checkpoint
+
+
+def thread_config(thread_id: str = "1") -> RunnableConfig:
+    return {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+
+
+async def put(
+    saver: SQLAlchemyCheckpointSaver,
+    config: RunnableConfig,
+    values: dict[str, Any],
+    versions: dict[str, str],
+    new_versions: dict[str, str],
+    step: int,
+) -> RunnableConfig:
+    checkpoint = build_checkpoint(values, versions)
+    return await saver.aput(config, checkpoint, {"source": "loop", "step": step}, new_versions)
+
+
+def test_put_and_get_tuple_round_trip(tmp_path: Path) -> None:
+    values = {"messages": [HumanMessage(content=LONG_TEXT, id="m1")], "count": 1}
+    versions = {"messages": "1", "count": "1"}
+
+    async def scenario(session_maker: SessionMaker) -> tuple[RunnableConfig, CheckpointTuple | None]:
+        saver = SQLAlchemyCheckpointSaver(session_maker)
+        saved = await put(saver, thread_config(), values, versions, versions, step=0)
+        # Новый чекпоинтер читает вынесенные строки из БД, а не из кэша того, что их записал
+        return saved, await SQLAlchemyCheckpointSaver(session_maker).aget_tuple(thread_config())
+
+    saved, loaded = run_with_db(tmp_path, scenario)
+
+    assert loaded is not None
+    assert loaded.config["configurable"]["checkpoint_id"] == saved["configurable"]["checkpoint_id"]
+    assert loaded.checkpoint["channel_values"] == values
+    assert loaded.checkpoint["channel_versions"] == versions
+    assert loaded.metadata["step"] == 0
+    assert loaded.parent_config is None
+    assert loaded.pending_writes == []
+
+
+def test_unchanged_channels_are_read_from_earlier_versions(tmp_path: Path) -> None:
+    async def scenario(session_maker: SessionMaker) -> tuple[RunnableConfig, CheckpointTuple | None, list[str]]:
+        saver = SQLAlchemyCheckpointSaver(session_maker)
+        first = await put(
+            saver,
+            thread_config(),
+            {"messages": [LONG_TEXT], "count": 1},
+            {"messages": "1", "count": "1"},
+            {"messages": "1", "count": "1"},
+            step=0,
+        )
+        await put(
+            saver,
+            first,
+            {"messages": [LONG_TEXT], "count": 2},
+            {"messages": "1", "count": "2"},
+            {"count": "2"},
+            step=1,
+        )
+        async with session_maker() as db:
+            result = await db.execute(select(CheckpointBlob.channel).order_by(CheckpointBlob.channel))
+            channels = list(result.scalars())
+        return first, await saver.aget_tuple(thread_config()), channels
+
+    first, loaded, channels = run_with_db(tmp_path, scenario)
+
+    assert loaded is not None
+    assert loaded.checkpoint["channel_values"] == {"messages": [LONG_TEXT], "count": 2}
+    assert loaded.parent_config["configurable"]["checkpoint_id"] == first["configurable"]["checkpoint_id"]
+    # Длинная строка хранится один раз, а неизменный канал не переписывается
+    assert channels == [INTERNED_CHANNEL, "count", "count", "messages"]
+
+
+def test_put_writes_keeps_regular_writes_and_replaces_errors(tmp_path: Path) -> None:
+    async def scenario(session_maker: SessionMaker) -> CheckpointTuple | None:
+        saver = SQLAlchemyCheckpointSaver(session_maker)
+        config = await put(saver, thread_config(), {}, {}, {}, step=0)
+        await saver.aput_writes(config, [("messages", LONG_TEXT), ("count", 1)], task_id="task")
+        await saver.aput_writes(config, [("messages", "повтор"), ("count", 2)], task_id="task")
+        await saver.aput_writes(config, [("__error__", "first")], task_id="failed")
+        await saver.aput_writes(config, [("__error__", "second")], task_id="failed")
+        return await SQLAlchemyCheckpointSaver(session_maker).aget_tuple(config)
+
+    loaded = run_with_db(tmp_path, scenario)
+
+    assert loaded is not None
+    assert loaded.pending_writes == [
+        ("failed", "__error__", "second"),
+        ("task", "messages", LONG_TEXT),
+        ("task", "count", 1),
+    ]
+
+
+def test_list_filters_and_limits_newest_first(tmp_path: Path) -> None:
+    async def scenario(session_maker: SessionMaker) -> dict[str, list[int]]:
+        saver = SQLAlchemyCheckpointSaver(session_maker)
+        config = thread_config()
+        configs = []
+        for step in range(3):
+            config = await put(saver, config, {"count": step}, {"count": str(step)}, {"count": str(step)}, step)
+            configs.append(config)
+        await put(saver, thread_config("2"), {}, {}, {}, step=0)
+
+        async def steps(config: RunnableConfig | None, **kwargs: Any) -> list[int]:
+            return [item.metadata["step"] async for item in saver.alist(config, **kwargs)]
+
+        return {
+            "all": await steps(thread_config()),
+            "limit": await steps(thread_config(), limit=2),
+            "before": await steps(thread_config(), before=configs[2]),
+            "filter": await steps(thread_config(), filter={"step": 1}),
+            "any_thread": await steps(None),
+        }
+
+    steps = run_with_db(tmp_path, scenario)
+
+    assert steps == {
+        "all": [2, 1, 0],
+        "limit": [2, 1],
+        "before": [1, 0],
+        "filter": [1],
+        "any_thread": [0, 2, 1, 0],
+    }
+
+
+def test_delete_thread_keeps_other_threads(tmp_path: Path) -> None:
+    async def scenario(session_maker: SessionMaker) -> tuple[CheckpointTuple | None, CheckpointTuple | None]:
+        saver = SQLAlchemyCheckpointSaver(session_maker)
+        for thread_id in ("1", "2"):
+            config = await put(saver, thread_config(thread_id), {"text": LONG_TEXT}, {"text": "1"}, {"text": "1"}, 0)
+            await saver.aput_writes(config, [("text", LONG_TEXT)], task_id="task")
+        await saver.adelete_thread("1")
+        return await saver.aget_tuple(thread_config("1")), await saver.aget_tuple(thread_config("2"))
+
+    deleted, kept = run_with_db(tmp_path, scenario)
+
+    assert deleted is None
+    assert kept is not None
+    assert kept.checkpoint["channel_values"] == {"text": LONG_TEXT}
+    assert kept.pending_writes == [("task", "text", LONG_TEXT)]
+
+
+def test_result_store_round_trip(tmp_path: Path) -> None:
+    result = ResearchResult(compressed_research="сжатое", raw_notes=["заметка 1", "заметка 2"])
+
+    async def scenario(session_maker: SessionMaker) -> list[ResearchResult | None]:
+        store = SQLAlchemyResearchResultStore(session_maker)
+        await store.aput("1", "call-1", result)
+        await store.aput("2", "call-1", result)
+        loaded = [await store.aget("1", "call-1"), await store.aget("1", "call-2")]
+        await store.adelete_thread("1")
+        return [*loaded, await store.aget("1", "call-1"), await store.aget("2", "call-1")]
+
+    assert run_with_db(tmp_path, scenario) == [result, None, None, result]
+
+
+class FakeResearcher:
+    """Исследователь, который падает на темах из failing"""
+
+    def __init__(self) -> None:
+        self.topics: list[str] = []
+        self.failing: set[str] = set()
+
+    async def ainvoke(self, input: dict[str, Any]) -> dict[str, Any]:
+        topic = input["researcher_messages"][0].content
+        self.topics.append(topic)
+        if topic in self.failing:
+            raise RuntimeError(f"researcher failed: {topic}")
+        return {"compressed_research": f"итог: {topic}", "raw_notes": [f"заметки: {topic}"]}
+
+
+def test_resume_reuses_completed_researchers(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    researcher = FakeResearcher()
+    researcher.failing.add("b")
+    monkeypatch.setattr(supervisor_subgraph, "get_researcher_subgraph", lambda: researcher)
+    calls = [
+        ToolCall(name="conduct_research_tool", args={"research_topic": topic}, id=f"call-{topic}")
+        for topic in ("a", "b", "c")
+    ]
+
+    async def scenario(session_maker: SessionMaker) -> list[str]:
+        store = SQLAlchemyResearchResultStore(session_maker)
+        config = {"configurable": {"thread_id": "1", "research_result_store": store}}
+        # Событие о попадании в хранилище отправляется из запуска, поэтому исполнитель вызывается внутри Runnable
+        execute = RunnableLambda(get_supervisor_tool_executor().aexecute)
+
+        with pytest.raises(RuntimeError, match="researcher failed: b"):
+            await execute.ainvoke(calls, config)
+        researcher.failing.clear()
+        messages = await execute.ainvoke(calls, config)
+        return [message.content for message in messages]
+
+    contents = run_with_db(tmp_path, scenario)
+
+    assert contents == ["итог: a", "итог: b", "итог: c"]
+    assert sorted(researcher.topics) == ["a", "b", "b", "c"]
@@ -0,0 +1,117 @@
+import math
+from pathlib import Path
+
+import pytest
+
+from deep_research.ml import local_index
+from deep_research.ml.local_index import K1, B, LocalSearchIndex, tokenize
+
+
+@pytest.fixture
+def docs_path(tmp_path: Path) -> Path:
+    path = tmp_path / "docs"
+    (path / "sub").mkdir(parents=True)
+    (path / "vacation.md").write_text("# Отпуск\nОтпуск сотрудников длится 28 дней. Отпуск оплачивается.")
+    (path / "deploy.txt").write_text("Деплой: сборка, тесты и выкладка в kubernetes.")
+    (path / "sub" / "platform.md").write_text("Kubernetes обслуживает команда платформы. Про отпуск тут одно слово.")
+    (path / "image.bin").write_text("отпуск отпуск отпуск")
+    return path
+
+
+def build_index(docs_path: Path, index_path: Path) -> LocalSearchIndex:
+    index = LocalSearchIndex(docs_path, index_path, [".md", ".txt"], refresh_interval=60)
+    index.refresh(force=True)
+    return index
+
+
+def get_scores(index: LocalSearchIndex, query: str) -> dict[str, float]:
+    return {hit["path"]: hit["score"] for hit in index.search(query, 100)}
+
+
+def test_tokenize_truncates_words_and_drops_single_letters() -> None:
+    assert tokenize("Отпуска сотрудникам и в Kubernetes") == ["отпуск", "сотруд", "kubern"]
+
+
+def test_bm25_scores(docs_path: Path, tmp_path: Path) -> None:
+    index = build_index(docs_path, tmp_path / "index")
+
+    scores = get_scores(index, "отпуск")
+
+    lengths = {
+        path: len(tokenize((docs_path / path).read_text())) for path in ("vacation.md", "deploy.txt", "sub/platform.md")
+    }
+    average_length = sum(lengths.values()) / len(lengths)
+    idf = math.log(1 + (3 - 2 + 0.5) / (2 + 0.5))
+
+    def bm25(frequency: int, length: int) -> float:
+        return idf * frequency * (K1 + 1) / (frequency + K1 * (1 - B + B * length / average_length))
+
+    assert list(scores) == ["vacation.md", "sub/platform.md"]
+    assert scores["vacation.md"] == pytest.approx(bm25(3, lengths["vacation.md"]))
+    assert scores["sub/platform.md"] == pytest.approx(bm25(1, lengths["sub/platform.md"]))
+
+
+def test_search_sums_terms_and_respects_limit(docs_path: Path, tmp_path: Path) -> None:
+    index = build_index(docs_path, tmp_path / "index")
+
+    hits = index.search("kubernetes платформы", 1)
+
+    assert [hit["path"] for hit in hits] == ["sub/platform.md"]
+    assert hits[0]["title"] == "Kubernetes обслуживает команда платформы. Про отпуск тут одно слово."
+    assert index.search("несуществующее", 5) == []
+
+
+def test_refresh_reads_only_changes(docs_path: Path, tmp_path: Path) -> None:
+    index = build_index(docs_path, tmp_path / "index")
+
+    assert not index.refresh(force=True)
+
+    (docs_path / "deploy.txt").write_text("Релиз больше не использует kubernetes, зато упоминает отпуск.")
+    (docs_path / "sub" / "platform.md").unlink()
+
+    assert index.refresh(force=True)
+    assert list(get_scores(index, "kubernetes")) == ["deploy.txt"]
+    assert set(get_scores(index, "отпуск")) == {"vacation.md", "deploy.txt"}
+
+
+def test_refresh_interval(docs_path: Path, tmp_path: Path) -> None:
+    index = build_index(docs_path, tmp_path / "index")
+    (docs_path / "new.md").write_text("Новый документ про отпуск")
+
+    assert not index.refresh()
+    assert index.refresh(force=True)
+
+
+def test_index_is_shared_between_instances(docs_path: Path, tmp_path: Path) -> None:
+    index = build_index(docs_path, tmp_path / "index")
+    other = LocalSearchIndex(docs_path, tmp_path / "index", [".md", ".txt"], refresh_interval=60)
+
+    assert not other.refresh()
+    assert get_scores(other, "отпуск") == get_scores(index, "отпуск")
+
+
+def test_merged_segments_match_full_rebuild(docs_path: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(local_index, "MAX_SEGMENTS", 2)
+    index = build_index(docs_path, tmp_path / "index")
+    for step in range(5):
+        (docs_path / f"note{step}.md").write_text(f"Заметка {step}: отпуск и kubernetes " + "релиз " * step)
+        (docs_path / "deploy.txt").write_text("Деплой " * (step + 1) + "kubernetes")
+        index.refresh(force=True)
+
+    segments = {path.name.split(".")[0] for path in (tmp_path / "index").glob("segment-*")}
+    assert len(segments) <= 2
+
+    rebuilt = build_index(docs_path, tmp_path / "rebuilt")
+    for query in ("отпуск", "kubernetes релиз", "деплой"):
+        assert get_scores(index, query) == pytest.approx(get_scores(rebuilt, query))
+
+
+def test_get_result(docs_path: Path, tmp_path: Path) -> None:
+    index = build_index(docs_path, tmp_path / "index")
+    hit = index.search("сборка", 1)[0]
+
+    result = index.get_result(hit)
+
+    assert result["url"] == (docs_path / "deploy.txt").resolve().as_uri()
+    assert result["raw_content"] == (docs_path / "deploy.txt").read_text()
+    assert result["score"] == hit["score"]
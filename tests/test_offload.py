@@ -0,0 +1,40 @@
+import json
+
+import pytest
+
+from deep_research.ml.offload import dumps_json, loads_json
+
+VALUES = [
+    [],
+    [1],
+    [{"role": "user", "content": 'Привет, "мир"\n'}, [1, 2.5, None, True], "строка с ] и ,"],
+    {"messages": [1, 2]},
+    "строка",
+    42,
+    None,
+]
+
+
+@pytest.mark.parametrize("value", VALUES)
+def test_loads_json_matches_json_loads(value: object) -> None:
+    text = json.dumps(value, ensure_ascii=False)
+
+    assert loads_json(text) == json.loads(text)
+
+
+@pytest.mark.parametrize("text", ["  [ 1 ,\n 2 ]  ", "[\t]", "\n[{}, []]\n"])
+def test_loads_json_allows_whitespace(text: str) -> None:
+    assert loads_json(text) == json.loads(text)
+
+
+@pytest.mark.parametrize("text", ["[1 2]", "[1,]", "[1] x", "[1", "[", "[,1]"])
+def test_loads_json_rejects_invalid_lists(text: str) -> None:
+    with pytest.raises(json.JSONDecodeError):
+        json.loads(text)
+    with pytest.raises(json.JSONDecodeError):
+        loads_json(text)
+
+
+@pytest.mark.parametrize("value", VALUES)
+def test_dumps_json_matches_json_dumps(value: object) -> None:
+    assert dumps_json(value) == json.dumps(value)
@@ -0,0 +1,81 @@
+import pytest
+from langchain_core.messages import ToolCall
+
+from deep_research.config import settings
+from deep_research.ml.planner import DEFERRED_MESSAGE, plan_research, research_load
+from deep_research.ml.utils import get_rate_limiter
+
+
+def build_call(call_id: str, topic: str) -> ToolCall:
+    return ToolCall(name="conduct_research_tool", args={"research_topic": topic}, id=call_id)
+
+
+@pytest.fixture(autouse=True)
+def limits(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings.AGENT, "MAX_PARALLEL_RESEARCHERS", 3)
+    monkeypatch.setattr(settings.AGENT, "MAX_ACTIVE_RESEARCHERS", 10)
+    monkeypatch.setattr(settings.AGENT, "TOPIC_SIMILARITY_THRESHOLD", 0.5)
+    monkeypatch.setattr(research_load, "active", 0)
+    monkeypatch.setattr(get_rate_limiter(), "waiting", 0)
+
+
+def test_similar_topics_are_merged_into_first_call() -> None:
+    calls = [
+        build_call("a", "Рынок электромобилей в Европе"),
+        build_call("b", "Рынок электромобилей Европы"),
+        build_call("c", "История шахмат"),
+    ]
+
+    plan = plan_research(calls)
+
+    assert [call["id"] for call in plan["calls"]] == ["a", "c"]
+    assert plan["calls"][0]["args"]["research_topic"] == (
+        "Рынок электромобилей в Европе\n\nТакже учти: Рынок электромобилей Европы"
+    )
+    assert [message.tool_call_id for message in plan["skipped_messages"]] == ["b"]
+    assert "a" in plan["skipped_messages"][0].content
+
+
+def test_merge_does_not_modify_original_calls() -> None:
+    calls = [build_call("a", "Рынок электромобилей в Европе"), build_call("b", "Рынок электромобилей Европы")]
+
+    plan_research(calls)
+
+    assert calls[0]["args"]["research_topic"] == "Рынок электромобилей в Европе"
+
+
+def test_calls_over_parallel_limit_are_deferred_in_order() -> None:
+    calls = [build_call(str(i), topic) for i, topic in enumerate(["Шахматы", "Ботаника", "Астрономия", "Геология"])]
+
+    plan = plan_research(calls)
+
+    assert [call["id"] for call in plan["calls"]] == ["0", "1", "2"]
+    assert [(message.tool_call_id, message.content) for message in plan["skipped_messages"]] == [
+        ("3", DEFERRED_MESSAGE)
+    ]
+
+
+def test_headroom_counts_active_researchers_and_waiting_requests(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(research_load, "active", 7)
+    monkeypatch.setattr(get_rate_limiter(), "waiting", 2)
+    calls = [build_call(str(i), topic) for i, topic in enumerate(["Шахматы", "Ботаника", "Астрономия"])]
+
+    plan = plan_research(calls)
+
+    assert [call["id"] for call in plan["calls"]] == ["0"]
+    assert [message.tool_call_id for message in plan["skipped_messages"]] == ["1", "2"]
+
+
+def test_at_least_one_researcher_runs_without_headroom(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(research_load, "active", 50)
+
+    plan = plan_research([build_call("a", "Шахматы"), build_call("b", "Ботаника")])
+
+    assert [call["id"] for call in plan["calls"]] == ["a"]
+    assert research_load.get_headroom(3) == 1
+
+
+def test_track_counts_active_researchers() -> None:
+    with research_load.track():
+        assert research_load.active == 1
+    assert research_load.active == 0
@@ -0,0 +1,27 @@
+from deep_research.backend.router import build_etag, etag_matches
+
+
+def test_etag_matches_current_version() -> None:
+    etag = build_etag(7, 3)
+
+    assert etag == '"7-3"'
+    assert etag_matches('"7-3"', etag)
+
+
+def test_etag_does_not_match_other_version() -> None:
+    assert not etag_matches('"7-2"', build_etag(7, 3))
+    assert not etag_matches('"8-3"', build_etag(7, 3))
+
+
+def test_etag_matches_without_header() -> None:
+    assert not etag_matches(None, build_etag(7, 3))
+    assert not etag_matches("", build_etag(7, 3))
+
+
+def test_etag_matches_list_weak_and_wildcard() -> None:
+    etag = build_etag(7, 3)
+
+    assert etag_matches('"1-1", "7-3"', etag)
+    assert etag_matches('W/"7-3"', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"1-1", W/"7-2"', etag)
@@ -0,0 +1,145 @@
+import asyncio
+from collections.abc import Callable, Coroutine
+from typing import Any
+
+import pytest
+
+from deep_research.ml import search_cache as search_cache_module
+from deep_research.ml.search_cache import SearchCache
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(search_cache_module, "time", clock)
+    return clock
+
+
+def counting(calls: list[str], key: str, delay: float = 0) -> Callable[[], Coroutine[Any, Any, str]]:
+    async def compute() -> str:
+        calls.append(key)
+        await asyncio.sleep(delay)
+        return f"value {key}"
+
+    return compute
+
+
+def test_value_is_computed_once(clock: FakeClock) -> None:
+    cache = SearchCache(max_size=10, ttl=60)
+    calls: list[str] = []
+
+    async def main() -> list[str]:
+        return [await cache.aget("a", counting(calls, "a")) for _ in range(3)]
+
+    assert asyncio.run(main()) == ["value a"] * 3
+    assert calls == ["a"]
+
+
+def test_concurrent_callers_share_computation(clock: FakeClock) -> None:
+    cache = SearchCache(max_size=10, ttl=60)
+    calls: list[str] = []
+
+    async def main() -> list[str]:
+        return await asyncio.gather(*(cache.aget("a", counting(calls, "a", delay=0.01)) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["value a"] * 5
+    assert calls == ["a"]
+
+
+def test_expired_value_is_recomputed(clock: FakeClock) -> None:
+    cache = SearchCache(max_size=10, ttl=60)
+    calls: list[str] = []
+
+    async def main() -> None:
+        await cache.aget("a", counting(calls, "a"))
+        clock.now = 59
+        await cache.aget("a", counting(calls, "a"))
+        clock.now = 61
+        await cache.aget("a", counting(calls, "a"))
+
+    asyncio.run(main())
+    assert calls == ["a", "a"]
+
+
+def test_least_recently_used_value_is_evicted(clock: FakeClock) -> None:
+    cache = SearchCache(max_size=2, ttl=60)
+    calls: list[str] = []
+
+    async def main() -> None:
+        await cache.aget("a", counting(calls, "a"))
+        await cache.aget("b", counting(calls, "b"))
+        await cache.aget("a", counting(calls, "a"))
+        await cache.aget("c", counting(calls, "c"))
+        await cache.aget("a", counting(calls, "a"))
+        await cache.aget("b", counting(calls, "b"))
+
+    asyncio.run(main())
+    assert calls == ["a", "b", "c", "b"]
+
+
+def test_zero_size_disables_cache(clock: FakeClock) -> None:
+    cache = SearchCache(max_size=0, ttl=60)
+    calls: list[str] = []
+
+    async def main() -> None:
+        await cache.aget("a", counting(calls, "a"))
+        await cache.aget("a", counting(calls, "a"))
+
+    asyncio.run(main())
+    assert calls == ["a", "a"]
+
+
+def test_failed_computation_is_not_cached(clock: FakeClock) -> None:
+    cache = SearchCache(max_size=10, ttl=60)
+    calls: list[str] = []
+
+    async def fail() -> str:
+        calls.append("fail")
+        raise RuntimeError("search failed")
+
+    async def main() -> str:
+        with pytest.raises(RuntimeError):
+            await cache.aget("a", fail)
+        return await cache.aget("a", counting(calls, "a"))
+
+    assert asyncio.run(main()) == "value a"
+    assert calls == ["fail", "a"]
+
+
+def test_cancelled_caller_does_not_cancel_computation(clock: FakeClock) -> None:
+    cache = SearchCache(max_size=10, ttl=60)
+    calls: list[str] = []
+
+    async def main() -> str:
+        first = asyncio.create_task(cache.aget("a", counting(calls, "a", delay=0.02)))
+        await asyncio.sleep(0.005)
+        first.cancel()
+        return await cache.aget("a", counting(calls, "a"))
+
+    assert asyncio.run(main()) == "value a"
+    assert calls == ["a"]
+
+
+def test_get_many_computes_missing_values_in_one_call(clock: FakeClock) -> None:
+    cache = SearchCache(max_size=10, ttl=60)
+    batches: list[list[str]] = []
+
+    async def compute(values: list[str]) -> list[str]:
+        batches.append(values)
+        return [value.upper() for value in values]
+
+    async def main() -> tuple[list[str], list[str]]:
+        first = await cache.aget_many(["a", "b", "a"], ["x", "y", "x"], compute)
+        second = await cache.aget_many(["b", "c"], ["y", "z"], compute)
+        return first, second
+
+    assert asyncio.run(main()) == (["X", "Y", "X"], ["Y", "Z"])
+    assert batches == [["x", "y"], ["z"]]
@@ -0,0 +1,97 @@
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from deep_research.backend.serde import COMPRESSED_TYPE, INTERNED_PREFIX, CompactSerializer
+
+LONG_TEXT = "Результаты поиска. " * 100
+OTHER_TEXT = "Сжатое исследование. " * 100
+
+
+def build_state() -> dict:
+    return {
+        "messages": [
+            HumanMessage(content="Короткий вопрос"),
+            AIMessage(content="", tool_calls=[{"name": "search", "args": {"query": "q"}, "id": "call-1"}]),
+            ToolMessage(content=LONG_TEXT, name="search", tool_call_id="call-1"),
+        ],
+        "raw_notes": [LONG_TEXT, OTHER_TEXT, "короткая заметка"],
+        "brief": {"topic": OTHER_TEXT, "researchers": 1},
+        "count": 3,
+    }
+
+
+def round_trip(writer: CompactSerializer, reader: CompactSerializer, value: object) -> object:
+    """Записывает значение, как чекпоинтер, сериализатором writer и читает его сериализатором reader"""
+    interned_value, strings = writer.intern(value)
+    blob = writer.dumps_typed(interned_value)
+    stored = {key: writer.dumps_interned(string)[1] for key, string in strings.items()}
+
+    loaded = reader.loads_typed(blob)
+    keys = reader.find_interned(loaded)
+    assert keys == set(stored)
+    restored = reader.get_cached(keys)
+    restored.update({key: reader.loads_interned(key, stored[key]) for key in keys - restored.keys()})
+    return reader.restore(loaded, restored)
+
+
+def test_intern_replaces_only_long_strings() -> None:
+    serde = CompactSerializer(min_interned_length=1024)
+
+    value, strings = serde.intern(build_state())
+
+    assert set(strings.values()) == {LONG_TEXT, OTHER_TEXT}
+    assert value["messages"][0].content == "Короткий вопрос"
+    assert value["messages"][2].content.startswith(INTERNED_PREFIX)
+    assert value["raw_notes"][0] == value["messages"][2].content
+    assert value["raw_notes"][2] == "короткая заметка"
+    assert value["brief"]["topic"].startswith(INTERNED_PREFIX)
+
+
+def test_intern_and_restore_tuples() -> None:
+    serde = CompactSerializer()
+
+    value, strings = serde.intern((LONG_TEXT, 1))
+
+    assert value[0].startswith(INTERNED_PREFIX)
+    assert serde.restore(value, strings) == (LONG_TEXT, 1)
+
+
+def test_intern_does_not_modify_original() -> None:
+    state = build_state()
+
+    CompactSerializer().intern(state)
+
+    assert state == build_state()
+
+
+def test_round_trip_with_cold_cache() -> None:
+    state = build_state()
+
+    restored = round_trip(CompactSerializer(), CompactSerializer(), state)
+
+    assert restored == state
+    assert restored["raw_notes"][0] is restored["messages"][2].content
+
+
+def test_round_trip_with_warm_cache() -> None:
+    serde = CompactSerializer()
+
+    assert round_trip(serde, serde, build_state()) == build_state()
+
+
+def test_cache_evicts_least_recently_used() -> None:
+    serde = CompactSerializer(min_interned_length=10, cache_size=2)
+    _, strings = serde.intern(["a" * 10, "b" * 10, "c" * 10])
+
+    assert len(serde.get_cached(set(strings))) == 2
+
+
+def test_compressed_type_and_legacy_data() -> None:
+    serde = CompactSerializer()
+
+    type_, data = serde.dumps_typed({"count": 3})
+    legacy = JsonPlusSerializer().dumps_typed({"count": 3})
+
+    assert type_ == COMPRESSED_TYPE
+    assert serde.loads_typed((type_, data)) == {"count": 3}
+    assert serde.loads_typed(legacy) == {"count": 3}
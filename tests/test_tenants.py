@@ -0,0 +1,117 @@
+import asyncio
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from deep_research.backend.models import Base, ResearchSession, ResearchStatus
+from deep_research.backend.tenants import QuotaExceededError, check_tenant_quota, is_over_limit, schedule_fair
+from deep_research.config import TenantConfig, settings
+
+
+@pytest.fixture(autouse=True)
+def tenant_settings(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings.TENANT, "MAX_CONCURRENT", 0)
+    monkeypatch.setattr(settings.TENANT, "WEIGHTS", {})
+
+
+def test_equal_tenants_alternate() -> None:
+    candidates = {"a": [1, 2, 3], "b": [4, 5, 6]}
+
+    assert schedule_fair(candidates, {}, 4) == [1, 4, 2, 5]
+
+
+def test_running_sessions_count_against_tenant() -> None:
+    candidates = {"a": [1, 2, 3], "b": [4, 5, 6]}
+
+    assert schedule_fair(candidates, {"a": 2}, 4) == [4, 5, 1, 6]
+
+
+def test_ties_go_to_oldest_session() -> None:
+    candidates = {"a": [7, 8], "b": [3, 9]}
+
+    assert schedule_fair(candidates, {}, 2) == [3, 7]
+
+
+def test_weight_gives_larger_share(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings.TENANT, "WEIGHTS", {"a": 2.0})
+    candidates = {"a": [1, 2, 3, 4], "b": [5, 6, 7, 8]}
+
+    scheduled = schedule_fair(candidates, {}, 6)
+
+    assert scheduled == [1, 5, 2, 3, 6, 4]
+    assert len(set(scheduled) & {1, 2, 3, 4}) == 4
+
+
+def test_max_concurrent_skips_tenant_at_limit(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings.TENANT, "MAX_CONCURRENT", 2)
+    candidates = {"a": [1, 2, 3], "b": [4, 5, 6]}
+
+    assert schedule_fair(candidates, {"a": 1}, 10) == [4, 1, 5]
+
+
+def test_zero_max_concurrent_is_unlimited() -> None:
+    assert schedule_fair({"a": [1, 2, 3]}, {"a": 100}, 10) == [1, 2, 3]
+    assert not is_over_limit(100, 0)
+    assert is_over_limit(2, 2)
+
+
+def test_inputs_are_not_modified() -> None:
+    candidates = {"a": [1, 2]}
+    running = {"a": 1}
+
+    schedule_fair(candidates, running, 10)
+
+    assert candidates == {"a": [1, 2]}
+    assert running == {"a": 1}
+
+
+def build_session(tenant_id: str, lease_seconds: float) -> ResearchSession:
+    return ResearchSession(
+        status=ResearchStatus.IN_PROGRESS,
+        messages="[]",
+        tenant_id=tenant_id,
+        lease_owner="worker",
+        lease_expires_at=datetime.now(UTC) + timedelta(seconds=lease_seconds),
+    )
+
+
+def check_quota(path: Path, sessions: list[ResearchSession], tenant_id: str) -> None:
+    """Проверяет квоту тенанта в SQLite, где уже есть переданные сессии"""
+
+    async def main() -> None:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path / 'tenants.db'}")
+        try:
+            async with engine.begin() as connection:
+                await connection.run_sync(Base.metadata.create_all)
+            async with async_sessionmaker(engine)() as db:
+                db.add_all(sessions)
+                await db.commit()
+                await check_tenant_quota(db, tenant_id)
+        finally:
+            await engine.dispose()
+
+    asyncio.run(main())
+
+
+def test_default_max_concurrent_is_limited() -> None:
+    assert TenantConfig().MAX_CONCURRENT > 0
+
+
+def test_max_concurrent_applies_without_queue(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    monkeypatch.setattr(settings.WORKER, "QUEUE_ENABLED", False)
+    monkeypatch.setattr(settings.TENANT, "MAX_CONCURRENT", 2)
+    sessions = [build_session("a", 60), build_session("a", 60), build_session("b", 60)]
+
+    with pytest.raises(QuotaExceededError) as error:
+        check_quota(tmp_path, sessions, "a")
+
+    assert error.value.retry_after == settings.TENANT.RETRY_AFTER_SECONDS
+
+
+def test_expired_leases_do_not_count_against_max_concurrent(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    monkeypatch.setattr(settings.WORKER, "QUEUE_ENABLED", False)
+    monkeypatch.setattr(settings.TENANT, "MAX_CONCURRENT", 2)
+
+    check_quota(tmp_path, [build_session("a", 60), build_session("a", -60), build_session("b", 60)], "a")
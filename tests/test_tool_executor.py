@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import ToolCall, ToolMessage
+from langchain_core.runnables import RunnableConfig
+
+from deep_research.config import settings
+from deep_research.ml.tool_executor import ToolExecutor, ToolHandler
+
+
+@pytest.fixture(autouse=True)
+def tool_settings(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings.TOOLS, "CONCURRENCY", {})
+    monkeypatch.setattr(settings.TOOLS, "TIMEOUTS", {})
+
+
+def build_call(name: str, call_id: str, delay: float = 0) -> ToolCall:
+    return ToolCall(name=name, args={"delay": delay}, id=call_id)
+
+
+def build_handler(events: list[str] | None = None) -> ToolHandler:
+    async def handle(tool_call: ToolCall, config: RunnableConfig) -> ToolMessage:
+        if events is not None:
+            events.append(f"start {tool_call['id']}")
+        await asyncio.sleep(tool_call["args"]["delay"])
+        if events is not None:
+            events.append(f"end {tool_call['id']}")
+        return ToolMessage(content=f"done {tool_call['id']}", name=tool_call["name"], tool_call_id=tool_call["id"])
+
+    return handle
+
+
+async def fail(tool_call: ToolCall, config: RunnableConfig) -> ToolMessage:
+    raise RuntimeError("boom")
+
+
+def test_results_keep_call_order_and_calls_run_concurrently() -> None:
+    events: list[str] = []
+    executor = ToolExecutor({"search": build_handler(events)})
+    calls = [build_call("search", "a", 0.03), build_call("search", "b", 0.01), build_call("search", "c", 0.02)]
+
+    messages = asyncio.run(executor.aexecute(calls, {}))
+
+    assert [message.tool_call_id for message in messages] == ["a", "b", "c"]
+    assert events == ["start a", "start b", "start c", "end b", "end c", "end a"]
+
+
+def test_concurrency_limit_per_tool(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings.TOOLS, "CONCURRENCY", {"search": 1})
+    events: list[str] = []
+    executor = ToolExecutor({"search": build_handler(events), "think": build_handler(events)})
+    calls = [build_call("search", "a", 0.02), build_call("search", "b", 0.01), build_call("think", "c", 0.005)]
+
+    asyncio.run(executor.aexecute(calls, {}))
+
+    assert events == ["start a", "start c", "end c", "end a", "start b", "end b"]
+
+
+def test_unknown_tool_and_errors_become_error_messages() -> None:
+    executor = ToolExecutor({"search": build_handler(), "broken": fail})
+    calls = [build_call("broken", "a"), build_call("missing", "b"), build_call("search", "c")]
+
+    messages = asyncio.run(executor.aexecute(calls, {}))
+
+    assert [(message.tool_call_id, message.status) for message in messages] == [
+        ("a", "error"),
+        ("b", "error"),
+        ("c", "success"),
+    ]
+    assert "boom" in messages[0].content
+    assert "missing" in messages[1].content
+    assert "search" in messages[1].content
+    assert messages[2].content == "done c"
+
+
+def test_timeout_becomes_error_message(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings.TOOLS, "TIMEOUTS", {"search": 0.01})
+    executor = ToolExecutor({"search": build_handler()})
+
+    messages = asyncio.run(executor.aexecute([build_call("search", "a", 1), build_call("search", "b")], {}))
+
+    assert [message.status for message in messages] == ["error", "success"]
+    assert "search" in messages[0].content
+
+
+def test_raise_errors_propagate_after_other_calls_finish() -> None:
+    events: list[str] = []
+    executor = ToolExecutor({"search": build_handler(events), "broken": fail}, raise_errors=["broken"])
+
+    with pytest.raises(RuntimeError, match="boom"):
+        asyncio.run(executor.aexecute([build_call("broken", "a"), build_call("search", "b", 0.01)], {}))
+
+    assert events == ["start b", "end b"]
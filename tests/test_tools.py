@@ -0,0 +1,43 @@
+from deep_research.ml.tools import CHARS_PER_TOKEN, estimate_tokens, pack_webpages
+
+
+def build_page(tokens: int) -> str:
+    """Страница, которую estimate_tokens оценивает в tokens токенов"""
+    page = "x" * (tokens - 1) * CHARS_PER_TOKEN
+    assert estimate_tokens(page) == tokens
+    return page
+
+
+def test_pages_are_packed_first_fit_decreasing() -> None:
+    pages = [build_page(tokens) for tokens in (30, 70, 50, 20, 40)]
+
+    batches = pack_webpages(pages, token_budget=100, max_pages=10)
+
+    assert batches == [[1, 0], [2, 4], [3]]
+
+
+def test_every_page_is_packed_once() -> None:
+    pages = [build_page(tokens) for tokens in (5, 90, 33, 12, 60, 41, 7, 7)]
+
+    batches = pack_webpages(pages, token_budget=100, max_pages=3)
+
+    assert sorted(index for batch in batches for index in batch) == list(range(len(pages)))
+    for batch in batches:
+        assert len(batch) <= 3
+        assert sum(estimate_tokens(pages[index]) for index in batch) <= 100
+
+
+def test_max_pages_limits_batch_size() -> None:
+    pages = [build_page(2) for _ in range(5)]
+
+    assert pack_webpages(pages, token_budget=100, max_pages=2) == [[0, 1], [2, 3], [4]]
+
+
+def test_page_over_budget_gets_own_batch() -> None:
+    pages = [build_page(10), build_page(500), build_page(10)]
+
+    assert pack_webpages(pages, token_budget=100, max_pages=10) == [[1], [0, 2]]
+
+
+def test_no_pages() -> None:
+    assert pack_webpages([], token_budget=100, max_pages=10) == []